@@ -1,15 +1,10 @@
-from speech_to_text import SpeechToText
-from chat_gpt import ChatGPT
-from text_to_speech import TextToSpeech
-from microphone_muter import MicrophoneMute
-from model_application import ChatBot
-from movies import MovieRecommendation
-import tkinter as tk
-from gif_animation import ImageLabel
+import os
 import continuous_threading
-import requests
-from bs4 import BeautifulSoup
-import datetime
+import asyncio
+from turn_pipeline import TurnPipeline
+from skills import registry, SharedResources, SkillContext
+from startup import Startup
+from tracing import Tracer
 
 continuous_threading.set_allow_shutdown(True)
 
@@ -18,13 +13,23 @@ class Assistant:
     """
        The main assistant class that handles the user input and generates appropriate responses.
        """
-    def __init__(self, name, gpt_token):
+    def __init__(self, name, gpt_token, tts_backend="auto", stt_engine="google", trace_file=None, metrics_port=None,
+                 barge_in=False):
         """
         Constructor method for the AIAssistant class.
 
         Args:
             name (str): The name of the AI assistant.
             gpt_token (str): The API token for GPT-3 OpenAI.
+            tts_backend (str): The text to speech backend: "gtts", "espeak", "pyttsx3", or "auto" for gTTS with
+                an automatic fallback to an offline backend when gTTS is slow or unreachable.
+            stt_engine (str): The speech recognition engine: "google" (online) or "vosk" (offline, with partial
+                results while the user is speaking).
+            trace_file (str): A JSON lines file every span of every turn is appended to, or None.
+            metrics_port (int): A port serving the per-stage latency histograms and exception counters in the
+                Prometheus text format at /metrics, or None.
+            barge_in (bool): Whether the user can interrupt the assistant by speaking louder than its voice. Without
+                it, the microphone is paused while the assistant speaks.
 
         Returns:
             None
@@ -33,52 +38,108 @@ class Assistant:
         self.name = name
         self.gpt_token = gpt_token
 
-        # Initializes objects for speech-to-text conversion, GPT-3 chatbot, text-to-speech conversion, and microphone control
-        self.speech_to_text = SpeechToText()
-        self.chat_gpt = ChatGPT(name, gpt_token)
-        self.text_to_speech = TextToSpeech()
-        self.microphone_mute = MicrophoneMute()
+        # Records the latency and the exceptions of every stage of every turn
+        self.tracer = Tracer(trace_file)
+        if metrics_port is not None:
+            self.tracer.serve_metrics(metrics_port)
+
+        # The independent components are initialized in parallel, each importing its own modules, while the window
+        # is created by the main thread, as Tk requires
+        self.startup = Startup(self.tracer)
+        chatbot = self.startup.submit("intent model", self._create_chatbot)
+        text_to_speech = self.startup.submit("text to speech", self._create_text_to_speech, tts_backend)
+        speech_to_text = self.startup.submit("audio devices", self._create_speech_to_text, stt_engine, barge_in)
+        shared = self.startup.submit("response cache", self._create_shared)
+        self.startup.run("window", self._create_window)
+
+        # Initializes the components of the skills. GPT-3 chatbot and the movie recommendation system are only
+        # created (and openai, wikipedia and imdb imported) when an intent first needs them
+        self.skills = registry
+        self.shared = shared.result()
+        self.context = SkillContext(self.shared)
 
         # Initializes the chatbot and retrieves the possible tags for responses
-        self.chatbot = ChatBot('intents.json', 'chatbot1.h5')
+        self.chatbot = chatbot.result()
         self.tags = self.chatbot.tags
 
-        # Initializes the movie recommendation system
-        self.movie_recommender = MovieRecommendation()
+        # Objects for speech-to-text conversion, text-to-speech conversion, and microphone control
+        self.text_to_speech = text_to_speech.result()
+        self.microphone_mute, self.speech_to_text = speech_to_text.result()
 
-        # Initializes the Tkinter GUI window and loads the GIF animation for the UI
-        self.root = tk.Tk()
-        self.root.title(f"{self.name} AI Assistant")
-        self.root.resizable(False, False)
-        self.label = ImageLabel(self.root)
-        self.label.pack(fill="both", expand=True)
-        self.gif_file = "animation.gif"
-        self.label.load(self.gif_file)
+        # Pre-synthesizes every canned response in the background, so they play without network I/O
+        self.text_to_speech.warm_up(response for responses in self.chatbot.responses.values()
+                                    for response in responses)
+        self.startup.ready()
+        print(self.startup.report())
 
         # Runs the assistant in a continuous thread for handling user inputs and outputs
         self.root.after(1, continuous_threading.Thread(target=self.run).start())
         self.root.mainloop()
 
-    def get_current_time(self):
+    @staticmethod
+    def _create_chatbot():
+        from model_application import ChatBot
+
+        return ChatBot('intents.json', 'chatbot1.h5')
+
+    @staticmethod
+    def _create_text_to_speech(tts_backend):
+        from text_to_speech import TextToSpeech
+        from tts_backends import create_backend
+
+        return TextToSpeech(create_backend(tts_backend))
+
+    def _create_speech_to_text(self, stt_engine, barge_in):
         """
-        Retrieves the current time from the local machine.
+        Opens the microphone once, behind the mute gate the speech recognizer reads from. With barge-in, a frame
+        louder than the echo of the assistant's voice stops the playback.
 
         Returns:
-            str: The current time in HH:MM format.
+            tuple: The MicrophoneMute and the SpeechToText.
+        """
+        from microphone_muter import MicrophoneMute
+        from speech_to_text import SpeechToText
+        from stt_engines import create_engine
+
+        # The speech synthesizer may still be starting, it is only needed once the user interrupts a reply
+        microphone_mute = MicrophoneMute(barge_in=barge_in, on_barge_in=lambda: self.text_to_speech.stop())
+        return microphone_mute, SpeechToText(source=microphone_mute, engine=create_engine(stt_engine))
+
+    def _create_shared(self):
+        from response_cache import ResponseCache
+
+        return SharedResources(self.name, self.gpt_token, cache=ResponseCache("response_cache.sqlite3"))
+
+    def _create_window(self):
+        """
+        Initializes the Tkinter GUI window and loads the GIF animations for the UI. A state can have an animation of
+        its own (e.g. animation_speaking.gif), otherwise the assistant is animated while thinking and speaking, and
+        paused on the current frame while listening.
         """
-        current_time = datetime.datetime.now().strftime("%I:%M %p")
-        return current_time
+        import tkinter as tk
+        from gif_animation import ImageLabel
+
+        self.root = tk.Tk()
+        self.root.title(f"{self.name} AI Assistant")
+        self.root.resizable(False, False)
+        self.label = ImageLabel(self.root)
+        self.label.pack(fill="both", expand=True)
+        self.gif_file = "animation.gif"
+        for state in ("thinking", "speaking", "listening"):
+            if os.path.exists(f"animation_{state}.gif"):
+                self.label.load(f"animation_{state}.gif", state)
+            elif state != "listening":
+                self.label.load(self.gif_file, state)
 
     def run(self):
         """
         This method runs the chatbot and controls its interaction with the user.
 
-        It starts by unmuting the microphone, then listens for the user's input using speech-to-text conversion.
-        The chatbot then predicts the user's intent and responds accordingly.
-        If the user's intent is "general", the chatbot uses GPT-3 API to generate a response.
-        Otherwise, it uses specific functionalities for each intent, such as recommending a movie or searching the web.
+        It builds the turn pipeline, which listens for the user's input using speech-to-text conversion, predicts the
+        user's intent, dispatches it to the skill registered for the intent and speaks the reply, with every stage
+        running concurrently.
         The chatbot will continue to interact with the user until the user indicates the intent to leave the conversation.
-        At that point, the chatbot will mute the microphone, say goodbye, and shut down.
+        At that point, the chatbot will say goodbye and shut down.
 
         Args:
             self: the instance of the `ChatbotGUI` class calling this method.
@@ -86,152 +147,41 @@ class Assistant:
         Returns:
             None
         """
-        # Unmute microphone to listen for user input
-        self.microphone_mute.unmute_microphone()
-
-        # Continuously listen for user input and generate responses until the chatbot is terminated
-        while True:
-            try:
-                # Convert audio input to text and predict intent of input
-                text = self.speech_to_text.get_text_from_audio()
-                intent = self.chatbot.predict_intent(text)
-
-                # If the intent is not 'general', generate a response based on the specific intent
-                if intent !="general":
-                    answer = self.chatbot.generate_response(text)
-
-                    # If the intent is 'goodbye', terminate the application
-                    if intent == "goodbye":
-                        # Print user input and response, mute the microphone, play the response aloud,
-                        # and terminate the application
-                        self.print_multiline(f"You :> {text}")
-                        self.microphone_mute.mute_microphone()
-                        self.print_multiline(f"{self.name} :> {answer}")
-                        self.text_to_speech.play_audio(answer)
-                        continuous_threading.set_shutdown_timeout(0)
-                        self.root.destroy()
-                        break
-
-                    # If the intent is "time", retrieve the current time and generate the response
-                    elif intent == "time":
-                        current_time = self.get_current_time()
-                        answer = f"The current time is {current_time}."
-                        # Print and play the response aloud
-                        self.print_multiline(f"You :> {text}")
-                        self.microphone_mute.mute_microphone()
-                        self.print_multiline(f"{self.name} :> {answer}")
-                        self.text_to_speech.play_audio(answer)
-                        self.microphone_mute.unmute_microphone()
-                        continue
-
-                    # If the intent is 'greetings', prompt the user to respond and continue listening for input
-                    elif intent == "greetings":
-                        # Print user input and response, mute the microphone, play the response aloud,
-                        # and continue listening for input
-                        self.print_multiline(f"You :> {text}")
-                        self.microphone_mute.mute_microphone()
-                        self.print_multiline(f"{self.name} :> {answer}")
-                        self.text_to_speech.play_audio(answer)
-                        self.microphone_mute.unmute_microphone()
-                        continue
-
-                    # If the intent is 'movie suggestion', prompt the user to input genre, year, and rating criteria,
-                    # and generate a movie recommendation based on the criteria
-                    elif intent == "movie suggestion":
-                        # Print user input and response, mute the microphone, play the response aloud, and prompt
-                        # the user to input genre, year, and rating criteria
-                        self.print_multiline(f"You :> {text}")
-                        self.microphone_mute.mute_microphone()
-                        self.print_multiline(f"{self.name} :> {answer}")
-                        self.text_to_speech.play_audio(answer)
-                        print(f"Input without brackets in the same order (Genre, Year, Rating) :")
-                        text2 = input()
-                        text2_tokenized = text2.split(',')
-                        self.microphone_mute.mute_microphone()
-                        answer2 = self.movie_recommender.recommend_movie(genre=text2_tokenized[0],
-                                                                         min_rating=float(text2_tokenized[2]),
-                                                                         year=int(text2_tokenized[1]))
-                        print(f"{self.name} :> {self.movie_recommender.stringer(answer2)}")
-                        self.text_to_speech.play_audio(str(self.movie_recommender.recommendation_lst_shorter(answer2)))
-                        self.microphone_mute.unmute_microphone()
-                        continue
-
-                    elif intent == "weather":
-                        # Retrieve the weather information using the get_weather method
-                        # Print and play the response aloud
-                        print(f"You :> {text}")
-                        self.microphone_mute.mute_microphone()
-                        self.print_multiline(f"{self.name} :> {answer}")
-                        self.text_to_speech.play_audio(answer)
-                        print(f"Type the City : ")
-                        text2 = input()
-                        weather_info = self.get_weather(text2)
-                        self.print_multiline(f"{self.name} :> {weather_info}")
-                        self.text_to_speech.play_audio(weather_info)
-                        self.microphone_mute.unmute_microphone()
-                        continue
-
-                    # If the intent is 'search web', prompt the user to input a topic to search the web about,
-                    # generate a short answer based on the topic, and play the answer aloud
-                    elif intent == "search web":
-                        # Print user input and response, mute the microphone, play the response aloud,
-                        # and prompt the user to input the topic to search for on the web
-                        self.print_multiline(f"You :> {text}")
-                        self.microphone_mute.mute_microphone()
-                        self.print_multiline(f"{self.name} :> {answer}")
-                        self.text_to_speech.play_audio(answer)
-                        print("Insert the Topic You Want to Search the Web About (the Info is Retrieved from Wikipedia): ")
-                        text2 = input()
-                        # Use the chatbot's GPT-3 model to summarize the resulted Wikipedia Search to the topic
-                        # then print and play the response aloud
-                        answer2 = self.chat_gpt.get_answer(
-                            f"summarize in no more than 50 words: {self.chat_gpt.web_searcher(text2)}",
-                            mode="short")
-                        self.print_multiline(f"{self.name} :> {answer2}")
-                        self.text_to_speech.play_audio(answer2)
-                        self.microphone_mute.unmute_microphone()
-                        continue
-
-                else:
-                    # Print user input, get GPT-3 response, mute the microphone,
-                    # play response aloud or just returns it if the user don't want for the assistant to play it,
-                    # and unmute the microphone
-                    self.print_multiline(f"You :> {text}")
-                    answer = self.chat_gpt.get_answer(text)
-                    self.microphone_mute.mute_microphone()
-                    print(f"Do You Want {self.name} to say it? (Y/n) ")
-                    print_or_listen = input()
-                    self.print_multiline(f"{self.name} :> {answer}")
-                    if print_or_listen.lower() == 'n':
-                        self.microphone_mute.unmute_microphone()
-                    else:
-                        self.text_to_speech.play_audio(answer)
-                        self.microphone_mute.unmute_microphone()
-                    continue
-            except:
-                # if any error occur during microphone listening, continue the while loop until you get an input
-                continue
+        self.pipeline = TurnPipeline(self.handle_turn, self.chatbot, self.name,
+                                     interactive_intents=self.skills.interactive_intents,
+                                     speech_to_text=self.speech_to_text, text_to_speech=self.text_to_speech,
+                                     microphone_mute=self.microphone_mute, output=self.print_multiline,
+                                     ask=self.ask_keyboard, tracer=self.tracer, on_state=self.label.set_state)
+        asyncio.run(self.pipeline.run())
+        # The user said goodbye, terminate the application
+        continuous_threading.set_shutdown_timeout(0)
+        self.root.destroy()
+
     @staticmethod
-    def get_weather(city):
-        city = city + " weather"
-        city = city.replace(" ", "+")
-        url = f'https://www.google.com/search?q={city}&oq={city}&aqs=chrome.0.35i39l2j0l4j46j69i60.6128j1j7&sourceid=chrome&ie=UTF-8'
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-        }
-        params = {
-            'hl': 'en'  # Set the language parameter to 'en' for English results
-        }
-        res = requests.get(url, headers=headers, params=params)
-        soup = BeautifulSoup(res.text, 'html.parser')
-        time = soup.select('#wob_dts')[0].getText().strip()
-        info = soup.select('#wob_dc')[0].getText().strip()
-        weather = soup.select('#wob_tm')[0].getText().strip()
-        lst = ["on " + time[:-3] + " " + time[-2:],
-               f'the Weather in {city[:-8].title()} is ' + info,
-               "With a Temperature of " + weather + "°C"]
-        string = ", ".join(lst)
-        return string
+    async def ask_keyboard(prompt):
+        """
+        Reads the answer to a follow-up question from the keyboard without blocking the pipeline.
+
+        Args:
+            prompt (str): The question, already printed.
+
+        Returns:
+            str: The typed answer.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, input)
+
+    async def handle_turn(self, turn):
+        """
+        Builds the reply to one utterance of the user with the skill registered for its intent (see skills.py).
+
+        Args:
+            turn (Turn): The turn, with the text and intent of the utterance.
+
+        Returns:
+            None
+        """
+        await self.skills.dispatch(turn, self.context)
+
     @staticmethod
     def print_multiline(string, width=50):
         """
@@ -0,0 +1,332 @@
+import collections
+import time
+import wave
+import numpy as np
+
+'''
+Long-lived audio capture for the speech recognizer.
+A CaptureSession reads fixed-size frames from an audio source that stays open across turns, classifies every frame
+as speech or silence with a voice activity detector, and returns one utterance per `listen` call. The ambient noise
+level is measured once when the session starts and then tracked in the background from the silent frames, so no
+listen cycle pays a calibration pause.
+'''
+
+SAMPLE_WIDTH = 2  # 16-bit PCM
+
+
+def frame_rms(frame):
+    """
+    Computes the root mean square energy of a 16-bit PCM frame.
+
+    Args:
+        frame (bytes): The PCM frame.
+
+    Returns:
+        float: The RMS energy of the frame.
+    """
+    samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+    if samples.size == 0:
+        return 0.0
+    return float(np.sqrt(np.mean(samples * samples)))
+
+
+class MicrophoneSource:
+    """
+    An audio source reading 16-bit mono frames from a microphone through one PyAudio input stream that stays open
+    until `close` is called.
+    """
+    def __init__(self, sample_rate=16000, frame_ms=30, device_index=None):
+        """
+        Opens the microphone.
+
+        Args:
+            sample_rate (int): The sample rate in Hz.
+            frame_ms (int): The duration of one frame in milliseconds.
+            device_index (int): The PyAudio index of the input device, defaults to the system default.
+        """
+        import pyaudio
+
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self._audio = pyaudio.PyAudio()
+        self._stream = self._audio.open(format=pyaudio.paInt16, channels=1, rate=sample_rate, input=True,
+                                        input_device_index=device_index, frames_per_buffer=self.frame_samples)
+
+    def read(self):
+        """
+        Reads the next frame, blocking until it has been captured.
+
+        Returns:
+            bytes: The PCM frame.
+        """
+        return self._stream.read(self.frame_samples, exception_on_overflow=False)
+
+    def pause(self):
+        """
+        Stops capturing until `resume` is called, without closing the device.
+        """
+        self._stream.stop_stream()
+
+    def resume(self):
+        """
+        Starts capturing again after `pause`.
+        """
+        self._stream.start_stream()
+
+    def close(self):
+        """
+        Closes the microphone.
+        """
+        self._stream.stop_stream()
+        self._stream.close()
+        self._audio.terminate()
+
+
+class WavFileSource:
+    """
+    An audio source that plays WAV files as if they were captured by a microphone, for tests and benchmarks.
+    The files must be 16-bit mono at the source's sample rate. Every file is followed by `gap` seconds of silence,
+    and EOFError is raised once all files have been read.
+    """
+    def __init__(self, paths, sample_rate=16000, frame_ms=30, gap=1.0, realtime=False):
+        """
+        Loads the WAV files.
+
+        Args:
+            paths (list): The paths of the WAV files, played in order.
+            sample_rate (int): The sample rate in Hz.
+            frame_ms (int): The duration of one frame in milliseconds.
+            gap (float): The seconds of silence after every file.
+            realtime (bool): Whether `read` waits for the duration of the frame like a real microphone would.
+        """
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.realtime = realtime
+        silence = bytes(int(gap * sample_rate) * SAMPLE_WIDTH)
+        data = []
+        for path in paths:
+            with wave.open(path, 'rb') as wav:
+                if (wav.getframerate(), wav.getsampwidth(), wav.getnchannels()) != (sample_rate, SAMPLE_WIDTH, 1):
+                    raise ValueError(f"{path} must be 16-bit mono at {sample_rate} Hz")
+                data.append(wav.readframes(wav.getnframes()))
+            data.append(silence)
+        self._data = b"".join(data)
+        self._position = 0
+
+    def read(self):
+        """
+        Reads the next frame.
+
+        Returns:
+            bytes: The PCM frame.
+        """
+        frame_bytes = self.frame_samples * SAMPLE_WIDTH
+        if self._position >= len(self._data):
+            raise EOFError("No more audio in the WAV files")
+        frame = self._data[self._position:self._position + frame_bytes].ljust(frame_bytes, b"\0")
+        self._position += frame_bytes
+        if self.realtime:
+            time.sleep(self.frame_samples / self.sample_rate)
+        return frame
+
+    def close(self):
+        pass
+
+
+class EnergyVAD:
+    """
+    A voice activity detector that classifies a frame as speech when its energy is well above the ambient noise.
+    """
+    def __init__(self, ratio=2.0, min_energy=300.0):
+        """
+        Args:
+            ratio (float): How many times louder than the ambient noise a speech frame must be.
+            min_energy (float): The minimum RMS energy of a speech frame, so a silent room is not too sensitive.
+        """
+        self.ratio = ratio
+        self.min_energy = min_energy
+
+    def is_speech(self, frame, noise_floor):
+        """
+        Classifies a frame.
+
+        Args:
+            frame (bytes): The PCM frame.
+            noise_floor (float): The current RMS energy of the ambient noise.
+
+        Returns:
+            bool: Whether the frame contains speech.
+        """
+        return frame_rms(frame) > max(self.min_energy, noise_floor * self.ratio)
+
+
+class WebRTCVAD:
+    """
+    A voice activity detector using the WebRTC frame classifier (the optional webrtcvad package). Frames must be
+    10, 20 or 30 ms long at 8, 16, 32 or 48 kHz.
+    """
+    def __init__(self, sample_rate=16000, aggressiveness=2):
+        """
+        Args:
+            sample_rate (int): The sample rate of the frames in Hz.
+            aggressiveness (int): From 0 (keeps most frames as speech) to 3 (filters out the most non-speech).
+        """
+        import webrtcvad
+
+        self.sample_rate = sample_rate
+        self._vad = webrtcvad.Vad(aggressiveness)
+
+    def is_speech(self, frame, noise_floor):
+        """
+        Classifies a frame. The noise floor is not needed, the classifier adapts to the noise on its own.
+
+        Args:
+            frame (bytes): The PCM frame.
+            noise_floor (float): The current RMS energy of the ambient noise.
+
+        Returns:
+            bool: Whether the frame contains speech.
+        """
+        return self._vad.is_speech(frame, self.sample_rate)
+
+
+def default_vad(sample_rate=16000):
+    """
+    Returns the WebRTC voice activity detector if webrtcvad is installed, otherwise the energy based one.
+
+    Args:
+        sample_rate (int): The sample rate of the frames in Hz.
+
+    Returns:
+        object: The voice activity detector.
+    """
+    try:
+        return WebRTCVAD(sample_rate)
+    except ImportError:
+        return EnergyVAD()
+
+
+class CaptureSession:
+    """
+    A long-lived capture session that segments the audio of a source into utterances.
+
+    Attributes:
+        source (object): The audio source, whose `read()` returns the next frame.
+        vad (object): The voice activity detector, whose `is_speech(frame, noise_floor)` classifies a frame.
+        noise_floor (float): The RMS energy of the ambient noise, or None before calibration.
+    """
+    def __init__(self, source, vad=None, calibration_duration=1.0, start_ms=240, end_silence_ms=600,
+                 preroll_ms=300, noise_adaptation=0.05):
+        """
+        Initializes the session. The source is calibrated on the first `listen` call.
+
+        Args:
+            source (object): The audio source, already open.
+            vad (object): The voice activity detector, defaults to `default_vad`.
+            calibration_duration (float): The seconds of audio measured for the initial ambient noise level.
+            start_ms (int): The window in which most frames must be speech for an utterance to start.
+            end_silence_ms (int): The silence in milliseconds that ends an utterance.
+            preroll_ms (int): The audio kept from before the start of an utterance, so its first syllable is not cut.
+            noise_adaptation (float): How fast the noise floor follows the energy of silent frames, from 0 to 1.
+        """
+        self.source = source
+        self.vad = vad if vad is not None else default_vad(source.sample_rate)
+        self.calibration_duration = calibration_duration
+        frame_ms = 1000 * source.frame_samples / source.sample_rate
+        self.start_frames = max(1, round(start_ms / frame_ms))
+        self.end_frames = max(1, round(end_silence_ms / frame_ms))
+        self.preroll_frames = max(1, round(preroll_ms / frame_ms))
+        self.noise_adaptation = noise_adaptation
+        self.noise_floor = None
+
+    @property
+    def sample_rate(self):
+        return self.source.sample_rate
+
+    def calibrate(self):
+        """
+        Measures the ambient noise level from `calibration_duration` seconds of audio.
+        """
+        frames = max(1, round(self.calibration_duration * self.source.sample_rate / self.source.frame_samples))
+        self.noise_floor = float(np.mean([frame_rms(self.source.read()) for _ in range(frames)]))
+
+    def listen(self, timeout=None, phrase_time_limit=None):
+        """
+        Waits for the next utterance and returns its audio.
+
+        Args:
+            timeout (float): The maximum seconds to wait for speech to start, or None to wait forever.
+            phrase_time_limit (float): The maximum seconds of an utterance, or None for no limit.
+
+        Returns:
+            bytes: The 16-bit mono PCM of the utterance, at `sample_rate`.
+
+        Raises:
+            TimeoutError: If no speech started within `timeout` seconds.
+            EOFError: If the source ran out of audio before an utterance started.
+        """
+        return b"".join(self.iter_utterance(timeout, phrase_time_limit))
+
+    def iter_utterance(self, timeout=None, phrase_time_limit=None):
+        """
+        Waits for the next utterance and yields its frames while they are captured, so a streaming recognizer
+        can work on them before the utterance ends. Trailing silence is not yielded.
+
+        Args:
+            timeout (float): The maximum seconds to wait for speech to start, or None to wait forever.
+            phrase_time_limit (float): The maximum seconds of an utterance, or None for no limit.
+
+        Yields:
+            bytes: The 16-bit mono PCM frames of the utterance, at `sample_rate`.
+
+        Raises:
+            TimeoutError: If no speech started within `timeout` seconds.
+            EOFError: If the source ran out of audio before an utterance started.
+        """
+        if self.noise_floor is None:
+            self.calibrate()
+        frame_seconds = self.source.frame_samples / self.source.sample_rate
+        preroll = collections.deque(maxlen=max(self.preroll_frames, self.start_frames))
+        window = collections.deque(maxlen=self.start_frames)
+        waited = 0.0
+
+        # Wait until most frames of the start window are speech
+        while True:
+            frame = self.source.read()
+            speech = self.vad.is_speech(frame, self.noise_floor)
+            preroll.append(frame)
+            window.append(speech)
+            if not speech:
+                # Silent frames keep the ambient noise level up to date without a calibration pause
+                self.noise_floor += self.noise_adaptation * (frame_rms(frame) - self.noise_floor)
+            if len(window) == self.start_frames and sum(window) * 2 > self.start_frames:
+                break
+            waited += frame_seconds
+            if timeout is not None and waited > timeout:
+                raise TimeoutError("No speech started before the timeout")
+
+        # Yield the utterance until enough consecutive silent frames follow it. Silent frames are held back
+        # until speech resumes, since trailing silence only slows down the recognizer
+        yield from preroll
+        captured = len(preroll)
+        silent = []
+        while len(silent) < self.end_frames:
+            if phrase_time_limit is not None and captured * frame_seconds >= phrase_time_limit:
+                break
+            try:
+                frame = self.source.read()
+            except EOFError:
+                break
+            captured += 1
+            if self.vad.is_speech(frame, self.noise_floor):
+                yield from silent
+                silent = []
+                yield frame
+            else:
+                silent.append(frame)
+
+    def close(self):
+        """
+        Closes the audio source.
+        """
+        self.source.close()
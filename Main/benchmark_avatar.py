@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+'''
+This is a script that benchmarks the animated avatar of the assistant's window.
+It compares the previous renderer, which converted every frame of the GIF into a PhotoImage before showing the first
+one and redrew the animation forever, with the lazy ImageLabel of gif_animation, which decodes the frames as they are
+shown into a bounded cache and pauses while the assistant is listening. Every renderer runs in a fresh process, which
+reports the time to the first frame on screen, its resident memory once the window is up, and the CPU time it spends
+while the assistant is idle.
+Without a display (no Tk window can be opened), it only compares the decoding of the frames, without the Tk images.
+'''
+
+
+def make_gif(path, frames=120, size=480):
+    """
+    Draws an animated GIF of a pulsing circle.
+
+    Args:
+        path (str): The file to write.
+        frames (int): The number of frames.
+        size (int): The width and height in pixels.
+    """
+    from PIL import Image, ImageDraw
+
+    images = []
+    for index in range(frames):
+        image = Image.new('P', (size, size), 0)
+        image.putpalette([value for level in range(256) for value in (level, level // 2, 255 - level)])
+        radius = size // 4 + int(size // 5 * abs(index / frames * 2 - 1))
+        ImageDraw.Draw(image).ellipse([size // 2 - radius, size // 2 - radius, size // 2 + radius,
+                                       size // 2 + radius], fill=index * 255 // frames + 1)
+        images.append(image)
+    images[0].save(path, save_all=True, append_images=images[1:], duration=40, loop=0)
+
+
+def rss_mb():
+    """
+    Returns the resident memory of the process in MB.
+    """
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        # ru_maxrss is the peak, in KB on Linux and in bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+
+
+def eager_load(label, path):
+    """
+    The previous ImageLabel.load: every frame becomes a PhotoImage before the first one is shown, and the animation
+    runs until the window is closed.
+    """
+    from itertools import count, cycle
+    from PIL import Image, ImageTk
+
+    im = Image.open(path)
+    frames = []
+    try:
+        for i in count(1):
+            frames.append(ImageTk.PhotoImage(im.copy()))
+            im.seek(i)
+    except EOFError:
+        pass
+    cycle_frames = cycle(frames)
+    delay = im.info.get('duration', 100)
+
+    def next_frame():
+        label.config(image=next(cycle_frames))
+        label.after(delay, next_frame)
+
+    label.frames = frames
+    next_frame()
+
+
+def run_window(renderer, path, idle):
+    import tkinter as tk
+
+    root = tk.Tk()
+    before = rss_mb()
+    start = time.perf_counter()
+    if renderer == 'eager':
+        label = tk.Label(root)
+        label.pack()
+        eager_load(label, path)
+    else:
+        from gif_animation import ImageLabel
+
+        label = ImageLabel(root)
+        label.pack()
+        label.load(path, 'thinking')
+        label.load(path, 'speaking')
+    root.update()
+    startup = time.perf_counter() - start
+    if renderer != 'eager':
+        # The assistant starts listening once the pipeline runs
+        label.set_state('listening')
+    cpu = time.process_time()
+    root.after(int(idle * 1000), root.quit)
+    root.mainloop()
+    result = {'startup_ms': startup * 1000, 'rss_mb': rss_mb() - before,
+              'idle_cpu_percent': (time.process_time() - cpu) / idle * 100}
+    root.destroy()
+    return result
+
+
+def run_decode(renderer, path):
+    import tracemalloc
+    from gif_animation import Animation
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    animation = Animation(path)
+    if renderer == 'eager':
+        # Every frame converted to RGBA, as PhotoImage stores them
+        frames = [animation.decode(index)[0].convert('RGBA') for index in range(animation.image.n_frames)]
+    else:
+        frames = [animation.decode(0)[0].convert('RGBA')]
+    startup = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # PIL allocates the pixels outside of the Python heap
+    pixels = sum(frame.width * frame.height * 4 for frame in frames)
+    return {'startup_ms': startup * 1000, 'frames_decoded': len(frames), 'pixels_mb': (memory + pixels) / 2 ** 20}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the startup, memory and idle CPU of the avatar.")
+    parser.add_argument('--gif', default=None, help="The animation to show, a generated one by default.")
+    parser.add_argument('--idle', type=float, default=5.0, help="The seconds of idle time to measure the CPU of.")
+    parser.add_argument('--renderer', choices=['eager', 'lazy'], help=argparse.SUPPRESS)
+    parser.add_argument('--decode-only', action='store_true', help="Only compare the decoding of the frames.")
+    args = parser.parse_args()
+
+    if args.renderer:
+        # A child process measuring one renderer
+        result = run_decode(args.renderer, args.gif) if args.decode_only else run_window(args.renderer, args.gif,
+                                                                                         args.idle)
+        print(json.dumps(result))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.gif
+        if path is None:
+            path = os.path.join(directory, 'animation.gif')
+            make_gif(path)
+        decode_only = args.decode_only
+        if not decode_only:
+            try:
+                import tkinter as tk
+
+                tk.Tk().destroy()
+            except Exception as error:
+                print(f"No Tk window can be opened ({error}), only comparing the decoding of the frames")
+                decode_only = True
+        for renderer in ('eager', 'lazy'):
+            command = [sys.executable, __file__, '--renderer', renderer, '--gif', path, '--idle', str(args.idle)]
+            output = subprocess.run(command + (['--decode-only'] if decode_only else []), check=True,
+                                    capture_output=True, text=True).stdout
+            result = json.loads(output)
+            print(f"{renderer:<6} " + "   ".join(f"{key} {value:.1f}" if isinstance(value, float) else
+                                                  f"{key} {value}" for key, value in result.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import json
+import threading
+import time
+from benchmark_intents import percentile
+from intent_batcher import IntentBatcher
+from model_application import ChatBot
+
+'''
+This is a script that benchmarks the micro-batching scheduler of the intent model.
+For every number of concurrent callers, each caller thread classifies its share of the patterns in intents.json one
+text at a time, first with ChatBot.classify (one forward pass per text) and then through an IntentBatcher (one
+forward pass per batch). It reports the throughput (utterances/sec), the p50/p99 latency of a call and the mean batch
+size the scheduler formed.
+'''
+
+
+def run_callers(classify, texts, callers):
+    """
+    Classifies the texts from concurrent caller threads.
+
+    Args:
+        classify (callable): The function (text) -> IntentResult.
+        texts (list): The texts, split evenly among the callers.
+        callers (int): The number of caller threads.
+
+    Returns:
+        tuple: The elapsed seconds and the latency of every call.
+    """
+    latencies = [[] for _ in range(callers)]
+
+    def caller(index):
+        for text in texts[index::callers]:
+            start = time.perf_counter()
+            classify(text)
+            latencies[index].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=caller, args=(index,)) for index in range(callers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, [latency for caller_latencies in latencies for latency in caller_latencies]
+
+
+def report(name, elapsed, latencies, extra=""):
+    print(f"{name:<24} {len(latencies) / elapsed:>10.0f} utt/s   p50 {percentile(latencies, 50) * 1000:8.3f} ms   "
+          f"p99 {percentile(latencies, 99) * 1000:8.3f} ms   {extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark micro-batched against one-at-a-time intent classification.")
+    parser.add_argument('--callers', nargs='+', type=int, default=[1, 8, 64])
+    parser.add_argument('--max-batch', type=int, default=32)
+    parser.add_argument('--max-wait', nargs='+', type=float, default=[0.0, 0.002],
+                        help="The max-wait settings of the batcher to compare, in seconds.")
+    parser.add_argument('--repeat', type=int, default=20, help="How many times the patterns are repeated.")
+    args = parser.parse_args()
+
+    chatbot = ChatBot('intents.json', 'chatbot1.h5')
+    with open('intents.json') as file:
+        patterns = [pattern for intent in json.load(file)['intents'] for pattern in intent['patterns']]
+    texts = patterns * args.repeat
+    print(f"{len(texts)} utterances, max batch={args.max_batch}")
+    chatbot.classify(texts[0])
+
+    for callers in args.callers:
+        print(f"{callers} concurrent callers")
+        report("  one at a time", *run_callers(chatbot.classify, texts, callers))
+        for max_wait in args.max_wait:
+            batcher = IntentBatcher(chatbot, max_batch=args.max_batch, max_wait=max_wait)
+            elapsed, latencies = run_callers(batcher.classify, texts, callers)
+            stats = batcher.stats()
+            batcher.close()
+            report(f"  batched, wait {max_wait * 1000:g} ms", elapsed, latencies,
+                   f"mean batch {stats['mean_batch_size']:5.1f}   max queue {stats['max_queue_depth']}")
+
+
+if __name__ == '__main__':
+    main()
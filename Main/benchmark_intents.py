@@ -0,0 +1,81 @@
+import argparse
+import json
+import statistics
+import time
+from model_application import ChatBot
+
+'''
+This is a script that benchmarks the intent classification of the chatbot.
+It classifies every pattern in intents.json one at a time with ChatBot.classify and then in batches with
+ChatBot.predict_intents, and reports the throughput (utterances/sec) and the p50/p99 latency of each call.
+'''
+
+
+def percentile(values, q):
+    """
+    Returns the q-th percentile of a list of values.
+
+    Args:
+        values (list): The measured values.
+        q (int): The percentile, between 1 and 99.
+
+    Returns:
+        float: The percentile value.
+    """
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1]
+
+
+def report(name, latencies, utterances):
+    """
+    Prints the throughput and latency of a benchmark run.
+
+    Args:
+        name (str): The name of the run.
+        latencies (list): The duration of every call in seconds.
+        utterances (int): The number of utterances classified.
+    """
+    total = sum(latencies)
+    print(f"{name:<22} {utterances / total:>12.0f} utt/s   "
+          f"p50 {percentile(latencies, 50) * 1000:8.3f} ms   p99 {percentile(latencies, 99) * 1000:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single versus batched intent classification.")
+    parser.add_argument('--backend', default='numpy', choices=['numpy', 'keras'])
+    parser.add_argument('--model', default='chatbot1.h5')
+    parser.add_argument('--intents', default='intents.json')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--repeat', type=int, default=20, help="How many times the patterns are repeated.")
+    args = parser.parse_args()
+
+    chatbot = ChatBot(args.intents, args.model, backend=args.backend)
+    with open(args.intents) as file:
+        patterns = [pattern for intent in json.load(file)['intents'] for pattern in intent['patterns']]
+    texts = patterns * args.repeat
+    print(f"{len(texts)} utterances, backend={args.backend}, batch size={args.batch_size}")
+
+    # Warm up both paths so one-time setup costs are not measured
+    chatbot.classify(texts[0])
+    list(chatbot.predict_intents(texts[:args.batch_size], batch_size=args.batch_size))
+
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        chatbot.classify(text)
+        latencies.append(time.perf_counter() - start)
+    report("single", latencies, len(texts))
+
+    latencies = []
+    for i in range(0, len(texts), args.batch_size):
+        batch = texts[i:i + args.batch_size]
+        start = time.perf_counter()
+        for _ in chatbot.predict_intents(batch, batch_size=args.batch_size):
+            pass
+        latencies.append(time.perf_counter() - start)
+    report("batched (per batch)", latencies, len(texts))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+import gc
+import tracemalloc
+from fake_openai_server import FakeOpenAIServer
+from headless import HeadlessAssistant
+
+'''
+This is a stress test of the memory of concurrent sessions of the headless assistant.
+It opens more and more sessions, each of which greets the assistant and asks a general question answered by the fake
+OpenAI server (so every session has a ChatGPT history), and reports after every step the memory allocated by Python,
+the memory added per session, and the memory of the intent model weights, which all sessions share and which must
+stay constant however many sessions are open. It fails when a session adds more than --max-session-kb, e.g. because an
+idle session keeps running tasks or queues of its pipeline.
+'''
+
+CONVERSATION = ["hello", "can you explain quantum physics to me", "n"]
+
+
+def model_bytes(chatbot):
+    """
+    Returns the memory of the weights of the NumPy intent model.
+
+    Args:
+        chatbot (ChatBot): The intent classifier.
+
+    Returns:
+        int: The bytes of the weights.
+    """
+    return sum(kernel.nbytes + bias.nbytes for kernel, bias, _ in chatbot.model.layers)
+
+
+async def converse(session):
+    for text in CONVERSATION:
+        await session.send(text)
+
+
+async def run(args):
+    server = FakeOpenAIServer(reply="A short answer.", chunk_delay=0, latency=0).start()
+    assistant = HeadlessAssistant("Assistant", "any key", api_base=server.url, cache_path=None)
+    sessions = []
+    # Warm up the lazily created shared resources, the worker threads and the tracer's bounded buffer of recent
+    # spans with as many concurrent sessions as are measured, so only the sessions themselves are measured
+    while len(assistant.tracer.recent) < assistant.tracer.recent.maxlen:
+        warm_up = [assistant.open_session() for _ in range(args.concurrency)]
+        await asyncio.gather(*(converse(session) for session in warm_up))
+        await asyncio.gather(*(assistant.close_session(session.id) for session in warm_up))
+    server.requests.clear()
+
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    weights = model_bytes(assistant.chatbot)
+    print(f"{'sessions':>8} {'python MB':>10} {'KB/session':>11} {'model weights KB':>17}")
+    try:
+        for count in args.sessions:
+            new = [assistant.open_session() for _ in range(count - len(sessions))]
+            for start in range(0, len(new), args.concurrency):
+                await asyncio.gather(*(converse(session) for session in new[start:start + args.concurrency]))
+            sessions.extend(new)
+            # The fake server records every request, which is not memory of the sessions
+            server.requests.clear()
+            gc.collect()
+            current = tracemalloc.get_traced_memory()[0] - baseline
+            # Every session classifies with the same model object, so its weights are never copied
+            assert all(session.pipeline.chatbot is assistant.classifier for session in sessions)
+            assert model_bytes(assistant.chatbot) == weights
+            per_session = current / len(sessions) / 1024
+            print(f"{len(sessions):>8} {current / 2 ** 20:>10.2f} {per_session:>11.1f} {weights / 1024:>17.1f}")
+            assert per_session <= args.max_session_kb, \
+                f"A session adds {per_session:.1f} KB, over the target of {args.max_session_kb} KB"
+    finally:
+        tracemalloc.stop()
+        await asyncio.gather(*(assistant.close_session(session.id) for session in sessions))
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory of concurrent headless sessions.")
+    parser.add_argument('--sessions', nargs='+', type=int, default=[50, 100, 200, 400])
+    parser.add_argument('--concurrency', type=int, default=50, help="How many sessions converse at the same time.")
+    parser.add_argument('--max-session-kb', type=float, default=8.0,
+                        help="The most memory in KB a session with a short ChatGPT history may add.")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
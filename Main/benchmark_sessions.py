@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import time
+from benchmark_intents import percentile
+from fake_openai_server import FakeOpenAIServer
+from headless import HeadlessAssistant
+
+'''
+This is a script that load tests the headless assistant over its HTTP API.
+It serves the API locally with the fake OpenAI server and the silent TTS backend as stand-ins, runs a scripted
+conversation in every one of `--sessions` concurrent sessions, and reports the message throughput and the p50/p99
+latency of a reply (from sending a message to receiving all the lines of its reply).
+'''
+
+# Every session greets, asks a general question answered by (fake) ChatGPT, asks the time and says goodbye
+CONVERSATION = ["hello", "can you explain quantum physics to me", "n", "what time is it", "bye"]
+
+
+async def converse(client, url, latencies):
+    """
+    Runs the scripted conversation in a new session.
+
+    Args:
+        client (aiohttp.ClientSession): The HTTP client.
+        url (str): The base URL of the API.
+        latencies (list): The list the latency of every message is appended to.
+    """
+    async with client.post(f"{url}/sessions") as response:
+        session_id = (await response.json())['session']
+    for text in CONVERSATION:
+        start = time.perf_counter()
+        async with client.post(f"{url}/sessions/{session_id}/messages", json={'text': text}) as response:
+            await response.json()
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(args):
+    from aiohttp import ClientSession, TCPConnector, web
+
+    server = FakeOpenAIServer(chunk_delay=args.chunk_delay, latency=args.latency).start()
+    assistant = HeadlessAssistant("Assistant", "any key", api_base=server.url, tts_backend='silent', cache_path=None)
+    runner = web.AppRunner(assistant.make_app())
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    url = f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+    try:
+        async with ClientSession(connector=TCPConnector(limit=0)) as client:
+            for sessions in args.sessions:
+                latencies = []
+                start = time.perf_counter()
+                await asyncio.gather(*(converse(client, url, latencies) for _ in range(sessions)))
+                elapsed = time.perf_counter() - start
+                print(f"{sessions:>5} sessions   {len(latencies) / elapsed:8.1f} msg/s   "
+                      f"p50 {percentile(latencies, 50) * 1000:8.1f} ms   p99 {percentile(latencies, 99) * 1000:8.1f} ms")
+    finally:
+        await runner.cleanup()
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the headless assistant with concurrent sessions.")
+    parser.add_argument('--sessions', nargs='+', type=int, default=[1, 10, 50])
+    parser.add_argument('--chunk-delay', type=float, default=0.05, help="The delay between streamed fake chunks.")
+    parser.add_argument('--latency', type=float, default=0.2, help="The latency of the fake OpenAI server.")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+from benchmark_intents import percentile
+
+'''
+This is a script that tracks the cold start of the assistant.
+Every run starts a fresh interpreter that builds a HeadlessAssistant (the assistant without the window and audio
+devices, which the benchmark cannot rely on) and exits as soon as it is ready. It reports the time from launching
+the interpreter to ready, which includes the imports, and the median duration of every startup step (see startup.py).
+'''
+
+
+def child(tts_backend):
+    start = time.perf_counter()
+    from headless import HeadlessAssistant
+
+    imported = time.perf_counter() - start
+    assistant = HeadlessAssistant("Assistant", "any key", tts_backend=tts_backend, cache_path=None)
+    print(json.dumps({'imports': imported, 'ready': time.perf_counter() - start, **assistant.startup.timings}))
+    assistant.classifier.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Track the time-to-ready of a cold start of the assistant.")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--tts', default='silent', help="The text to speech backend to start, '' for none.")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.tts)
+        return
+
+    totals, steps = [], {}
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, __file__, '--child', '--tts', args.tts], check=True,
+                                capture_output=True, text=True).stdout
+        totals.append(time.perf_counter() - start)
+        for name, seconds in json.loads(output.splitlines()[-1]).items():
+            steps.setdefault(name, []).append(seconds)
+    print(f"{args.runs} cold starts: time to ready p50 {percentile(totals, 50) * 1000:.0f} ms, "
+          f"p90 {percentile(totals, 90) * 1000:.0f} ms (from launching the interpreter)")
+    for name, durations in sorted(steps.items(), key=lambda step: -percentile(step[1], 50)):
+        print(f"  {name:<16} p50 {percentile(durations, 50) * 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import glob
+import os
+import statistics
+import time
+from audio_capture import CaptureSession, WavFileSource, SAMPLE_WIDTH
+from stt_engines import ENGINES
+
+'''
+This is a script that compares the speech recognition engines over a folder of recorded utterances.
+Every "<name>.wav" (16-bit mono, 16 kHz) needs a "<name>.txt" file with its transcript. The audio is fed through the
+same capture session as the microphone, and for every engine the script reports the word error rate and the latency
+between the detected end of every utterance and its final text.
+'''
+
+
+def word_errors(reference, hypothesis):
+    """
+    Counts the word-level edit distance between a reference transcript and a hypothesis.
+
+    Args:
+        reference (list): The words of the reference.
+        hypothesis (list): The words of the hypothesis.
+
+    Returns:
+        int: The number of substitutions, insertions and deletions.
+    """
+    previous = list(range(len(hypothesis) + 1))
+    for i, reference_word in enumerate(reference, start=1):
+        current = [i]
+        for j, hypothesis_word in enumerate(hypothesis, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (reference_word != hypothesis_word)))
+        previous = current
+    return previous[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare word error rate and latency of speech recognition engines.")
+    parser.add_argument('folder', help="The folder of <name>.wav recordings and <name>.txt transcripts.")
+    parser.add_argument('--engines', nargs='+', default=sorted(ENGINES), choices=sorted(ENGINES))
+    args = parser.parse_args()
+
+    recordings = sorted(glob.glob(os.path.join(args.folder, '*.wav')))
+    if not recordings:
+        print(f"No .wav recordings in {args.folder}")
+        return
+    print(f"{len(recordings)} recordings")
+
+    for name in args.engines:
+        try:
+            engine = ENGINES[name]()
+        except Exception as error:
+            print(f"{name:<8} unavailable: {error}")
+            continue
+        errors = 0
+        words = 0
+        latencies = []
+        for path in recordings:
+            with open(os.path.splitext(path)[0] + '.txt') as file:
+                reference = file.read().lower().split()
+            session = CaptureSession(WavFileSource([path]), calibration_duration=0.1)
+            # A recording with pauses is split into several utterances, recognized one by one like the assistant
+            # does, and their texts are joined. A recording without speech has an empty hypothesis
+            hypothesis = []
+            while True:
+                stream = engine.stream(session.sample_rate, SAMPLE_WIDTH)
+                try:
+                    for frame in session.iter_utterance():
+                        stream.accept(frame)
+                except EOFError:
+                    break
+                # The utterance has ended, so this measures end-of-speech to final text
+                start = time.perf_counter()
+                try:
+                    hypothesis.extend(stream.finish().lower().split())
+                except Exception:
+                    pass
+                latencies.append(time.perf_counter() - start)
+            errors += word_errors(reference, hypothesis)
+            words += len(reference)
+        if not latencies:
+            print(f"{name:<8} WER {100 * errors / max(1, words):6.2f}%   no speech detected in any recording")
+            continue
+        print(f"{name:<8} WER {100 * errors / max(1, words):6.2f}%   "
+              f"end-of-speech to text  median {statistics.median(latencies) * 1000:8.1f} ms   "
+              f"max {max(latencies) * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import json
+import statistics
+import time
+from sentences import split_sentences
+from tts_backends import BACKENDS
+
+'''
+This is a script that compares the text to speech backends.
+For every backend that can be created on this machine, it synthesizes the first sentence of every response in
+intents.json (which is what has to be ready before playback starts) and reports the time-to-first-sample.
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare time-to-first-sample across text to speech backends.")
+    parser.add_argument('--backends', nargs='+', default=sorted(BACKENDS), choices=sorted(BACKENDS))
+    parser.add_argument('--intents', default='intents.json')
+    parser.add_argument('--limit', type=int, default=20, help="The maximum number of phrases per backend.")
+    args = parser.parse_args()
+
+    with open(args.intents) as file:
+        responses = [response for intent in json.load(file)['intents'] for response in intent['responses'] if response]
+    phrases = [split_sentences(response)[0] for response in responses][:args.limit]
+    print(f"{len(phrases)} phrases")
+
+    for name in args.backends:
+        try:
+            backend = BACKENDS[name]()
+        except Exception as error:
+            print(f"{name:<10} unavailable: {error}")
+            continue
+        latencies = []
+        for phrase in phrases:
+            start = time.perf_counter()
+            pcm = backend.synthesize(phrase)
+            latencies.append(time.perf_counter() - start)
+        print(f"{name:<10} time-to-first-sample  median {statistics.median(latencies) * 1000:8.1f} ms   "
+              f"max {max(latencies) * 1000:8.1f} ms   ({pcm.sample_rate} Hz)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import time
+from benchmark_intents import percentile
+from fake_weather_server import FakeWeatherServer, results_page
+from weather_providers import GoogleProvider, OpenMeteoProvider, WeatherService
+
+'''
+This is a script that benchmarks the weather providers against a local FakeWeatherServer.
+It first times the parsing of a results page: the whole page parsed into a BeautifulSoup tree, as the weather skill
+used to, against GoogleProvider's targeted parse of the weather card. It then times a weather query end to end: a
+new connection per query (as `requests.get` does), a pooled session, the Open-Meteo JSON provider, and the cached
+WeatherService.
+'''
+
+CITIES = ["London", "Paris", "Tokyo", "New York", "Cairo", "Sydney", "Lima", "Oslo"]
+
+
+def time_calls(function, arguments):
+    """
+    Times a function on every argument.
+
+    Args:
+        function (callable): The function of one argument.
+        arguments (list): The arguments.
+
+    Returns:
+        list: The duration in seconds of every call.
+    """
+    durations = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def report(name, durations):
+    print(f"{name:<30} p50 {percentile(durations, 50) * 1000:8.3f} ms   p99 {percentile(durations, 99) * 1000:8.3f} ms")
+
+
+def soup_parse(page):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page, 'html.parser')
+    return [soup.select(f'#{card_id}')[0].getText().strip() for card_id in GoogleProvider.CARD_IDS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parsing and fetching of the weather providers.")
+    parser.add_argument('--repeat', type=int, default=5, help="How many times every city is queried.")
+    parser.add_argument('--latency', type=float, default=0.0, help="The latency of the fake server in seconds.")
+    parser.add_argument('--padding', type=int, default=400_000, help="The size of the markup around the card.")
+    args = parser.parse_args()
+
+    pages = [results_page(city, args.padding) for city in CITIES]
+    print(f"Results pages of {len(pages[0]) / 1024:.0f} KB")
+    try:
+        report("parse: BeautifulSoup", time_calls(soup_parse, pages))
+    except ImportError:
+        print("parse: BeautifulSoup            skipped, bs4 is not installed")
+    report("parse: targeted", time_calls(GoogleProvider.parse, pages * args.repeat))
+
+    import requests
+
+    server = FakeWeatherServer(latency=args.latency, padding=args.padding).start()
+    queries = CITIES * args.repeat
+    try:
+        # A session that is closed after every query opens a new connection, as requests.get does
+        def new_connection(city):
+            with requests.Session() as session:
+                GoogleProvider(session=session, url=server.google_url).fetch(city)
+
+        report("fetch: google, new connection", time_calls(new_connection, queries))
+        report("fetch: google, pooled", time_calls(GoogleProvider(url=server.google_url).fetch, queries))
+        open_meteo = OpenMeteoProvider(geocoding_url=server.geocoding_url, forecast_url=server.forecast_url)
+        report("fetch: open-meteo, pooled", time_calls(open_meteo.fetch, queries))
+        service = WeatherService(GoogleProvider(url=server.google_url))
+        report("fetch: google, cached", time_calls(service.get, queries))
+        print(f"cache: {service.stats()}")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,8 @@
+import threading
 import openai
 import wikipedia
+from chat_history import ChatHistory, count_message_tokens
+from response_cache import make_key
 
 
 class ChatGPT:
@@ -9,28 +12,129 @@ class ChatGPT:
     Attributes:
         openai_api_key (str): The API key for accessing the OpenAI API.
         name (str): The name of the chatbot.
-        chat_history (list): A list of chat history, consisting of the prompts and responses.
+        histories (dict): A bounded ChatHistory for every mode, so "short" summaries do not end up in the
+            assistant conversation.
+        last_prompt_tokens (int): The number of prompt tokens sent with the last request.
+        cache (ResponseCache): An optional cache of answers and Wikipedia summaries.
+        cache_assistant (bool): Whether "assistant" mode answers are cached by default.
 
     Methods:
-        get_answer(prompt:str,mode:str="assistant") -> str:
-            Generates a response to the prompt using the OpenAI API.
+        history(mode:str="assistant") -> ChatHistory:
+            Returns the history of the given mode.
+        get_answer(prompt:str,mode:str="assistant",stream:bool=False,use_cache:bool=None) -> str or Iterator[str]:
+            Generates a response to the prompt using the OpenAI API, optionally streaming the token deltas.
         web_searcher(prompt:str) -> str:
             Searches Wikipedia for a summary of the given prompt.
     """
 
-    def __init__(self, name: str, api_key: str):
+    def __init__(self, name: str, api_key: str, history_token_budget: int = 2000, summarize_history: bool = False,
+                 history_factory=None, api_base: str = None, cache=None, cache_assistant: bool = False):
         """
         Initializes a new instance of the ChatGPT class.
 
         Args:
             name (str): The name of the chatbot.
             api_key (str): The API key for accessing the OpenAI API.
+            history_token_budget (int): The maximum number of tokens of the history sent with every request.
+            summarize_history (bool): Whether turns evicted from the history are folded into a rolling summary
+                (this costs an extra short request whenever turns are evicted).
+            history_factory (callable): An optional function (mode:str) -> ChatHistory to plug in a different
+                history manager for each mode.
+            api_base (str): An optional base URL of the API, e.g. a local stand-in server for testing.
+            cache (ResponseCache): An optional cache of answers and Wikipedia summaries. "short" answers and
+                Wikipedia summaries are always cached when it is given.
+            cache_assistant (bool): Whether "assistant" mode answers are cached by default. These depend on the
+                conversation, so they are keyed by the history and only hit for a repeated conversation.
         """
         self.openai_api_key = api_key
+        self.api_base = api_base
         self.name = name
-        self.chat_history = []
+        self.history_token_budget = history_token_budget
+        self.summarize_history = summarize_history
+        self.history_factory = history_factory or self._default_history
+        self.histories = {}
+        self._histories_lock = threading.Lock()
+        self.last_prompt_tokens = 0
+        self.cache = cache
+        self.cache_assistant = cache_assistant
 
-    def get_answer(self, prompt: str, mode: str = "assistant") -> str:
+    def _create_completion(self, **kwargs):
+        """
+        Sends a chat completion request with the API key and base URL of this chatbot.
+
+        Args:
+            **kwargs: The arguments of `openai.ChatCompletion.create`.
+
+        Returns:
+            The completion response, or an iterator of chunks if `stream=True` is passed.
+        """
+        # The key is passed with the request instead of being set on the openai module, so chatbots with different
+        # keys can send requests from different threads at the same time
+        kwargs["api_key"] = self.openai_api_key
+        if self.api_base is not None:
+            kwargs["api_base"] = self.api_base
+        return openai.ChatCompletion.create(model="gpt-3.5-turbo", **kwargs)
+
+    def _default_history(self, mode: str) -> ChatHistory:
+        summarizer = self._summarize if self.summarize_history else None
+        return ChatHistory(self.history_token_budget, summarizer)
+
+    def history(self, mode: str = "assistant") -> ChatHistory:
+        """
+        Returns the history of the given mode, creating it on first use.
+
+        Args:
+            mode (str): The mode of the history.
+
+        Returns:
+            ChatHistory: The history of the mode.
+        """
+        with self._histories_lock:
+            if mode not in self.histories:
+                self.histories[mode] = self.history_factory(mode)
+            return self.histories[mode]
+
+    @property
+    def chat_history(self) -> list:
+        """
+        The messages of the assistant conversation history.
+        """
+        return self.history("assistant").messages()
+
+    def _summarize(self, summary: str, evicted_messages: list) -> str:
+        """
+        Folds evicted messages into the rolling summary of the conversation.
+
+        Args:
+            summary (str): The current summary.
+            evicted_messages (list): The messages evicted from the history.
+
+        Returns:
+            str: The new summary.
+        """
+        conversation = "\n".join(f"{message['role']}: {message['content']}" for message in evicted_messages)
+        response = self._create_completion(
+            max_tokens=150,
+            messages=[
+                {"role": "system",
+                 "content": "Summarize the conversation in no more than 60 words, keep names and facts"},
+                {"role": "user", "content": f"Earlier summary: {summary}\n\nConversation:\n{conversation}"},
+            ],
+        )
+        return response["choices"][0]["message"]["content"]
+
+    # The system message and the maximum number of tokens of the answer of every mode. They are looked up on every
+    # request instead of being stored on the chatbot, so requests in different modes can run at the same time
+    MODES = {
+        "assistant": ("Your name is {name}, you are a female ai assistant, be respectful and provide short answers",
+                      1000),
+        "short": ("rephrase prompt and provide answer within 50 words", 100),
+    }
+
+    # Modes whose prompts are self-contained, so their answers can be cached without looking at the history
+    STATELESS_MODES = ("short",)
+
+    def get_answer(self, prompt: str, mode: str = "assistant", stream: bool = False, use_cache: bool = None):
         """
         Generates a response to the prompt using the OpenAI API.
 
@@ -38,42 +142,87 @@ class ChatGPT:
             prompt (str): The prompt to generate a response to.
             mode (str): The mode of the response generation. Possible values are "assistant" (for generating
                 a complete and informative response) and "short" (for generating a short response within 25 words).
+            stream (bool): If True, return an iterator over the token deltas as they are generated instead of
+                waiting for the whole response. The response is added to the history once the iterator is exhausted.
+            use_cache (bool): Whether to look the answer up in the cache and store it there. Defaults to True for
+                stateless modes and to `cache_assistant` otherwise.
 
         Returns:
-            str: The generated response.
-        """
-        if mode == "assistant":
-            self.system_message = f"""
-                            Your name is {self.name}, you are a female ai assistant, be respectful and provide short answers
-                            """
-            self.token_limit = 1000
-        elif mode == "short":
-            self.system_message = f"""
-                            rephrase prompt and provide answer within 50 words
-                            """
-            self.token_limit = 100
-
-        openai.api_key = self.openai_api_key
-        user_prompt = {"role": "user", "content": prompt}
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            max_tokens=self.token_limit,
-            messages=[
-                {"role": "system",
-                 "content": self.system_message},
-                *self.chat_history,
-                user_prompt,
-            ],
+            str or Iterator[str]: The generated response, or an iterator over its token deltas if streaming.
+
+        Raises:
+            ValueError: If the mode is unknown.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown mode '{mode}', expected one of {sorted(self.MODES)}")
+        system_message, token_limit = self.MODES[mode]
+
+        history = self.history(mode)
+        messages = [
+            {"role": "system",
+             "content": system_message.format(name=self.name)},
+            *history.messages(),
+            {"role": "user", "content": prompt},
+        ]
+        self.last_prompt_tokens = count_message_tokens(messages)
+
+        if use_cache is None:
+            use_cache = mode in self.STATELESS_MODES or self.cache_assistant
+        cache_key = None
+        if self.cache is not None and use_cache:
+            cache_key = make_key("chat", prompt, mode,
+                                 None if mode in self.STATELESS_MODES else history.messages())
+            content = self.cache.get(cache_key)
+            if content is not None:
+                history.add_turn(prompt, content)
+                return iter([content]) if stream else content
+
+        if stream:
+            return self._stream_answer(prompt, history, messages, token_limit, cache_key)
+        response = self._create_completion(
+            max_tokens=token_limit,
+            messages=messages,
         )
         content = response["choices"][0]["message"]["content"]
-        self.chat_history.append(user_prompt)
-        self.chat_history.append({"role": "assistant", "content": content})
+        history.add_turn(prompt, content)
+        if cache_key is not None:
+            self.cache.set(cache_key, content)
         return content
 
-    @staticmethod
-    def web_searcher(prompt: str) -> str:
+    def _stream_answer(self, prompt: str, history: ChatHistory, messages: list, token_limit: int,
+                       cache_key: str = None):
+        """
+        Streams the response to the prompt and adds it to the history once it is complete.
+
+        Args:
+            prompt (str): The prompt to generate a response to.
+            history (ChatHistory): The history of the mode the prompt was sent in.
+            messages (list): The messages of the request.
+            token_limit (int): The maximum number of tokens of the response.
+            cache_key (str): The key to store the complete response under, if it should be cached.
+
+        Yields:
+            str: The token deltas of the response.
+        """
+        response = self._create_completion(
+            max_tokens=token_limit,
+            messages=messages,
+            stream=True,
+        )
+        parts = []
+        for chunk in response:
+            delta = chunk["choices"][0]["delta"].get("content")
+            if delta:
+                parts.append(delta)
+                yield delta
+        content = "".join(parts)
+        history.add_turn(prompt, content)
+        if cache_key is not None:
+            self.cache.set(cache_key, content)
+
+    def web_searcher(self, prompt: str) -> str:
         """
-        Searches Wikipedia for a summary of the given prompt.
+        Searches Wikipedia for a summary of the given prompt, using the cache if there is one.
 
         Args:
             prompt (str): The prompt to search on Wikipedia.
@@ -81,4 +230,11 @@ class ChatGPT:
         Returns:
             str: The summary of the prompt from Wikipedia.
         """
-        return wikipedia.summary(prompt)
+        if self.cache is None:
+            return wikipedia.summary(prompt)
+        cache_key = make_key("wikipedia", prompt)
+        summary = self.cache.get(cache_key)
+        if summary is None:
+            summary = wikipedia.summary(prompt)
+            self.cache.set(cache_key, summary)
+        return summary
@@ -0,0 +1,150 @@
+import threading
+
+# The tiktoken encoding, loaded on the first count: tiktoken downloads its BPE file on first use, which must not make
+# importing this module fail when the machine is offline
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+# Tokens the chat format adds around every message (role and separators), as documented for gpt-3.5-turbo
+TOKENS_PER_MESSAGE = 4
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+                except Exception:
+                    # Not installed, or its BPE file could not be downloaded: estimate for the rest of the run
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts the tokens of a text with tiktoken if it is installed and its encoding can be loaded, otherwise estimates
+    about 4 characters per token.
+
+    Args:
+        text (str): The text to count.
+
+    Returns:
+        int: The number of tokens.
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def count_message_tokens(messages: list) -> int:
+    """
+    Counts the prompt tokens of a list of chat messages.
+
+    Args:
+        messages (list): A list of {"role": ..., "content": ...} dictionaries.
+
+    Returns:
+        int: The number of tokens the messages take in a request.
+    """
+    return sum(TOKENS_PER_MESSAGE + count_tokens(message["content"]) for message in messages)
+
+
+class ChatHistory:
+    """
+    A class representing a bounded conversation memory that keeps the most recent turns within a token budget.
+
+    When a new turn goes over the budget, the oldest turns are evicted. If a summarizer is given, the evicted turns
+    are folded into a rolling summary that is sent as a system message in front of the remaining turns.
+
+    Attributes:
+        token_budget (int): The maximum number of tokens of the turns and the summary together.
+        summarizer (callable): An optional function (summary:str, evicted_messages:list) -> str.
+        summary (str): The rolling summary of the evicted turns.
+        turns (list): A list of turns, each a list of messages (a user prompt and the assistant response).
+
+    Methods:
+        add_turn(prompt:str, response:str):
+            Adds a turn to the history and evicts the oldest turns if the budget is exceeded.
+        messages() -> list:
+            Returns the messages to send before a new prompt.
+        token_count() -> int:
+            Returns the number of tokens of the messages.
+        clear():
+            Removes all turns and the summary.
+    """
+
+    def __init__(self, token_budget: int = 2000, summarizer=None):
+        """
+        Initializes a new instance of the ChatHistory class.
+
+        Args:
+            token_budget (int): The maximum number of tokens of the turns and the summary together.
+            summarizer (callable): An optional function (summary:str, evicted_messages:list) -> str that returns
+                the new rolling summary. Without it, evicted turns are dropped.
+        """
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+        self.summary = ""
+        self.turns = []
+        self._turn_tokens = []
+
+    def add_turn(self, prompt: str, response: str):
+        """
+        Adds a turn to the history and evicts the oldest turns if the budget is exceeded.
+
+        Args:
+            prompt (str): The user prompt.
+            response (str): The assistant response.
+        """
+        turn = [{"role": "user", "content": prompt}, {"role": "assistant", "content": response}]
+        self.turns.append(turn)
+        self._turn_tokens.append(count_message_tokens(turn))
+
+        while self.turns and self.token_count() > self.token_budget:
+            evicted = []
+            while self.turns and self.token_count() > self.token_budget:
+                evicted.extend(self.turns.pop(0))
+                self._turn_tokens.pop(0)
+            if self.summarizer is not None:
+                # The new summary can be longer than the old one, so evict again until both fit
+                self.summary = self.summarizer(self.summary, evicted)
+        if self.token_count() > self.token_budget:
+            # A summary that alone goes over the budget is useless
+            self.summary = ""
+
+    def _summary_message(self) -> list:
+        if not self.summary:
+            return []
+        return [{"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"}]
+
+    def messages(self) -> list:
+        """
+        Returns the messages to send before a new prompt: the summary (if any) followed by the kept turns.
+
+        Returns:
+            list: A list of {"role": ..., "content": ...} dictionaries.
+        """
+        return self._summary_message() + [message for turn in self.turns for message in turn]
+
+    def token_count(self) -> int:
+        """
+        Returns the number of tokens of the messages.
+
+        Returns:
+            int: The number of tokens of the summary and the kept turns.
+        """
+        return count_message_tokens(self._summary_message()) + sum(self._turn_tokens)
+
+    def clear(self):
+        """
+        Removes all turns and the summary.
+        """
+        self.summary = ""
+        self.turns = []
+        self._turn_tokens = []
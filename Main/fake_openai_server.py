@@ -0,0 +1,136 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+'''
+This is a local stand-in for the OpenAI chat completion API, used to test and benchmark the assistant without
+network access or an API key. It answers every request with the same reply; streamed requests receive the reply
+word by word as server-sent events, one chunk every `chunk_delay` seconds.
+Point ChatGPT at it with ChatGPT(name, "any key", api_base=server.url).
+'''
+
+
+class FakeOpenAIServer:
+    """
+    A local HTTP server that mimics `POST /v1/chat/completions`.
+
+    Attributes:
+        reply (str): The text every completion answers with.
+        chunk_delay (float): The delay between two streamed chunks, in seconds.
+        latency (float): The delay before the first byte of every response, in seconds.
+        requests (list): The JSON bodies of the requests received so far.
+        url (str): The base URL to pass as `api_base`.
+
+    Methods:
+        start() -> FakeOpenAIServer:
+            Starts serving in a background thread.
+        stop():
+            Stops the server.
+    """
+
+    def __init__(self, reply="Hello! This is a streamed answer. It has a few sentences. Here is the last one.",
+                 chunk_delay=0.05, latency=0.2, host="127.0.0.1", port=0):
+        """
+        Initializes the server, binding it to the given host and port (0 picks a free port).
+
+        Args:
+            reply (str): The text every completion answers with.
+            chunk_delay (float): The delay between two streamed chunks, in seconds.
+            latency (float): The delay before the first byte of every response, in seconds.
+            host (str): The host to bind to.
+            port (int): The port to bind to.
+        """
+        self.reply = reply
+        self.chunk_delay = chunk_delay
+        self.latency = latency
+        self.requests = []
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self.url = f"http://{host}:{self._server.server_address[1]}/v1"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                # Keep the console quiet, the requests are recorded in server.requests instead
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                server.requests.append(body)
+                time.sleep(server.latency)
+                if body.get("stream"):
+                    self._stream()
+                else:
+                    self._respond()
+
+            def _respond(self):
+                payload = json.dumps({
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": "gpt-3.5-turbo",
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": server.reply}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                words = server.reply.split(" ")
+                deltas = [{"role": "assistant"}] + [{"content": (" " if i else "") + word}
+                                                    for i, word in enumerate(words)] + [{}]
+                for i, delta in enumerate(deltas):
+                    chunk = {
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": "gpt-3.5-turbo",
+                        "choices": [{"index": 0, "delta": delta,
+                                     "finish_reason": "stop" if i == len(deltas) - 1 else None}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    time.sleep(server.chunk_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
+
+    def start(self):
+        """
+        Starts serving in a background thread.
+
+        Returns:
+            FakeOpenAIServer: The server itself.
+        """
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the OpenAI chat completion API.")
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--chunk-delay', type=float, default=0.05)
+    parser.add_argument('--latency', type=float, default=0.2)
+    args = parser.parse_args()
+    fake = FakeOpenAIServer(chunk_delay=args.chunk_delay, latency=args.latency, port=args.port)
+    print(f"Serving fake chat completions at {fake.url}")
+    fake._server.serve_forever()
@@ -0,0 +1,165 @@
+import argparse
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+'''
+This is a local stand-in for the weather sources of weather_providers, used to test and benchmark the weather skill
+without network access. It serves a Google-like results page with a weather card (padded with scripts and markup to
+the size of a real results page) and the geocoding and forecast endpoints of the Open-Meteo JSON API. The weather of
+a city is derived from its name, so the same city always gets the same answer.
+Point a provider at it with GoogleProvider(url=server.google_url) or
+OpenMeteoProvider(geocoding_url=server.geocoding_url, forecast_url=server.forecast_url).
+'''
+
+DESCRIPTIONS = [(0, "Sunny"), (2, "Partly cloudy"), (3, "Cloudy"), (61, "Light rain"), (71, "Light snow")]
+
+
+def fake_weather(city):
+    """
+    Derives the weather of a city from its name.
+
+    Args:
+        city (str): The city.
+
+    Returns:
+        tuple: The WMO weather code, its description and the temperature in °C.
+    """
+    seed = zlib.crc32(city.strip().lower().encode("utf-8"))
+    code, description = DESCRIPTIONS[seed % len(DESCRIPTIONS)]
+    return code, description, seed % 35 - 5
+
+
+def results_page(city, padding=400_000):
+    """
+    Renders a results page with the weather card of a city.
+
+    Args:
+        city (str): The city.
+        padding (int): The approximate number of characters of markup around the card.
+
+    Returns:
+        str: The HTML of the page.
+    """
+    _, description, temperature = fake_weather(city)
+    filler = '<div class="g"><a href="https://example.com/">A result</a><span>Some snippet text.</span></div>'
+    script = '<script>var data = {"a": [1, 2, 3], "b": "</div><span>"};</script>'
+    half = padding // 2 // (len(filler) + len(script)) + 1
+    return (f'<!doctype html><html><head><title>{city} weather</title>{script * half}</head><body>'
+            f'{filler * half}'
+            f'<div class="wob"><div class="wob_loc">{city.title()}</div>'
+            f'<div id="wob_dts">Sunday 10:00 AM</div>'
+            f'<div class="wob_t"><span id="wob_tm" class="wob_t">{temperature}</span><span>°C</span></div>'
+            f'<img src="sun.png" alt="{description}"><span id="wob_dc">{description}</span></div>'
+            f'{filler * half}</body></html>')
+
+
+class FakeWeatherServer:
+    """
+    A local HTTP server that mimics Google's results page and the Open-Meteo API. It keeps connections alive, so
+    a pooled session reuses them as with the real sources.
+
+    Attributes:
+        latency (float): The delay before the first byte of every response, in seconds.
+        padding (int): The approximate number of characters of markup around the weather card.
+        requests (list): The paths of the requests received so far.
+        url (str): The base URL of the server.
+        google_url (str): The URL to pass to GoogleProvider.
+        geocoding_url (str): The geocoding URL to pass to OpenMeteoProvider.
+        forecast_url (str): The forecast URL to pass to OpenMeteoProvider.
+    """
+
+    def __init__(self, latency=0.05, padding=400_000, host="127.0.0.1", port=0):
+        """
+        Initializes the server, binding it to the given host and port (0 picks a free port).
+
+        Args:
+            latency (float): The delay before the first byte of every response, in seconds.
+            padding (int): The approximate number of characters of markup around the weather card.
+            host (str): The host to bind to.
+            port (int): The port to bind to.
+        """
+        self.latency = latency
+        self.padding = padding
+        self.requests = []
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self.url = f"http://{host}:{self._server.server_address[1]}"
+        self.google_url = self.url + "/search"
+        self.geocoding_url = self.url + "/v1/search"
+        self.forecast_url = self.url + "/v1/forecast"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Send the small JSON responses at once instead of waiting for the client's delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                # Keep the console quiet, the requests are recorded in server.requests instead
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {name: values[0] for name, values in parse_qs(url.query).items()}
+                server.requests.append(self.path)
+                time.sleep(server.latency)
+                if url.path == "/search":
+                    city = query.get("q", "").rsplit(" weather", 1)[0]
+                    self._respond(results_page(city, server.padding), "text/html; charset=utf-8")
+                elif url.path == "/v1/search":
+                    # The coordinates encode the city, so the forecast can find it again
+                    name = query.get("name", "")
+                    latitude = zlib.crc32(name.strip().lower().encode("utf-8")) % 180 - 90
+                    self._respond(json.dumps({"results": [{"name": name.title(), "latitude": latitude,
+                                                           "longitude": 0.0}]}),
+                                  "application/json")
+                elif url.path == "/v1/forecast":
+                    code, _, temperature = fake_weather(query.get("latitude", ""))
+                    self._respond(json.dumps({"current_weather": {"time": "2024-05-05T10:00", "weathercode": code,
+                                                                  "temperature": float(temperature)}}),
+                                  "application/json")
+                else:
+                    self.send_error(404)
+
+            def _respond(self, body, content_type):
+                payload = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+    def start(self):
+        """
+        Starts serving in a background thread.
+
+        Returns:
+            FakeWeatherServer: The server itself.
+        """
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the weather sources.")
+    parser.add_argument('--port', type=int, default=8002)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+    fake = FakeWeatherServer(latency=args.latency, port=args.port)
+    print(f"Serving fake weather at {fake.google_url} and {fake.url}/v1")
+    fake._server.serve_forever()
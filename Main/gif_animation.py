@@ -1,62 +1,176 @@
+import collections
 import tkinter as tk
 from PIL import Image, ImageTk
-from itertools import count, cycle
 
-class ImageLabel(tk.Label):
+
+class Animation:
     """
-    A Tkinter label widget that displays an animated image. It can load an animated image from a file path and display it
-    using the PIL library. The widget cycles through each frame of the image and displays it with a given delay time.
+    The frames of an animated image, decoded one at a time when they are first shown instead of all up front.
+
+    Attributes:
+        image (Image): The PIL image, positioned at the last decoded frame.
+        path (str): The file of the image, or None.
+        animated (bool): Whether the image has more than one frame.
+        length (int): The number of frames, None until the last frame has been decoded.
     """
 
-    def load(self, im):
+    def __init__(self, im):
         """
-        Loads an animated image from a file path or PIL Image object and prepares the widget to display it.
+        Opens an animated image. Only its header and the start of its second frame are read, the frames are not
+        counted up front.
 
         Args:
             im: A file path or a PIL Image object representing the animated image.
         """
-        if isinstance(im, str):
-            # If the input is a string, open it as an image file
-            im = Image.open(im)
+        # If the input is a string, open it as an image file
+        self.path = im if isinstance(im, str) else None
+        self.image = Image.open(im) if isinstance(im, str) else im
+        self.animated = getattr(self.image, 'is_animated', False)
+        self.length = None if self.animated else 1
+
+    def decode(self, index):
+        """
+        Decodes a frame of the animated image.
 
-        frames = []
+        Args:
+            index (int): The index of the frame.
+
+        Returns:
+            tuple: A copy of the frame as a PIL Image and its delay in ms (100 ms when the image has none).
+
+        Raises:
+            EOFError: The index is past the last frame, whose index sets `length`.
+        """
         try:
-            # Iterate over each frame of the animated image and create a PhotoImage object from it
-            for i in count(1):
-                frames.append(ImageTk.PhotoImage(im.copy()))
-                im.seek(i)
+            self.image.seek(index)
         except EOFError:
-            # When the end of the image file is reached, continue to the next step
-            pass
+            self.length = index
+            raise
+        return self.image.copy(), self.image.info.get('duration') or 100
 
-        # Create an iterator that cycles through the PhotoImage objects
-        self.frames = cycle(frames)
 
-        try:
-            # Try to get the delay time of the animated image from its metadata
-            self.delay = im.info['duration']
-        except:
-            # If no delay time is specified in the metadata, set it to 100ms by default
-            self.delay = 100
-
-        if len(frames) == 1:
-            # If there is only one frame in the animated image, display it directly
-            self.config(image=next(self.frames))
-        else:
-            # If there are multiple frames, start displaying the frames with a given delay time
-            self.next_frame()
+class ImageLabel(tk.Label):
+    """
+    A Tkinter label widget that displays an animated image. It can load an animated image from a file path and display it
+    using the PIL library. The widget cycles through each frame of the image and displays it with its delay time.
+
+    Every state of the assistant (e.g. "listening", "thinking" or "speaking") can have an animation of its own. The
+    frames are decoded when they are first shown and kept in a bounded cache, and the animation is paused on its
+    current frame in a state without an animation, so an idle assistant does not redraw anything.
+    """
+
+    def __init__(self, master=None, cache_size=32, **kwargs):
+        """
+        Args:
+            master: The parent widget.
+            cache_size (int): How many decoded frames are kept, the least recently shown is dropped first.
+            **kwargs: The options of the label.
+        """
+        super().__init__(master, **kwargs)
+        self.cache_size = cache_size
+        self.animations = {}
+        self.state = None
+        self.frames = collections.OrderedDict()
+        self._animation = None
+        self._index = 0
+        self._photo = None
+        self._job = None
+
+    def load(self, im, state='default'):
+        """
+        Loads an animated image from a file path or PIL Image object as the animation of a state. The first animation
+        loaded starts playing right away. States loaded from the same file share its decoded frames.
+
+        Args:
+            im: A file path or a PIL Image object representing the animated image.
+            state (str): The state the animation is shown in.
+        """
+        shared = [animation for animation in self.animations.values() if isinstance(im, str) and animation.path == im]
+        self.animations[state] = shared[0] if shared else Animation(im)
+        if self.state is None or self.state == state:
+            self.show(state)
+
+    def set_state(self, state):
+        """
+        Switches to the animation of a state. It can be called from any thread, e.g. by the turn pipeline.
+
+        Args:
+            state (str): The state of the assistant.
+        """
+        self.after(0, self.show, state)
+
+    def show(self, state):
+        """
+        Shows the animation of a state from its first frame, or pauses on the current frame if the state has none.
+        An animation shared with the previous state goes on from where it is.
+
+        Args:
+            state (str): The state of the assistant.
+        """
+        self.state = state
+        animation = self.animations.get(state)
+        if animation is None:
+            self.pause()
+            return
+        if animation is self._animation:
+            if self._job is None:
+                self.next_frame()
+            return
+        self.pause()
+        self._animation = animation
+        self._index = 0
+        self.next_frame()
+
+    def pause(self):
+        """
+        Stops the animation on its current frame.
+        """
+        if self._job is not None:
+            self.after_cancel(self._job)
+            self._job = None
 
     def unload(self):
         """
-        Unloads the animated image from the widget and removes it.
+        Unloads the animated images from the widget and removes them.
         """
-        self.config(image=None)
-        self.frames = None
+        self.pause()
+        self.config(image='')
+        self.animations = {}
+        self.frames.clear()
+        self._animation = None
+        self._photo = None
 
     def next_frame(self):
         """
-        Displays the next frame of the animated image with a given delay time.
+        Displays the next frame of the animated image and schedules the one after it with the frame's delay time.
         """
-        if self.frames:
-            self.config(image=next(self.frames))
-            self.after(self.delay, self.next_frame)
+        if self._animation is None:
+            return
+        if self._animation.length is not None:
+            self._index %= self._animation.length
+        try:
+            photo, delay = self._frame(self._animation, self._index)
+        except EOFError:
+            # The end of the first run through the animation, start over
+            self._index = 0
+            photo, delay = self._frame(self._animation, self._index)
+        # The label does not keep the image alive, it may be dropped from the cache while it is shown
+        self._photo = photo
+        self.config(image=photo)
+        if self._animation.animated:
+            self._index += 1
+            self._job = self.after(delay, self.next_frame)
+        else:
+            self._job = None
+
+    def _frame(self, animation, index):
+        key = (id(animation), index)
+        frame = self.frames.get(key)
+        if frame is not None:
+            self.frames.move_to_end(key)
+            return frame
+        image, delay = animation.decode(index)
+        frame = self.frames[key] = (ImageTk.PhotoImage(image), delay)
+        while len(self.frames) > self.cache_size:
+            self.frames.popitem(last=False)
+        return frame
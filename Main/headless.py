@@ -0,0 +1,347 @@
+import argparse
+import asyncio
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from intent_batcher import IntentBatcher
+from response_cache import ResponseCache
+from skills import registry, SharedResources, SkillContext
+from startup import Startup
+from tracing import Tracer
+from turn_pipeline import TurnPipeline
+
+'''
+The assistant without the Tk window, the microphone or the speakers.
+It serves the same intent -> skill logic over stdin (a REPL) or over a small local HTTP and WebSocket API, with any
+number of concurrent sessions. Every session has its own ChatGPT history, while the intent model, the response cache
+and the worker pool are shared. Together with the fake OpenAI server and the silent TTS backend it runs the whole
+turn pipeline without network access, e.g. to load test it:
+
+    python fake_openai_server.py --port 8001
+    python headless.py --serve --port 8080 --api-base http://127.0.0.1:8001/v1 --tts silent
+
+HTTP API:
+    POST   /sessions                  -> {"session": id}
+    POST   /sessions/{id}/messages    {"text": ...} -> {"lines": [...], "ended": bool}
+    DELETE /sessions/{id}
+    GET    /sessions/{id}/ws          WebSocket: every text message is answered with {"line": ...} for every line as
+                                      soon as it is printed, then {"done": true, "ended": bool}
+    GET    /stats                     -> {"sessions": n, "skills": {...}, "errors": {...}, "intent_batches": {...}}
+    GET    /metrics                   The per-stage latency histograms and exception counters (Prometheus format)
+'''
+
+
+class Session:
+    """
+    One conversation with the assistant, running its own turn pipeline. A message is either a new utterance or the
+    answer to the follow-up question the previous reply ended with. The pipeline only runs while a message is being
+    answered, so an idle session keeps no task or queue, only its ChatGPT history.
+
+    Attributes:
+        id (str): The identifier of the session.
+        context (SkillContext): The components of the session's skills, including its own ChatGPT history.
+        ended (bool): Whether the user said goodbye or the session was closed. An ended session is removed from the
+            open sessions of the assistant.
+    """
+    def __init__(self, assistant, session_id):
+        self.id = session_id
+        self.assistant = assistant
+        self.context = SkillContext(assistant.shared)
+        self.ended = False
+        self.pipeline = TurnPipeline(self._dispatch, assistant.classifier, assistant.name,
+                                     interactive_intents=assistant.interactive_intents,
+                                     text_to_speech=assistant.text_to_speech, output=self._output, ask=self._ask,
+                                     on_turn_end=self._turn_ended, executor=assistant.executor,
+                                     tracer=assistant.tracer)
+        self._lock = asyncio.Lock()
+        self._answer = None  # The future of the answer to a pending follow-up question
+        self._reply = None  # The future resolved when the reply to the last message is complete
+        self._lines = []
+        self._on_line = None
+        self._task = None  # The task running the pipeline while messages are answered
+
+    async def send(self, text, on_line=None):
+        """
+        Sends a message and waits for the reply, until the turn has ended or asks a follow-up question.
+
+        Args:
+            text (str): The message.
+            on_line (callable): Called with every line of the reply as soon as it is printed.
+
+        Returns:
+            list: The lines of the reply.
+        """
+        async with self._lock:
+            if self.ended:
+                return []
+            self._lines = []
+            self._on_line = on_line
+            self._reply = asyncio.get_running_loop().create_future()
+            if self._answer is not None:
+                answer, self._answer = self._answer, None
+                answer.set_result(text)
+            else:
+                self.pipeline.submit(text)
+                if self._task is None:
+                    self._task = asyncio.ensure_future(self._run())
+            await self._reply
+            return self._lines
+
+    async def close(self):
+        """
+        Ends the session and waits for its pipeline to stop.
+        """
+        self.ended = True
+        if self._task is not None:
+            self.pipeline.close_input()
+        if self._answer is not None:
+            self._answer.set_exception(EOFError("The session was closed"))
+            self._answer = None
+        if self._task is not None:
+            await self._task
+        self._complete_reply()
+
+    async def _run(self):
+        try:
+            # Run again if messages were submitted while the pipeline was stopping
+            while True:
+                await self.pipeline.run(until_idle=True)
+                if self.ended or not self.pipeline.pending:
+                    break
+        except BaseException:
+            self.ended = True
+            raise
+        finally:
+            self._task = None
+            if self.ended:
+                self.assistant.sessions.pop(self.id, None)
+            self._complete_reply()
+
+    async def _dispatch(self, turn):
+        await registry.dispatch(turn, self.context)
+
+    def _output(self, line):
+        self._lines.append(line)
+        if self._on_line is not None:
+            self._on_line(line)
+
+    async def _ask(self, prompt):
+        # The question has been printed: the reply is complete, and the next message is the answer
+        self._answer = asyncio.get_running_loop().create_future()
+        self._complete_reply()
+        return await self._answer
+
+    def _turn_ended(self, turn):
+        if turn.end_session:
+            self.ended = True
+        self._complete_reply()
+
+    def _complete_reply(self):
+        if self._reply is not None and not self._reply.done():
+            self._reply.set_result(None)
+
+
+class HeadlessAssistant:
+    """
+    The shared resources of the headless assistant and its open sessions. A session only adds its own pipeline,
+    which holds no queue or task while idle, and its ChatGPT history.
+
+    Attributes:
+        name (str): The name of the assistant.
+        chatbot (ChatBot): The intent classifier, shared by all sessions.
+        classifier (IntentBatcher or ChatBot): What the sessions classify with: a batcher in front of the chatbot, so
+            the utterances of concurrent sessions share one forward pass, or the chatbot itself.
+        shared (SharedResources): The resources of the skills shared by all sessions (response cache, movie
+            recommender, HTTP pool).
+        text_to_speech (TextToSpeech): The speech synthesizer playing into a NullSink, or None to only print.
+        executor (ThreadPoolExecutor): The worker pool of the blocking calls of all sessions.
+        tracer (Tracer): Records the spans of the turns of all sessions.
+        interactive_intents (frozenset): The intents whose skills ask follow-up questions, shared by all sessions.
+        sessions (dict): The open sessions by identifier.
+    """
+    def __init__(self, name, gpt_token, api_base=None, tts_backend=None, cache_path="response_cache.sqlite3",
+                 workers=32, batch_intents=True, trace_file=None, weather_provider="google", weather_options=None):
+        """
+        Loads the shared resources.
+
+        Args:
+            name (str): The name of the assistant.
+            gpt_token (str): The API token for OpenAI.
+            api_base (str): The base URL of the OpenAI API, e.g. a FakeOpenAIServer, or None for OpenAI.
+            tts_backend (str): The name of a text to speech backend (see tts_backends) to synthesize the replies with,
+                or None to only print them.
+            cache_path (str): The file of the response cache, or None for no cache.
+            workers (int): The size of the worker pool shared by the sessions.
+            batch_intents (bool): Whether the utterances of concurrent sessions are classified in micro-batches.
+            trace_file (str): A JSON lines file every span of every turn is appended to, or None.
+            weather_provider (str): The name of the weather provider (see weather_providers).
+            weather_options (dict): More arguments of the weather provider, e.g. the URLs of a FakeWeatherServer.
+        """
+        self.name = name
+        self.tracer = Tracer(trace_file)
+        # The intent model and the speech synthesizer load in parallel
+        self.startup = Startup(self.tracer)
+        chatbot = self.startup.submit("intent model", self._create_chatbot)
+        text_to_speech = self.startup.submit("text to speech", self._create_text_to_speech, tts_backend)
+        self.shared = self.startup.run("response cache", lambda: SharedResources(
+            name, gpt_token, cache=ResponseCache(cache_path) if cache_path else None, api_base=api_base,
+            weather_provider=weather_provider, weather_options=weather_options))
+        self.chatbot = chatbot.result()
+        self.classifier = IntentBatcher(self.chatbot) if batch_intents else self.chatbot
+        self.text_to_speech = text_to_speech.result()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='turn')
+        self.interactive_intents = frozenset(registry.interactive_intents)
+        self.sessions = {}
+        self.startup.ready()
+
+    @staticmethod
+    def _create_chatbot():
+        from model_application import ChatBot
+
+        return ChatBot('intents.json', 'chatbot1.h5')
+
+    @staticmethod
+    def _create_text_to_speech(tts_backend):
+        if not tts_backend:
+            return None
+        from text_to_speech import NullSink, TextToSpeech
+        from tts_backends import create_backend
+
+        return TextToSpeech(create_backend(tts_backend), sink=NullSink())
+
+    def open_session(self):
+        """
+        Opens a new session. Must be called from the event loop.
+
+        Returns:
+            Session: The session.
+        """
+        session = Session(self, uuid.uuid4().hex)
+        self.sessions[session.id] = session
+        return session
+
+    async def close_session(self, session_id):
+        """
+        Closes a session.
+
+        Args:
+            session_id (str): The identifier of the session.
+        """
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            await session.close()
+
+    async def repl(self):
+        """
+        Chats with the user over stdin and stdout until they say goodbye or close stdin.
+        """
+        session = self.open_session()
+        loop = asyncio.get_running_loop()
+        while not session.ended:
+            try:
+                text = await loop.run_in_executor(None, input)
+            except EOFError:
+                break
+            if text.strip():
+                await session.send(text, on_line=print)
+        await self.close_session(session.id)
+
+    def make_app(self):
+        """
+        Builds the HTTP and WebSocket API (needs aiohttp).
+
+        Returns:
+            aiohttp.web.Application: The application.
+        """
+        from aiohttp import web, WSMsgType
+
+        def get_session(request):
+            session = self.sessions.get(request.match_info['session_id'])
+            if session is None:
+                raise web.HTTPNotFound(text="Unknown session")
+            return session
+
+        async def create_session(request):
+            return web.json_response({'session': self.open_session().id}, status=201)
+
+        async def post_message(request):
+            session = get_session(request)
+            body = await request.json()
+            lines = await session.send(str(body['text']))
+            return web.json_response({'lines': lines, 'ended': session.ended})
+
+        async def delete_session(request):
+            await self.close_session(get_session(request).id)
+            return web.Response(status=204)
+
+        async def websocket(request):
+            session = get_session(request)
+            ws = web.WebSocketResponse()
+            await ws.prepare(request)
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                lines = asyncio.Queue()
+                reply = asyncio.ensure_future(session.send(message.data, on_line=lines.put_nowait))
+                # Forward every line as soon as it is printed, e.g. the sentences of a streamed answer
+                while not (reply.done() and lines.empty()):
+                    getter = asyncio.ensure_future(lines.get())
+                    await asyncio.wait([getter, reply], return_when=asyncio.FIRST_COMPLETED)
+                    if getter.done():
+                        await ws.send_json({'line': getter.result()})
+                    else:
+                        getter.cancel()
+                await ws.send_json({'done': True, 'ended': session.ended})
+            return ws
+
+        async def stats(request):
+            stats = {'sessions': len(self.sessions), 'skills': registry.stats(), 'errors': self.tracer.errors}
+            if isinstance(self.classifier, IntentBatcher):
+                stats['intent_batches'] = self.classifier.stats()
+            return web.json_response(stats)
+
+        async def metrics(request):
+            return web.Response(text=self.tracer.prometheus(), content_type='text/plain')
+
+        async def close_sessions(app):
+            await asyncio.gather(*(self.close_session(session_id) for session_id in list(self.sessions)))
+
+        app = web.Application()
+        app.add_routes([web.post('/sessions', create_session),
+                        web.post('/sessions/{session_id}/messages', post_message),
+                        web.delete('/sessions/{session_id}', delete_session),
+                        web.get('/sessions/{session_id}/ws', websocket),
+                        web.get('/stats', stats),
+                        web.get('/metrics', metrics)])
+        app.on_shutdown.append(close_sessions)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the assistant headless, over stdin or a local HTTP API.")
+    parser.add_argument('--serve', action='store_true', help="Serve the HTTP and WebSocket API instead of a REPL.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--name', default='Assistant')
+    parser.add_argument('--api-key', default=os.environ.get('OPENAI_API_KEY', 'none'),
+                        help="The OpenAI API key, any text works with a fake server.")
+    parser.add_argument('--api-base', default=None, help="The base URL of the OpenAI API, e.g. a fake server.")
+    parser.add_argument('--tts', default=None, help="A text to speech backend to synthesize the replies with.")
+    parser.add_argument('--trace', default=None, help="A JSON lines file to append the spans of the turns to.")
+    parser.add_argument('--cache', default='response_cache.sqlite3', help="The response cache file, '' for none.")
+    parser.add_argument('--weather', default='google', help="The weather provider, 'google' or 'open-meteo'.")
+    args = parser.parse_args()
+
+    assistant = HeadlessAssistant(args.name, args.api_key, api_base=args.api_base, tts_backend=args.tts,
+                                  cache_path=args.cache, trace_file=args.trace, weather_provider=args.weather)
+    print(assistant.startup.report())
+    if args.serve:
+        from aiohttp import web
+
+        web.run_app(assistant.make_app(), host=args.host, port=args.port)
+    else:
+        asyncio.run(assistant.repl())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+'''
+A micro-batching scheduler in front of the intent model.
+Concurrent callers (sessions, transcript workers) submit single texts; a worker thread collects them for up to
+`max_wait` seconds or `max_batch` texts, classifies them with one vectorized forward pass and resolves the future of
+every caller. Under load, the requests that arrive while a batch is running form the next batch, so the model runs
+once per batch instead of once per text.
+'''
+
+
+class IntentBatcher:
+    """
+    Classifies texts submitted from any thread in batches with one ChatBot.
+
+    Attributes:
+        chatbot (ChatBot): The intent classifier.
+        max_batch (int): The maximum number of texts per forward pass.
+        max_wait (float): How many seconds the first text of a batch waits for more texts to arrive.
+        tags (list): The intent tags of the chatbot.
+        responses (dict): The responses of every tag of the chatbot.
+    """
+    def __init__(self, chatbot, max_batch=32, max_wait=0.0):
+        """
+        Starts the worker thread.
+
+        Args:
+            chatbot (ChatBot): The intent classifier.
+            max_batch (int): The maximum number of texts per forward pass.
+            max_wait (float): How many seconds the first text of a batch waits for more texts to arrive, 0 to only
+                batch the texts that queued up while the previous batch ran. The NumPy forward pass of a single text
+                takes tens of microseconds, so waiting only pays off for a slower model (e.g. the Keras backend).
+        """
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        self.chatbot = chatbot
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.tags = chatbot.tags
+        self.responses = chatbot.responses
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = collections.Counter()
+        self._max_queue_depth = 0
+        self._worker = threading.Thread(target=self._run, name='intent-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, text):
+        """
+        Queues a text for classification.
+
+        Args:
+            text (str): The input text.
+
+        Returns:
+            concurrent.futures.Future: The future of the IntentResult of the text. In a coroutine, await it with
+                `asyncio.wrap_future`.
+        """
+        future = Future()
+        self._queue.put((text, future))
+        depth = self._queue.qsize()
+        if depth > self._max_queue_depth:
+            self._max_queue_depth = depth
+        return future
+
+    def classify(self, text):
+        """
+        Classifies a text, blocking until its batch has run. It can replace `ChatBot.classify`.
+
+        Args:
+            text (str): The input text.
+
+        Returns:
+            IntentResult: The classification result.
+        """
+        return self.submit(text).result()
+
+    def predict_intent(self, text):
+        return self.classify(text).tag
+
+    @property
+    def queue_depth(self):
+        """
+        The number of texts waiting for a batch.
+        """
+        return self._queue.qsize()
+
+    def stats(self):
+        """
+        Summarizes the batches run so far.
+
+        Returns:
+            dict: The number of batches and texts, the mean and max batch size, the histogram of the batch sizes,
+                and the current and max queue depth.
+        """
+        with self._lock:
+            sizes = dict(self._batch_sizes)
+        batches = sum(sizes.values())
+        texts = sum(size * count for size, count in sizes.items())
+        return {'batches': batches,
+                'texts': texts,
+                'mean_batch_size': texts / batches if batches else 0.0,
+                'max_batch_size': max(sizes, default=0),
+                'batch_sizes': dict(sorted(sizes.items())),
+                'queue_depth': self.queue_depth,
+                'max_queue_depth': self._max_queue_depth}
+
+    def close(self):
+        """
+        Classifies the texts already submitted and stops the worker thread.
+        """
+        self._queue.put(None)
+        self._worker.join()
+
+    def _run(self):
+        closing = False
+        while not closing:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait
+            # Collect more texts until the batch is full or the first one has waited long enough
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        # Skip the callers that cancelled their future while it was queued
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        with self._lock:
+            self._batch_sizes[len(batch)] += 1
+        try:
+            results = self.chatbot.classify_batch([text for text, _ in batch])
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import numpy as np
+
+# Same defaults as keras.preprocessing.text.Tokenizer, so the binary matrices match the ones used for training
+FILTERS = '!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n'
+FORMAT_VERSION = 1
+
+
+def hash_intents(data):
+    """
+    Hashes the parts of the intents data that the trained model depends on (the tags and their patterns).
+
+    Args:
+        data (dict): The data loaded from the intents file.
+
+    Returns:
+        str: The hex SHA-256 digest of the tags and patterns.
+    """
+    content = [[intent['tag'], intent['patterns']] for intent in data['intents']]
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def text_to_words(text):
+    """
+    Splits a text into lowercase words the same way `keras.preprocessing.text.text_to_word_sequence` does.
+
+    Args:
+        text (str): The input text.
+
+    Returns:
+        list: The words of the text.
+    """
+    text = text.lower().translate(str.maketrans({c: ' ' for c in FILTERS}))
+    return [word for word in text.split(' ') if word]
+
+
+class IntentVocabulary:
+    """
+    The vocabulary and labels of the trained intent model, stored next to the model file as a small JSON artifact.
+
+    It replaces re-fitting a Keras `Tokenizer` and a sklearn `LabelEncoder` at every startup and does not need
+    TensorFlow or sklearn to vectorize a text.
+
+    Attributes:
+        word_index (dict): Maps every known word to its column in the binary matrix (starting at 1).
+        labels (list): The tags in the order of the model's output classes.
+        intents_hash (str): The hash of the intents the vocabulary was built from.
+        num_columns (int): The number of columns of the binary matrix.
+
+    Methods:
+        fit(data): Builds the vocabulary from the intents data like the training script does.
+        load(file_path): Reads the vocabulary from a JSON artifact.
+        save(file_path): Writes the vocabulary to a JSON artifact.
+        texts_to_matrix(texts): Converts texts to a binary bag-of-words matrix.
+    """
+
+    def __init__(self, word_index, labels, intents_hash):
+        """
+        Initializes the `IntentVocabulary` object.
+
+        Args:
+            word_index (dict): Maps every known word to its column in the binary matrix (starting at 1).
+            labels (list): The tags in the order of the model's output classes.
+            intents_hash (str): The hash of the intents the vocabulary was built from.
+        """
+        self.word_index = word_index
+        self.labels = labels
+        self.intents_hash = intents_hash
+        self.num_columns = len(word_index) + 1
+
+    @classmethod
+    def fit(cls, data):
+        """
+        Builds the vocabulary from the intents data, ordering the words like `Tokenizer.fit_on_texts` and the
+        labels like `LabelEncoder.fit`.
+
+        Args:
+            data (dict): The data loaded from the intents file.
+
+        Returns:
+            IntentVocabulary: The fitted vocabulary.
+        """
+        word_counts = {}
+        for intent in data['intents']:
+            for pattern in intent['patterns']:
+                for word in text_to_words(pattern):
+                    word_counts[word] = word_counts.get(word, 0) + 1
+        # sorted() is stable, so words with the same count keep their first-seen order like in Keras
+        words = sorted(word_counts, key=word_counts.get, reverse=True)
+        word_index = {word: i for i, word in enumerate(words, start=1)}
+        labels = sorted({intent['tag'] for intent in data['intents']})
+        return cls(word_index, labels, hash_intents(data))
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Reads the vocabulary from a JSON artifact written by `save` or by the training script.
+
+        Args:
+            file_path (str): The path of the artifact.
+
+        Returns:
+            IntentVocabulary: The loaded vocabulary.
+        """
+        with open(file_path) as file:
+            artifact = json.load(file)
+        if artifact.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported vocabulary version {artifact.get('version')} in {file_path}")
+        return cls(artifact['word_index'], artifact['labels'], artifact['intents_hash'])
+
+    def save(self, file_path):
+        """
+        Writes the vocabulary to a JSON artifact.
+
+        Args:
+            file_path (str): The path of the artifact.
+        """
+        artifact = {
+            'version': FORMAT_VERSION,
+            'intents_hash': self.intents_hash,
+            'labels': self.labels,
+            'word_index': self.word_index,
+        }
+        with open(file_path, 'w') as file:
+            json.dump(artifact, file, indent=1)
+
+    def texts_to_matrix(self, texts):
+        """
+        Converts texts to a binary bag-of-words matrix, like `Tokenizer.texts_to_matrix(texts, mode='binary')`.
+        Unknown words are ignored.
+
+        Args:
+            texts (list): The input texts.
+
+        Returns:
+            numpy.ndarray: A (len(texts), num_columns) matrix of zeros and ones.
+        """
+        matrix = np.zeros((len(texts), self.num_columns), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text_to_words(text):
+                column = self.word_index.get(word)
+                if column is not None:
+                    matrix[row, column] = 1.0
+        return matrix
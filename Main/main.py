@@ -1,22 +1,31 @@
-import subprocess
-
 '''
 This is a script that runs the program of the AI Assistant.
 It first specifies the name of the AI assistant, which is set to 'Eve' in this case. 
 It also requires the OpenAI API key to be set.
-It then runs the assistant by using the subprocess module's run method, 
-which takes a list of arguments that specify the command to run. 
-It runs the assistant_gpt Python module's Assistant class with the specified name and API_key as arguments.
-The stderr=subprocess.DEVNULL argument is used to discard any error output from the command.
+It then runs the assistant_gpt Python module's Assistant class with the specified name and API_key as arguments, in
+this process, so the assistant starts without a second interpreter and its errors are shown. The assistant's heavy
+modules are imported by the components that need them, and it prints how long every component took to start.
 '''
 #Name your AI Assistant
 name = 'Eve'
 #Input your OpenAI API Secret Key
 API_key = "Your API Key"
+#Choose the text to speech backend: "gtts" (online), "espeak" or "pyttsx3" (offline),
+#or "auto" to use gTTS and fall back to an installed offline backend when the network is slow
+TTS_backend = "auto"
+#Choose the speech recognition engine: "google" (online) or "vosk" (offline, needs a Vosk model in the Main folder)
+STT_engine = "google"
+#Choose whether you can interrupt the assistant by speaking over it (True), or the microphone is paused while it
+#speaks (False). Barge-in works best with headphones or a microphone that hears little of the speakers
+Barge_in = False
+#Optionally record the latency of every stage of every turn: a JSON lines file (e.g. "traces.jsonl") and/or a port
+#serving Prometheus metrics at http://127.0.0.1:<port>/metrics, None to disable
+Trace_file = None
+Metrics_port = None
+
 
+# run Assistant
+if __name__ == '__main__':
+    from assistant_gpt import Assistant
 
-# run Assistant and discard output
-try:
-    subprocess.run([f"python", "-c", f"from assistant_gpt import Assistant; Assistant('{name}', '{API_key}')"], stderr=subprocess.DEVNULL)
-except:
-    subprocess.run([f"python3", "-c", f"from assistant_gpt import Assistant; Assistant('{name}', '{API_key}')"], stderr=subprocess.DEVNULL)
+    Assistant(name, API_key, TTS_backend, STT_engine, Trace_file, Metrics_port, Barge_in)
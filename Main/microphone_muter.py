@@ -1,24 +1,108 @@
-import pyaudio
+import threading
+from audio_capture import MicrophoneSource, frame_rms
 
 class MicrophoneMute:
-    def __init__(self):
+    """
+    A software gate in front of the one shared capture device. While the assistant is speaking, the gate is muted and
+    its frames never reach the speech recognizer, so the assistant does not transcribe its own voice.
+
+    The gate is itself an audio source (see audio_capture), so the capture session reads from it directly. Without
+    barge-in, the device is paused while muted, so it costs no CPU wakeups. With barge-in, the device keeps being read
+    and a frame passes the gate when it is much louder than the echo of the assistant's voice, so the user can
+    interrupt the assistant.
+    """
+    def __init__(self, source=None, barge_in=False, barge_in_ratio=3.0, min_barge_in_energy=1000.0,
+                 on_barge_in=None):
         """
-        Initializes the MicrophoneMute class by creating a PyAudio instance and opening a stream for input and output.
+        Initializes the MicrophoneMute class with the shared capture device.
+
+        Args:
+            source (object): The capture device, defaults to the microphone.
+            barge_in (bool): Whether loud speech passes the gate while muted.
+            barge_in_ratio (float): How many times louder than the echo a frame must be to pass while muted.
+            min_barge_in_energy (float): The minimum RMS energy of a frame to pass while muted.
+            on_barge_in (callable): An optional function called when a frame passes while muted,
+                e.g. to stop the playback.
         """
-        self.p = pyaudio.PyAudio()
-        self.stream = self.p.open(format=pyaudio.paInt16, channels=1, rate=44100,
-                                  input=True, output=True, frames_per_buffer=1024)
+        self.source = source if source is not None else MicrophoneSource()
+        self.barge_in = barge_in
+        self.barge_in_ratio = barge_in_ratio
+        self.min_barge_in_energy = min_barge_in_energy
+        self.on_barge_in = on_barge_in
+        self.echo_level = 0.0
+        self._unmuted = threading.Event()
+        self._barge_in_allowed = True
+
+    @property
+    def sample_rate(self):
+        return self.source.sample_rate
+
+    @property
+    def frame_samples(self):
+        return self.source.frame_samples
 
-    def mute_microphone(self):
+    @property
+    def muted(self):
+        return not self._unmuted.is_set()
+
+    def mute_microphone(self, allow_barge_in=True):
         """
-        Stops the microphone stream, effectively muting the microphone.
+        Closes the gate, so the frames captured while the assistant speaks are dropped.
+
+        Args:
+            allow_barge_in (bool): Whether loud speech may pass the gate, if barge-in is enabled. It is not allowed
+                while the assistant waits for a typed answer, when there is nothing to interrupt.
         """
-        self.stream.stop_stream()
+        self._barge_in_allowed = allow_barge_in
+        self._unmuted.clear()
         print("Microphone Stopped!")
 
     def unmute_microphone(self):
         """
-        Starts the microphone stream, effectively unmuting the microphone.
+        Opens the gate, so the captured frames reach the speech recognizer again.
+        """
+        self._unmuted.set()
+        print("Microphone Enabled!")
+
+    def read(self):
+        """
+        Reads the next frame that passes the gate, blocking while the gate is muted.
+
+        Returns:
+            bytes: The PCM frame.
+        """
+        while True:
+            barge_in = self.barge_in and self._barge_in_allowed
+            if self.muted and not barge_in:
+                self._wait_unmuted()
+                continue
+            frame = self.source.read()
+            if not self.muted:
+                return frame
+            if barge_in:
+                energy = frame_rms(frame)
+                if energy > max(self.min_barge_in_energy, self.echo_level * self.barge_in_ratio):
+                    if self.on_barge_in is not None:
+                        self.on_barge_in()
+                    return frame
+                # Frames that do not pass track how loud the assistant's voice is in the microphone
+                self.echo_level += 0.1 * (energy - self.echo_level)
+
+    def _wait_unmuted(self):
+        """
+        Pauses the device until the gate is opened. This runs on the reading thread, so the device is never paused
+        in the middle of a read.
+        """
+        pause = getattr(self.source, 'pause', None)
+        if pause is not None:
+            pause()
+        self._unmuted.wait()
+        if pause is not None:
+            self.source.resume()
+
+    def close(self):
+        """
+        Closes the capture device.
         """
-        self.stream.start_stream()
-        print("Microphone Enabled!")
\ No newline at end of file
+        self._unmuted.set()
+        self.source.close()
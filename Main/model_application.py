@@ -1,9 +1,15 @@
 import json
+import os
+import warnings
 import numpy as np
-from tensorflow import keras
-from sklearn.preprocessing import LabelEncoder
 import random
-from keras.models import load_model
+from collections import namedtuple
+from numpy_model import NumpyIntentModel
+from intent_vocabulary import IntentVocabulary, hash_intents
+
+# The result of a single intent classification: the predicted tag (or None if the confidence is too low),
+# the confidence of the top class, the full probability vector and a response chosen for the tag.
+IntentResult = namedtuple('IntentResult', ['tag', 'confidence', 'probabilities', 'response'])
 
 class ChatBot:
     """
@@ -13,30 +19,35 @@ class ChatBot:
     -----------
     data : dict
         A dictionary containing the data from the intents file.
-    tokenizer : keras.preprocessing.text.Tokenizer
-        A tokenizer to convert text into numerical sequences.
-    label_encoder : sklearn.preprocessing.LabelEncoder
-        An encoder to encode target labels into numerical form.
-    model : keras.engine.functional.Functional
+    vocabulary : IntentVocabulary
+        The vocabulary and labels the model was trained with, used to convert text into a binary matrix.
+    model : keras.engine.functional.Functional or NumpyIntentModel
         A trained model to predict intents.
-    training_data : list
-        A list containing training patterns.
-    output_data : list
-        A list containing target labels.
     tags : list
         A list containing unique tags from intents file.
+    responses : dict
+        A dictionary mapping every tag to its list of responses.
+    confidence_threshold : float
+        The minimum confidence needed for a prediction to be accepted.
 
     Methods:
     --------
-    _prepare_data():
-        Prepares the training and target data using the patterns and tags from the intents file.
+    _load_vocabulary(vocabulary_file_path, strict):
+        Loads the vocabulary artifact of the model and checks that it matches the intents file.
+    classify(text):
+        Runs the model once and returns the tag, confidence, probabilities and a response together.
+    classify_batch(texts):
+        Classifies a list of texts with a single model inference.
+    predict_intents(texts, batch_size=256):
+        Classifies many texts lazily with one model inference per batch.
     predict_intent(text):
         Predicts the intent of the given text using the trained model.
     generate_response(user_input):
         Generates a random response for the predicted intent.
     """
 
-    def __init__(self, intents_file_path, model_file_path):
+    def __init__(self, intents_file_path, model_file_path, backend='numpy', vocabulary_file_path=None,
+                 strict=False):
         """
         Initializes the `ChatBot` object.
 
@@ -45,31 +56,168 @@ class ChatBot:
         intents_file_path : str
             The file path to the JSON file containing the intents and responses.
         model_file_path : str
-            The file path to the trained model file.
+            The file path to the trained model file (.h5, or .npz for the numpy backend).
+        backend : str
+            The inference backend, either "numpy" (plain NumPy forward pass) or "keras" (`keras.Model.predict`).
+        vocabulary_file_path : str
+            The file path to the vocabulary artifact written by the training script. Defaults to
+            "<model name>_vocab.json" next to the model file.
+        strict : bool
+            If True, raise an error instead of warning when the vocabulary does not match the intents file.
         """
         with open(intents_file_path) as file:
             self.data = json.load(file)
 
-        self.tokenizer = keras.preprocessing.text.Tokenizer()
-        self.label_encoder = LabelEncoder()
-        self.model = load_model(model_file_path)
-        self._prepare_data()
+        if vocabulary_file_path is None:
+            vocabulary_file_path = os.path.splitext(model_file_path)[0] + '_vocab.json'
+        self.vocabulary = self._load_vocabulary(vocabulary_file_path, strict)
+        self.backend = backend
+        if backend == 'numpy':
+            self.model = NumpyIntentModel.load(model_file_path)
+        elif backend == 'keras':
+            from keras.models import load_model
+            self.model = load_model(model_file_path)
+        else:
+            raise ValueError(f"Unknown backend '{backend}', expected 'numpy' or 'keras'")
         self.tags = [intent['tag'] for intent in self.data['intents']]
+        self.responses = {intent['tag']: intent['responses'] for intent in self.data['intents']}
+        self.confidence_threshold = 0.5
+
+    def _load_vocabulary(self, vocabulary_file_path, strict):
+        """
+        Loads the vocabulary artifact of the model and checks that it was built from the same intents.
+        If the artifact is missing, the vocabulary is fitted from the intents file instead.
+
+        Parameters:
+        -----------
+        vocabulary_file_path : str
+            The file path to the vocabulary artifact.
+        strict : bool
+            If True, raise an error instead of warning when the vocabulary does not match the intents file.
+
+        Returns:
+        --------
+        IntentVocabulary
+            The vocabulary of the model.
+        """
+        if not os.path.exists(vocabulary_file_path):
+            message = f"Vocabulary file {vocabulary_file_path} not found, fitting it from the intents file"
+            if strict:
+                raise FileNotFoundError(message)
+            warnings.warn(message)
+            return IntentVocabulary.fit(self.data)
+
+        vocabulary = IntentVocabulary.load(vocabulary_file_path)
+        if vocabulary.intents_hash != hash_intents(self.data):
+            message = (f"Vocabulary file {vocabulary_file_path} was built from different intents than the "
+                       f"intents file, retrain the model to keep the predictions reliable")
+            if strict:
+                raise ValueError(message)
+            warnings.warn(message)
+        return vocabulary
+
+    def _predict_proba(self, texts):
+        """
+        Runs the trained model once on a list of texts and returns the probability of every class for each text.
 
-    def _prepare_data(self):
+        Parameters:
+        -----------
+        texts : list
+            The input texts.
+
+        Returns:
+        --------
+        numpy.ndarray
+            A (len(texts), classes) matrix with the probability vector of every text.
+        """
+        matrix = self.vocabulary.texts_to_matrix(texts)
+        return self.model.predict(matrix, verbose=0)
+
+    def _make_result(self, prediction):
         """
-        Prepares the training and target data using the patterns and tags from the intents file.
+        Builds the classification result from the probability vector of one text.
+
+        Parameters:
+        -----------
+        prediction : numpy.ndarray
+            The probability vector over the encoded classes.
+
+        Returns:
+        --------
+        IntentResult
+            The classification result.
         """
-        self.training_data = []
-        self.output_data = []
-        for intent in self.data['intents']:
-            for pattern in intent['patterns']:
-                self.training_data.append(pattern)
-                self.output_data.append(intent['tag'])
+        predicted_class = int(np.argmax(prediction))
+        confidence = float(prediction[predicted_class])
+        tag = None
+        response = None
+        if confidence > self.confidence_threshold:
+            tag = self.vocabulary.labels[predicted_class]
+            response = random.choice(self.responses[tag])
+        return IntentResult(tag, confidence, prediction, response)
 
-        self.tokenizer.fit_on_texts(self.training_data)
-        self.training_data = self.tokenizer.texts_to_matrix(self.training_data, mode='binary')
-        self.output_data = self.label_encoder.fit_transform(self.output_data)
+    def classify(self, text):
+        """
+        Classifies the given text with a single model inference and picks a response for the predicted intent.
+
+        Parameters:
+        -----------
+        text : str
+            The input text.
+
+        Returns:
+        --------
+        IntentResult
+            The predicted tag (None if the confidence is not above the threshold), its confidence,
+            the full probability vector and a random response for the tag (None if there is no tag).
+        """
+        return self._make_result(self._predict_proba([text])[0])
+
+    def classify_batch(self, texts):
+        """
+        Classifies a list of texts with a single model inference, e.g. the requests collected by an IntentBatcher.
+
+        Parameters:
+        -----------
+        texts : list
+            The input texts.
+
+        Returns:
+        --------
+        list
+            The IntentResult of every text, in input order.
+        """
+        return [self._make_result(prediction) for prediction in self._predict_proba(texts)]
+
+    def predict_intents(self, texts, batch_size=256):
+        """
+        Classifies many texts, running one model inference per batch instead of one per text.
+
+        The texts are consumed lazily, so a generator (e.g. the lines of a large log file) is never loaded fully;
+        only one batch is held in memory at a time.
+
+        Parameters:
+        -----------
+        texts : Iterable[str]
+            The input texts.
+        batch_size : int
+            The maximum number of texts per model inference.
+
+        Yields:
+        -------
+        IntentResult
+            The classification result of every text, in input order.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        batch = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) == batch_size:
+                yield from map(self._make_result, self._predict_proba(batch))
+                batch = []
+        if batch:
+            yield from map(self._make_result, self._predict_proba(batch))
 
     def predict_intent(self, text):
         """
@@ -85,15 +233,7 @@ class ChatBot:
         str or None
             The predicted intent of the text or None if the confidence is less than 0.5.
         """
-        text = self.tokenizer.texts_to_matrix([text], mode='binary')
-        prediction = self.model.predict(text, verbose=0)[0]
-        predicted_class = np.argmax(prediction)
-        confidence = prediction[predicted_class]
-        if confidence > 0.5:
-            tag = self.label_encoder.inverse_transform([predicted_class])[0]
-            return tag
-        else:
-            return None
+        return self.classify(text).tag
 
     def generate_response(self, user_input):
         """
@@ -109,8 +249,4 @@ class ChatBot:
         str
             A random response for the predicted intent.
         """
-        predicted_intent = self.predict_intent(user_input)
-        if predicted_intent is not None:
-            for intent in self.data['intents']:
-                if intent['tag'] == predicted_intent:
-                    return random.choice(intent['responses'])
+        return self.classify(user_input).response
@@ -0,0 +1,172 @@
+import sqlite3
+import threading
+import time
+
+'''
+A local sqlite store of the IMDb movies used for the recommendations.
+Cinemagoer scrapes IMDb with one request per movie, so a recommendation used to take dozens of requests. The store
+keeps the top movies of every genre with their rating and year, indexed for the (genre, rating, year) query of a
+recommendation, and a genre is only refetched when its time to live has expired.
+'''
+
+
+class MovieStore:
+    """
+    A class representing a persistent local store of IMDb movies, stored in a sqlite database.
+
+    The top movies of every genre are stored as Cinemagoer returns them, together with the time the genre was
+    fetched, so a recommendation is a local indexed query instead of dozens of IMDb requests. A genre is refetched
+    once it is older than the time to live. The store can be shared between threads.
+
+    Attributes:
+        path (str): The path of the sqlite database, or ":memory:" for a store that is not persisted.
+        ttl (float): How long a fetched genre stays fresh, in seconds.
+        hits (int): The number of queries answered from a fresh genre.
+        misses (int): The number of queries of a genre that was missing or stale.
+
+    Methods:
+        is_fresh(genre:str) -> bool:
+            Returns whether the genre was fetched within the time to live.
+        has_genre(genre:str) -> bool:
+            Returns whether the genre was ever fetched, however old.
+        store_genre(genre:str, movies:list):
+            Replaces the movies of a genre with freshly fetched ones.
+        store_movie(movie_id:str, title:str, rating:float, year:int):
+            Stores the details of one movie.
+        query(genre:str, min_rating:float, min_year:int, limit:int=None) -> list:
+            Returns the movies of a genre matching the criteria, best rated first.
+        stats() -> dict:
+            Returns the hit/miss counters and the number of genres and movies.
+    """
+
+    def __init__(self, path: str = "movie_store.sqlite3", ttl: float = 7 * 24 * 60 * 60):
+        """
+        Initializes the store, creating the database if needed.
+
+        Args:
+            path (str): The path of the sqlite database, or ":memory:" for a store that is not persisted.
+            ttl (float): How long a fetched genre stays fresh, in seconds.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS movies ("
+                "movie_id TEXT PRIMARY KEY, title TEXT, rating REAL, year INTEGER, fetched REAL NOT NULL)")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS genres (genre TEXT PRIMARY KEY, fetched REAL NOT NULL)")
+            # The primary key indexes the movies of a genre
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS movie_genres ("
+                "genre TEXT NOT NULL, movie_id TEXT NOT NULL, PRIMARY KEY (genre, movie_id))")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS movies_rating ON movies (rating)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS movies_year ON movies (year)")
+
+    @staticmethod
+    def _normalize(genre: str) -> str:
+        return genre.strip().lower()
+
+    def _fetched(self, genre: str):
+        with self._lock:
+            row = self._connection.execute("SELECT fetched FROM genres WHERE genre = ?",
+                                           (self._normalize(genre),)).fetchone()
+        return None if row is None else row[0]
+
+    def is_fresh(self, genre: str) -> bool:
+        """
+        Returns whether the genre was fetched within the time to live.
+
+        Args:
+            genre (str): The genre.
+
+        Returns:
+            bool: True if the genre is stored and fresh.
+        """
+        fetched = self._fetched(genre)
+        fresh = fetched is not None and fetched + self.ttl >= time.time()
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return fresh
+
+    def has_genre(self, genre: str) -> bool:
+        """
+        Returns whether the genre was ever fetched, however old, e.g. to fall back on when IMDb is unreachable.
+
+        Args:
+            genre (str): The genre.
+
+        Returns:
+            bool: True if the genre is stored.
+        """
+        return self._fetched(genre) is not None
+
+    def store_genre(self, genre: str, movies: list):
+        """
+        Replaces the movies of a genre with freshly fetched ones and marks the genre as fresh.
+
+        Args:
+            genre (str): The genre.
+            movies (list): The (movie_id, title, rating, year) tuples of the movies of the genre.
+        """
+        genre = self._normalize(genre)
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM movie_genres WHERE genre = ?", (genre,))
+            self._connection.executemany("INSERT OR REPLACE INTO movies VALUES (?, ?, ?, ?, ?)",
+                                         [(*movie, now) for movie in movies])
+            self._connection.executemany("INSERT OR IGNORE INTO movie_genres VALUES (?, ?)",
+                                         [(genre, movie[0]) for movie in movies])
+            self._connection.execute("INSERT OR REPLACE INTO genres VALUES (?, ?)", (genre, now))
+
+    def store_movie(self, movie_id: str, title: str, rating: float, year: int):
+        """
+        Stores the details of one movie, e.g. fetched with `get_movie`.
+
+        Args:
+            movie_id (str): The IMDb id of the movie.
+            title (str): The title.
+            rating (float): The IMDb rating.
+            year (int): The release year.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO movies VALUES (?, ?, ?, ?, ?)",
+                                     (movie_id, title, rating, year, time.time()))
+
+    def query(self, genre: str, min_rating: float, min_year: int, limit: int = None) -> list:
+        """
+        Returns the stored movies of a genre with at least the given rating and year, best rated first.
+
+        Args:
+            genre (str): The genre.
+            min_rating (float): The minimum rating.
+            min_year (int): The minimum release year.
+            limit (int): The maximum number of movies, or None for all of them.
+
+        Returns:
+            list: The (movie_id, title, rating, year) tuples of the movies.
+        """
+        with self._lock:
+            return self._connection.execute(
+                "SELECT movies.movie_id, title, rating, year FROM movie_genres "
+                "JOIN movies ON movies.movie_id = movie_genres.movie_id "
+                "WHERE genre = ? AND rating >= ? AND year >= ? "
+                "ORDER BY rating DESC LIMIT ?",
+                (self._normalize(genre), min_rating, min_year, -1 if limit is None else limit)).fetchall()
+
+    def stats(self) -> dict:
+        """
+        Returns the hit/miss counters and the number of genres and movies.
+
+        Returns:
+            dict: The "hits", "misses", "genres" and "movies" of the store.
+        """
+        with self._lock:
+            genres = self._connection.execute("SELECT COUNT(*) FROM genres").fetchone()[0]
+            movies = self._connection.execute("SELECT COUNT(*) FROM movies").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "genres": genres, "movies": movies}
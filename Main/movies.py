@@ -1,12 +1,26 @@
+import functools
 import imdb
+import time
 from concurrent.futures import ThreadPoolExecutor
+from movie_store import MovieStore
 
 class MovieRecommendation:
-    def __init__(self):
+    def __init__(self, store=None, top_k=5, deadline=10.0, workers=5):
         """
         Initialize an instance of the MovieRecommendation class with the imdb module's Cinemagoer.
+
+        Args:
+            store (MovieStore): The local store the recommendations are answered from, None for the default
+                movie_store.sqlite3 store.
+            top_k (int): The number of movies to recommend, only their details are fetched from IMDb.
+            deadline (float): The maximum seconds a recommendation waits for the movie details.
+            workers (int): The size of the pool fetching the movie details, shared by all recommendations.
         """
         self.ia = imdb.Cinemagoer()
+        self.store = store if store is not None else MovieStore()
+        self.top_k = top_k
+        self.deadline = deadline
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='imdb')
 
     def get_movie_data(self, movie_id):
         """
@@ -21,62 +35,102 @@ class MovieRecommendation:
         movie = self.ia.get_movie(movie_id)
         return (movie.get('title'), movie.get('rating'), movie.get('year'))
 
-    def recommend_movie(self, genre, min_rating, year):
+    def recommend_movie(self, genre, min_rating, year, top_k=None, deadline=None):
         """
-        Given a genre, minimum rating and year, recommend top 5 movies that match the criteria.
+        Given a genre, minimum rating and year, recommend the top k movies that match the criteria.
 
         Args:
             genre (str): The genre of the movie to be recommended.
             min_rating (float): The minimum rating of the movie to be recommended.
             year (int): The minimum year of the movie to be recommended.
+            top_k (int): The number of movies to recommend, None for `self.top_k`.
+            deadline (float): The maximum seconds to wait for the movie details, None for `self.deadline`.
 
         Returns:
-            list: A list of tuples containing the title, rating and year of the top 5 recommended movies.
+            list: A list of tuples containing the title, rating and year of the top k recommended movies.
+        """
+        return list(self.iter_recommendations(genre, min_rating, year, top_k, deadline))
+
+    def iter_recommendations(self, genre, min_rating, year, top_k=None, deadline=None):
+        """
+        Yields the top k movies that match the criteria, best rated first, each as soon as it is available, so the
+        first one can be spoken while the details of the next ones are still being fetched.
+
+        Args:
+            genre (str): The genre of the movie to be recommended.
+            min_rating (float): The minimum rating of the movie to be recommended.
+            year (int): The minimum year of the movie to be recommended.
+            top_k (int): The number of movies to recommend, None for `self.top_k`.
+            deadline (float): The maximum seconds to wait for the movie details, None for `self.deadline`.
+
+        Yields:
+            tuple: The title, rating and year of a recommended movie.
+        """
+        top_k = top_k if top_k is not None else self.top_k
+        deadline = deadline if deadline is not None else self.deadline
+        # A fresh genre is answered by the local store without any IMDb request
+        if self.store.is_fresh(genre):
+            yield from self._format(self.store.query(genre, min_rating, year, top_k))
+            return
+        try:
+            candidates = self._fetch_candidates(genre, min_rating, year)[:top_k]
+        except Exception:
+            # IMDb is unreachable: a stale genre is better than no recommendation
+            if not self.store.has_genre(genre):
+                raise
+            yield from self._format(self.store.query(genre, min_rating, year, top_k))
+            return
+        yield from self._fetch_details(candidates, deadline)
+
+    def _fetch_candidates(self, genre, min_rating, year):
+        """
+        Fetches the top 50 movies of a genre from IMDb, the fallback when the genre is missing from the store or
+        stale, and stores them.
+
+        Args:
+            genre (str): The genre of the movie to be recommended.
+            min_rating (float): The minimum rating of the movie to be recommended.
+            year (int): The minimum year of the movie to be recommended.
+
+        Returns:
+            list: The movies of the genre list that match the criteria, best rated first.
         """
         results = self.ia.get_top50_movies_by_genres(genre)
+        # The genre list already holds the title, rating and year of every movie
+        self.store.store_genre(genre, [(r.movieID, r.get('title'), r.get('rating'), r.get('year')) for r in results])
         filtered_results = [r for r in results if r.get('rating') and r['rating'] >= min_rating and r['year'] >= year]
-        sorted_results = sorted(filtered_results, key=lambda r: r['rating'], reverse=True)
-        final_lst = []
-        movie_ids = [r.movieID for r in sorted_results]
-        with ThreadPoolExecutor() as executor:
-            movie_data = list(executor.map(self.get_movie_data, movie_ids))
-        for title, rating, year in movie_data:
-            final_lst.append((title, f"{rating}", f"{year}"))
-        return final_lst
-
-    def recommendation_lst_shorter(self, lst):
+        return sorted(filtered_results, key=lambda r: r['rating'], reverse=True)
+
+    def _fetch_details(self, candidates, deadline):
         """
-        Given a list of movie recommendations, return a shorter list of maximum 5 recommendations.
+        Fetches the details of the candidates on the shared pool and yields them in rank order. A candidate whose
+        details are not there by the deadline, or failed, is answered from the genre list data instead, so the
+        deadline bounds the wait without dropping a movie.
 
         Args:
-            lst (list): A list of tuples containing the title, rating and year of recommended movies.
+            candidates (list): The movies of the genre list to recommend, best rated first.
+            deadline (float): The maximum seconds to wait for the details.
 
-        Returns:
-            str: A string for the list of shortened movie recommendations.
+        Yields:
+            tuple: The title, rating and year of a recommended movie.
         """
-        if len(lst) > 5:
-            lst_fet = lst[0:5]
-        else:
-            lst_fet = lst
-        if len(lst) > 1 and len(lst) >= 5:
-            nu_lst = [f"Recommendation number {i + 1}: {lst[i][0]}" for i in range(len(lst_fet))]
-            string = "\n".join(["".join(item) for item in nu_lst])
-            string_final = "Here are my Top 5 Recommendations: \n" + string
-        elif len(lst) == 1:
-            string_final = [f"I recommend watching: {lst[0][0]}"]
-        else:
-            nu_lst = [f"Recommendation number {i + 1}: {lst[i][0]}" for i in range(len(lst_fet))]
-            string = "\n".join(["".join(item) for item in nu_lst])
-            string_final = "Here are my Top Recommendations: \n" + string
-
-        return string_final
-
-    #a staticmethod to organize the output list to user
+        end = time.monotonic() + deadline
+        futures = [self.executor.submit(self.get_movie_data, r.movieID) for r in candidates]
+        for r, future in zip(candidates, futures):
+            # The details that arrive late still refresh the store for the next recommendation
+            future.add_done_callback(functools.partial(self._store_details, r.movieID))
+            try:
+                title, rating, movie_year = future.result(timeout=max(0.0, end - time.monotonic()))
+            except Exception:
+                title, rating, movie_year = r.get('title'), r.get('rating'), r.get('year')
+            yield (title, f"{rating}", f"{movie_year}")
+
+    def _store_details(self, movie_id, future):
+        if not future.cancelled() and future.exception() is None:
+            self.store.store_movie(movie_id, *future.result())
+
     @staticmethod
-    def stringer(lst):
-        if len(lst) > 5:
-            lst_fet = lst[0:5]
-        else:
-            lst_fet = lst
-        return "\n".join([", ".join(item) for item in lst_fet])
+    def _format(movies):
+        # (title, rating, year) or (movie_id, title, rating, year) -> (title, "rating", "year")
+        return [(movie[-3], f"{movie[-2]}", f"{movie[-1]}") for movie in movies]
 
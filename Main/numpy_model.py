@@ -0,0 +1,185 @@
+import json
+import numpy as np
+
+
+class NumpyIntentModel:
+    """
+    A class that runs the forward pass of the trained intent model with plain NumPy matrix multiplications.
+
+    The intent model is a small stack of Dense layers (Dropout layers are skipped since they do nothing at
+    inference time), so its weights can be read once from the Keras .h5 file or from an exported .npz file
+    and evaluated without importing TensorFlow.
+
+    Attributes:
+    -----------
+    layers : list
+        A list of (kernel, bias, activation) tuples, one for each Dense layer in order.
+
+    Methods:
+    --------
+    from_h5(model_file_path):
+        Reads the Dense layer weights from a Keras .h5 model file.
+    from_npz(npz_file_path):
+        Reads the Dense layer weights from a .npz file written by `save_npz`.
+    load(model_file_path):
+        Reads the weights from a .h5 or .npz file depending on the file extension.
+    save_npz(npz_file_path):
+        Writes the Dense layer weights to a .npz file.
+    predict(matrix, verbose=0):
+        Runs the forward pass on a binary matrix and returns the class probabilities.
+    """
+
+    ACTIVATIONS = {
+        'linear': lambda x: x,
+        'relu': lambda x: np.maximum(x, 0),
+        'softmax': None,
+    }
+
+    def __init__(self, layers):
+        """
+        Initializes the `NumpyIntentModel` object.
+
+        Parameters:
+        -----------
+        layers : list
+            A list of (kernel, bias, activation) tuples, one for each Dense layer in order.
+        """
+        for _, _, activation in layers:
+            if activation not in self.ACTIVATIONS:
+                raise ValueError(f"Unsupported activation '{activation}' in the intent model")
+        self.layers = [(np.asarray(kernel, dtype=np.float32), np.asarray(bias, dtype=np.float32), activation)
+                       for kernel, bias, activation in layers]
+
+    @classmethod
+    def from_h5(cls, model_file_path):
+        """
+        Reads the Dense layer weights from a Keras .h5 model file.
+
+        Parameters:
+        -----------
+        model_file_path : str
+            The file path to the trained model file.
+
+        Returns:
+        --------
+        NumpyIntentModel
+            The model with the weights of every Dense layer.
+        """
+        import h5py
+
+        with h5py.File(model_file_path, 'r') as file:
+            model_config = file.attrs['model_config']
+            if isinstance(model_config, bytes):
+                model_config = model_config.decode('utf-8')
+            model_config = json.loads(model_config)
+            weights = file['model_weights']
+
+            layers = []
+            for layer in model_config['config']['layers']:
+                class_name = layer['class_name']
+                if class_name in ('InputLayer', 'Dropout'):
+                    # These layers have no weights and do nothing at inference time
+                    continue
+                if class_name != 'Dense':
+                    raise ValueError(f"Unsupported layer '{class_name}' in the intent model")
+                name = layer['config']['name']
+                group = weights[name]
+                arrays = {}
+                for weight_name in group.attrs['weight_names']:
+                    if isinstance(weight_name, bytes):
+                        weight_name = weight_name.decode('utf-8')
+                    # Weight names look like "dense/kernel:0"
+                    arrays[weight_name.split('/')[-1].split(':')[0]] = group[weight_name][()]
+                kernel = arrays['kernel']
+                bias = arrays.get('bias', np.zeros(kernel.shape[1], dtype=np.float32))
+                layers.append((kernel, bias, layer['config']['activation']))
+        return cls(layers)
+
+    @classmethod
+    def from_npz(cls, npz_file_path):
+        """
+        Reads the Dense layer weights from a .npz file written by `save_npz`.
+
+        Parameters:
+        -----------
+        npz_file_path : str
+            The file path to the exported weights.
+
+        Returns:
+        --------
+        NumpyIntentModel
+            The model with the weights of every Dense layer.
+        """
+        with np.load(npz_file_path) as file:
+            activations = [str(activation) for activation in file['activations']]
+            layers = [(file[f'kernel_{i}'], file[f'bias_{i}'], activation)
+                      for i, activation in enumerate(activations)]
+        return cls(layers)
+
+    @classmethod
+    def load(cls, model_file_path):
+        """
+        Reads the weights from a .h5 or .npz file depending on the file extension.
+
+        Parameters:
+        -----------
+        model_file_path : str
+            The file path to the trained model file or the exported weights.
+
+        Returns:
+        --------
+        NumpyIntentModel
+            The model with the weights of every Dense layer.
+        """
+        if model_file_path.endswith('.npz'):
+            return cls.from_npz(model_file_path)
+        return cls.from_h5(model_file_path)
+
+    def save_npz(self, npz_file_path):
+        """
+        Writes the Dense layer weights to a .npz file.
+
+        Parameters:
+        -----------
+        npz_file_path : str
+            The file path to write the weights to.
+        """
+        arrays = {'activations': np.array([activation for _, _, activation in self.layers])}
+        for i, (kernel, bias, _) in enumerate(self.layers):
+            arrays[f'kernel_{i}'] = kernel
+            arrays[f'bias_{i}'] = bias
+        np.savez(npz_file_path, **arrays)
+
+    def predict(self, matrix, verbose=0):
+        """
+        Runs the forward pass on a binary matrix and returns the class probabilities.
+
+        Parameters:
+        -----------
+        matrix : numpy.ndarray
+            A (batch, vocabulary) matrix, as returned by `texts_to_matrix`.
+        verbose : int
+            Ignored, accepted so the method can be called like `keras.Model.predict`.
+
+        Returns:
+        --------
+        numpy.ndarray
+            A (batch, classes) matrix with the probability of every class.
+        """
+        x = np.asarray(matrix, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            x = x @ kernel + bias
+            if activation == 'softmax':
+                # Subtract the row maximum so the exponent never overflows
+                x = np.exp(x - x.max(axis=-1, keepdims=True))
+                x /= x.sum(axis=-1, keepdims=True)
+            else:
+                x = self.ACTIVATIONS[activation](x)
+        return x
+
+
+if __name__ == '__main__':
+    # Exports chatbot1.h5 to chatbot1.npz. The agreement of the NumPy and Keras backends on every pattern of
+    # intents.json is checked by tests/test_numpy_model.py
+    NumpyIntentModel.from_h5('chatbot1.h5').save_npz('chatbot1.npz')
+    print("Exported chatbot1.npz")
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalizes a prompt so that trivially different phrasings of the same question share a cache entry.
+
+    Args:
+        prompt (str): The prompt to normalize.
+
+    Returns:
+        str: The prompt in lowercase, with collapsed whitespace and without trailing punctuation.
+    """
+    return re.sub(r"\s+", " ", prompt.lower()).strip().rstrip("?!. ")
+
+
+def make_key(namespace: str, prompt: str, mode: str = "", history: list = None) -> str:
+    """
+    Builds a cache key from the normalized prompt, the mode and a fingerprint of the conversation history.
+
+    Args:
+        namespace (str): The kind of lookup, e.g. "chat" or "wikipedia".
+        prompt (str): The prompt of the lookup.
+        mode (str): The mode of the lookup.
+        history (list): The messages sent before the prompt, if the answer depends on them.
+
+    Returns:
+        str: The hex SHA-256 digest identifying the lookup.
+    """
+    history_fingerprint = json.dumps(history or [], sort_keys=True)
+    content = json.dumps([namespace, mode, normalize_prompt(prompt), history_fingerprint])
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    A class representing a persistent cache of text responses, stored in a sqlite database.
+
+    Entries expire after a time to live, and when the cache holds more than `max_entries` entries the least recently
+    used ones are evicted. The cache can be shared between threads.
+
+    Attributes:
+        path (str): The path of the sqlite database, or ":memory:" for a cache that is not persisted.
+        ttl (float): The default time to live of an entry, in seconds.
+        max_entries (int): The maximum number of entries kept.
+        hits (int): The number of lookups that found a fresh entry.
+        misses (int): The number of lookups that found nothing or an expired entry.
+
+    Methods:
+        get(key:str) -> str or None:
+            Returns the cached value of the key if it is fresh.
+        set(key:str, value:str, ttl:float=None):
+            Stores a value and evicts the least recently used entries beyond the size cap.
+        stats() -> dict:
+            Returns the hit/miss counters and the number of entries.
+        clear():
+            Removes all entries.
+    """
+
+    def __init__(self, path: str = "response_cache.sqlite3", ttl: float = 24 * 60 * 60, max_entries: int = 1000):
+        """
+        Initializes the cache, creating the database if needed.
+
+        Args:
+            path (str): The path of the sqlite database, or ":memory:" for a cache that is not persisted.
+            ttl (float): The default time to live of an entry, in seconds.
+            max_entries (int): The maximum number of entries kept.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def get(self, key: str):
+        """
+        Returns the cached value of the key if it is fresh, and marks it as recently used.
+
+        Args:
+            key (str): The key, usually built with `make_key`.
+
+        Returns:
+            str or None: The cached value, or None if there is no fresh entry.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                if row is not None:
+                    self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: float = None):
+        """
+        Stores a value and evicts the least recently used entries beyond the size cap.
+
+        Args:
+            key (str): The key, usually built with `make_key`.
+            value (str): The value to store.
+            ttl (float): The time to live of this entry in seconds, defaults to the cache's ttl.
+        """
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                                     (key, value, expires, now))
+            self._connection.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def stats(self) -> dict:
+        """
+        Returns the hit/miss counters and the number of entries.
+
+        Returns:
+            dict: The "hits", "misses" and "entries" of the cache.
+        """
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def clear(self):
+        """
+        Removes all entries.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM responses")
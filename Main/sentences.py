@@ -0,0 +1,45 @@
+import re
+
+# A sentence ends with ., ! or ? (optionally followed by closing quotes or brackets) and then whitespace
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+
+
+def split_sentences(text):
+    """
+    Splits a text into sentences.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        list: The non-empty sentences of the text.
+    """
+    return list(iter_sentences([text]))
+
+
+def iter_sentences(chunks, min_length=20):
+    """
+    Joins streamed text chunks (e.g. token deltas) and yields every sentence as soon as it is complete.
+
+    Args:
+        chunks (Iterable[str]): The text chunks in order.
+        min_length (int): Sentences shorter than this are joined with the next one, so very short fragments
+            such as "Sure." or "Dr." are not spoken on their own.
+
+    Yields:
+        str: The complete sentences, followed by whatever text is left when the chunks run out.
+    """
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        start = 0
+        for match in SENTENCE_END.finditer(buffer):
+            if match.end() - start < min_length:
+                continue
+            sentence = buffer[start:match.end()].strip()
+            start = match.end()
+            if sentence:
+                yield sentence
+        buffer = buffer[start:]
+    if buffer.strip():
+        yield buffer.strip()
@@ -0,0 +1,350 @@
+import asyncio
+import collections
+import datetime
+import threading
+import time
+
+'''
+The skills of the assistant and the registry that dispatches a turn to the skill of its intent.
+A skill registers against an intent tag together with a timeout and a concurrency limit for its blocking calls, and
+an optional prefetch hook that starts warming up what the skill needs as soon as its intent is recognized.
+The heavy components of the skills (ChatGPT with openai and wikipedia, the movie recommender with imdb, the weather
+provider with requests) are imported on first use, so the assistant does not import them at startup.
+'''
+
+
+class Skill:
+    """
+    A handler registered against an intent tag.
+
+    Attributes:
+        tag (str): The intent tag.
+        handler (callable): The coroutine function (turn, context) that builds the reply.
+        timeout (float): The maximum seconds of every blocking call of the handler, or None for no limit.
+        max_concurrency (int): How many blocking calls of the skill may run at once, or None for no limit.
+        prefetch (callable): A blocking function (context) started when the intent is recognized, or None.
+        interactive (bool): Whether the handler asks the user follow-up questions.
+        timings (deque): The durations in seconds of the latest handler runs.
+    """
+    def __init__(self, tag, handler, timeout=None, max_concurrency=None, prefetch=None, interactive=False):
+        self.tag = tag
+        self.handler = handler
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.prefetch = prefetch
+        self.interactive = interactive
+        self.timings = collections.deque(maxlen=1000)
+        self.semaphore = None
+
+    def limit(self):
+        """
+        Returns the semaphore of the concurrency limit. It is created on first use, inside the running event loop.
+
+        Returns:
+            asyncio.Semaphore: The semaphore, or None if the skill has no concurrency limit.
+        """
+        if self.max_concurrency is not None and self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.semaphore
+
+
+class SkillRegistry:
+    """
+    A dispatch table from intent tags to skills.
+    """
+    def __init__(self):
+        self._skills = {}
+
+    def register(self, tag, timeout=None, max_concurrency=None, prefetch=None, interactive=False):
+        """
+        A decorator registering a coroutine function (turn, context) as the skill of an intent.
+
+        Args:
+            tag (str): The intent tag.
+            timeout (float): The maximum seconds of every blocking call of the handler, or None for no limit.
+            max_concurrency (int): How many blocking calls of the skill may run at once, or None for no limit.
+            prefetch (callable): A blocking function (context) started when the intent is recognized, or None.
+            interactive (bool): Whether the handler asks the user follow-up questions.
+
+        Returns:
+            callable: The decorator, which returns the handler unchanged.
+        """
+        def decorator(handler):
+            if tag in self._skills:
+                raise ValueError(f"A skill is already registered for the intent '{tag}'")
+            self._skills[tag] = Skill(tag, handler, timeout, max_concurrency, prefetch, interactive)
+            return handler
+        return decorator
+
+    def __contains__(self, tag):
+        return tag in self._skills
+
+    def get(self, tag):
+        return self._skills.get(tag)
+
+    @property
+    def interactive_intents(self):
+        return [tag for tag, skill in self._skills.items() if skill.interactive]
+
+    async def dispatch(self, turn, context):
+        """
+        Runs the skill of the turn's intent. Turns of an intent without a skill get no reply.
+
+        Args:
+            turn (Turn): The turn, with the text and intent of the utterance.
+            context (SkillContext): The state of the session and the shared resources the skills use.
+        """
+        skill = self._skills.get(turn.result.tag)
+        if skill is None:
+            return
+        turn.skill = skill
+        if skill.prefetch is not None:
+            # Warm up in the background, e.g. while the user answers a follow-up question. It runs outside of the
+            # skill's timeout and concurrency limit, which are meant for the handler's own calls. A failed prefetch
+            # is ignored, the handler creates what it needs anyway
+            prefetch = asyncio.ensure_future(self._prefetch(turn, skill, context))
+            prefetch.add_done_callback(lambda task: task.cancelled() or task.exception())
+        turn.show(f"You :> {turn.text}")
+        start = time.perf_counter()
+        try:
+            await skill.handler(turn, context)
+        finally:
+            # The time the user took to answer follow-up questions is not the handler's
+            skill.timings.append(time.perf_counter() - start - turn.waited)
+
+    @staticmethod
+    async def _prefetch(turn, skill, context):
+        name = getattr(skill.prefetch, '__name__', 'prefetch')
+        with turn.pipeline.tracer.span("call", name, turn.id, intent=turn.result.tag):
+            await asyncio.get_running_loop().run_in_executor(turn.pipeline.executor, skill.prefetch, context)
+
+    def stats(self):
+        """
+        Summarizes the handler durations of every skill that has run, without the time spent waiting for the user's
+        answers to follow-up questions.
+
+        Returns:
+            dict: For every intent tag, the number of runs and the mean and max duration in seconds.
+        """
+        return {tag: {'runs': len(skill.timings),
+                      'mean': sum(skill.timings) / len(skill.timings),
+                      'max': max(skill.timings)}
+                for tag, skill in self._skills.items() if skill.timings}
+
+
+class SharedResources:
+    """
+    The resources shared by every session of the assistant. They are read-only once created or thread-safe, and
+    the heavy ones are created on first use, from any thread.
+
+    Attributes:
+        name (str): The name of the assistant.
+        gpt_token (str): The API token for OpenAI.
+        cache (ResponseCache): The cache of the ChatGPT answers and Wikipedia summaries, or None.
+        api_base (str): The base URL of the OpenAI API, e.g. a FakeOpenAIServer, or None for OpenAI.
+        weather_provider (str): The name of the weather provider (see weather_providers).
+        weather_options (dict): More arguments of the weather provider, e.g. the URLs of a FakeWeatherServer.
+    """
+    def __init__(self, name, gpt_token, cache=None, api_base=None, weather_provider="google", weather_options=None):
+        self.name = name
+        self.gpt_token = gpt_token
+        self.cache = cache
+        self.api_base = api_base
+        self.weather_provider = weather_provider
+        self.weather_options = weather_options or {}
+        self._lock = threading.Lock()
+        self._movie_recommender = None
+        self._http = None
+        self._weather = None
+
+    @property
+    def movie_recommender(self):
+        with self._lock:
+            if self._movie_recommender is None:
+                from movies import MovieRecommendation
+
+                self._movie_recommender = MovieRecommendation()
+            return self._movie_recommender
+
+    @property
+    def http(self):
+        """
+        The pooled HTTP session of the web requests of the skills, so they reuse connections.
+        """
+        with self._lock:
+            if self._http is None:
+                import requests
+
+                self._http = requests.Session()
+                self._http.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=16))
+                self._http.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=16))
+            return self._http
+
+    @property
+    def weather(self):
+        """
+        The weather service, which caches the weather of every city in front of the provider.
+        """
+        http = self.http
+        with self._lock:
+            if self._weather is None:
+                from weather_providers import WeatherService, create_provider
+
+                self._weather = WeatherService(create_provider(self.weather_provider, session=http,
+                                                               **self.weather_options))
+            return self._weather
+
+    def create_chat_gpt(self):
+        """
+        Creates the ChatGPT chatbot of a session. It only holds the session's history and settings, the answers and
+        Wikipedia summaries are cached in the shared cache.
+
+        Returns:
+            ChatGPT: The chatbot.
+        """
+        from chat_gpt import ChatGPT
+
+        return ChatGPT(self.name, self.gpt_token, api_base=self.api_base, cache=self.cache)
+
+
+class SkillContext:
+    """
+    The state of one session the skills use, on top of the shared resources: only a ChatGPT history of its own,
+    created on first use, so an idle session costs next to nothing.
+
+    Attributes:
+        shared (SharedResources): The resources shared by every session.
+    """
+    def __init__(self, shared):
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._chat_gpt = None
+
+    @property
+    def name(self):
+        return self.shared.name
+
+    @property
+    def movie_recommender(self):
+        return self.shared.movie_recommender
+
+    @property
+    def http(self):
+        return self.shared.http
+
+    @property
+    def weather(self):
+        return self.shared.weather
+
+    @property
+    def chat_gpt(self):
+        with self._lock:
+            if self._chat_gpt is None:
+                self._chat_gpt = self.shared.create_chat_gpt()
+            return self._chat_gpt
+
+
+def get_current_time():
+    """
+    Retrieves the current time from the local machine.
+
+    Returns:
+        str: The current time in HH:MM format.
+    """
+    return datetime.datetime.now().strftime("%I:%M %p")
+
+
+def _prefetch_weather(context):
+    context.weather
+
+
+def _prefetch_chat_gpt(context):
+    context.chat_gpt
+
+
+def _prefetch_movies(context):
+    context.movie_recommender
+
+
+registry = SkillRegistry()
+
+
+# If the intent is 'goodbye', say goodbye and terminate the application once it has been spoken
+@registry.register("goodbye")
+async def goodbye(turn, context):
+    turn.say(turn.result.response)
+    turn.end_session = True
+
+
+# If the intent is "time", retrieve the current time and generate the response
+@registry.register("time")
+async def current_time(turn, context):
+    turn.say(f"The current time is {get_current_time()}.")
+
+
+# If the intent is 'greetings', respond and continue listening for input
+@registry.register("greetings")
+async def greetings(turn, context):
+    turn.say(turn.result.response)
+
+
+# If the intent is 'movie suggestion', prompt the user to input genre, year, and rating criteria,
+# and generate a movie recommendation based on the criteria
+@registry.register("movie suggestion", timeout=60, max_concurrency=2, prefetch=_prefetch_movies, interactive=True)
+async def movie_suggestion(turn, context):
+    turn.say(turn.result.response)
+    text = await turn.ask("Input without brackets in the same order (Genre, Year, Rating) :")
+    turn.release()
+    genre, year, rating = text.split(',')
+    movie_recommender = await turn.run_blocking(lambda: context.movie_recommender, name="movie_recommender")
+    loop = asyncio.get_running_loop()
+
+    # Speak every recommendation as soon as its details arrive, instead of waiting for all of them
+    def produce():
+        movies = []
+        for movie in movie_recommender.iter_recommendations(genre, float(rating), int(year)):
+            if not movies:
+                loop.call_soon_threadsafe(turn.say, "Here are my Top Recommendations:")
+            movies.append(movie)
+            loop.call_soon_threadsafe(turn.say, f"Recommendation number {len(movies)}: {movie[0]}",
+                                      f"{context.name} :> {', '.join(movie)}")
+        return movies
+
+    if not await turn.run_blocking(produce, name="recommend_movie"):
+        turn.say("I could not find a movie matching these criteria.")
+
+
+# If the intent is 'weather', prompt the user to input a city and retrieve its weather information
+@registry.register("weather", timeout=10, max_concurrency=4, prefetch=_prefetch_weather, interactive=True)
+async def weather(turn, context):
+    turn.say(turn.result.response)
+    city = await turn.ask("Type the City : ")
+    turn.release()
+    turn.say(await turn.run_blocking(lambda: context.weather.report(city), name="get_weather"))
+
+
+# If the intent is 'search web', prompt the user to input a topic to search the web about,
+# generate a short answer based on the topic, and play the answer aloud
+@registry.register("search web", timeout=30, max_concurrency=4, prefetch=_prefetch_chat_gpt, interactive=True)
+async def search_web(turn, context):
+    turn.say(turn.result.response)
+    topic = await turn.ask("Insert the Topic You Want to Search the Web About (the Info is Retrieved from Wikipedia): ")
+    turn.release()
+    # Use the chatbot's GPT-3 model to summarize the resulted Wikipedia Search to the topic
+    chat_gpt = await turn.run_blocking(lambda: context.chat_gpt, name="chat_gpt")
+    summary = await turn.run_blocking(chat_gpt.web_searcher, topic)
+    turn.say(await turn.run_blocking(chat_gpt.get_answer,
+                                     f"summarize in no more than 50 words: {summary}", "short"))
+
+
+# If the intent is 'general', ask if the user wants the assistant to say the GPT-3 response, then either
+# print it or stream it and speak every sentence as soon as it is generated
+@registry.register("general", timeout=60, max_concurrency=4, prefetch=_prefetch_chat_gpt, interactive=True)
+async def general(turn, context):
+    print_or_listen = await turn.ask(f"Do You Want {context.name} to say it? (Y/n) ")
+    turn.release()
+    chat_gpt = await turn.run_blocking(lambda: context.chat_gpt, name="chat_gpt")
+    if print_or_listen.lower() == 'n':
+        turn.show(f"{context.name} :> {await turn.run_blocking(chat_gpt.get_answer, turn.text)}")
+    else:
+        await turn.say_stream(chat_gpt.get_answer(turn.text, stream=True))
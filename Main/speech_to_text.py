@@ -1,40 +1,84 @@
 import speech_recognition as sr
+from audio_capture import CaptureSession, MicrophoneSource, SAMPLE_WIDTH
+from stt_engines import GoogleEngine
 
 class SpeechToText:
     """
     This class is used for speech to text conversion.
 
     Attributes:
-        recognizer (Recobinary interaction parametersgnizer): The speech recognition engine.
-        microphone (Microphone): The microphone used to capture the audio input.
+        recognizer (Recognizer): The speech recognition engine used by the Google backend.
+        engine (object): The speech recognition engine, Google's by default (see stt_engines).
+        session (CaptureSession): The capture session, which keeps the audio source open across turns and
+            segments the speech with a voice activity detector.
 
     Methods:
-        get_text_from_audio(): Uses the microphone to capture audio input, converts it to text
+        capture_utterance(on_partial=None): Captures the next utterance and returns its recognition stream.
+        recognize(stream): Finishes the recognition of a captured utterance and returns the text.
+        get_text_from_audio(on_partial=None): Captures the next utterance from the audio source, converts it to text
         and returns the text.
 
     """
 
-    def __init__(self):
+    def __init__(self, source=None, vad=None, engine=None):
         """
-        Initializes the SpeechToText object with a speech recognizer and a microphone.
+        Initializes the SpeechToText object with a speech recognition engine and a capture session.
+
+        Args:
+            source (object): The audio source, defaults to the microphone. A WavFileSource can be given to feed
+                recorded audio instead.
+            vad (object): The voice activity detector, defaults to WebRTC's if installed, else an energy based one.
+            engine (object): The speech recognition engine, defaults to Google's Speech Recognition API.
         """
         self.recognizer = sr.Recognizer()
-        self.microphone = sr.Microphone()
+        self.engine = engine if engine is not None else GoogleEngine(self.recognizer)
+        self.session = CaptureSession(source if source is not None else MicrophoneSource(), vad)
+
+    def capture_utterance(self, on_partial=None):
+        """
+        Captures the next utterance from the audio source, feeding the engine every frame while it is captured.
+
+        Args:
+            on_partial (callable): An optional function called with every partial hypothesis (in lowercase) while
+                the user is still speaking, if the engine has partial results.
 
-    def get_text_from_audio(self):
+        Returns:
+            object: The engine's recognition stream of the utterance, ready for `recognize`.
+        """
+        # The session was calibrated once and keeps tracking the ambient noise
+        stream = self.engine.stream(self.session.sample_rate, SAMPLE_WIDTH)
+        for frame in self.session.iter_utterance():
+            partial = stream.accept(frame)
+            if partial and on_partial is not None:
+                on_partial(partial.lower())
+        return stream
+
+    @staticmethod
+    def recognize(stream):
         """
-        Uses the microphone to capture audio input, converts it to text and returns the text.
+        Finishes the recognition of a captured utterance.
+
+        Args:
+            stream (object): The recognition stream returned by `capture_utterance`.
+
+        Returns:
+            str: The text obtained from the speech input.
+        """
+        text = stream.finish()
+        if not text:
+            raise sr.UnknownValueError()
+        # Converts the text to lowercase to standardize the input
+        return text.lower()
+
+    def get_text_from_audio(self, on_partial=None):
+        """
+        Captures the next utterance from the audio source, converts it to text and returns the text.
+
+        Args:
+            on_partial (callable): An optional function called with every partial hypothesis (in lowercase) while
+                the user is still speaking, if the engine has partial results.
 
         Returns:
             str: The text obtained from the speech input.
         """
-        with self.microphone as source:
-            # Adjusts for ambient noise to improve recognition accuracy
-            self.recognizer.adjust_for_ambient_noise(source, duration=0.1)
-            # Listens to the microphone and captures the audio input
-            audio = self.recognizer.listen(source)
-            # Transcribes the audio input to text using Google's Speech Recognition API
-            text = self.recognizer.recognize_google(audio)
-            # Converts the text to lowercase to standardize the input
-            text = text.lower()
-            return text
\ No newline at end of file
+        return self.recognize(self.capture_utterance(on_partial))
@@ -0,0 +1,94 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tracing import Tracer
+
+'''
+The startup of the assistant.
+The components that do not depend on each other (the intent model, the audio devices, the speech synthesizer, the
+window) are initialized in parallel, each importing its heavy modules itself, and the duration of every step is
+recorded as a "startup" span of the tracer, so a slow start shows which component it is waiting for.
+'''
+
+
+class Startup:
+    """
+    Initializes components in parallel and times every step. It is thread-safe.
+
+    Attributes:
+        tracer (Tracer): Records a "startup" span for every step.
+        timings (dict): The seconds every step took, in the order they finished.
+        ready_after (float): The seconds from the start to `ready()`, or None before it.
+    """
+    def __init__(self, tracer=None, workers=4):
+        """
+        Starts the clock.
+
+        Args:
+            tracer (Tracer): The tracer to record the steps to, a new in-memory tracer by default.
+            workers (int): How many steps run at once.
+        """
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.timings = {}
+        self.ready_after = None
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='startup')
+
+    def submit(self, name, function, *args):
+        """
+        Runs a step in a worker thread.
+
+        Args:
+            name (str): The name of the step, e.g. "intent model".
+            function (callable): The function initializing the component.
+            *args: The arguments of the function.
+
+        Returns:
+            concurrent.futures.Future: The future of the component. Its exception is raised by `result()`.
+        """
+        return self._executor.submit(self.run, name, function, *args)
+
+    def run(self, name, function, *args):
+        """
+        Runs a step in the calling thread, e.g. a Tk window that must be created by the main thread.
+
+        Args:
+            name (str): The name of the step.
+            function (callable): The function initializing the component.
+            *args: The arguments of the function.
+
+        Returns:
+            object: The component.
+        """
+        started = time.perf_counter()
+        try:
+            with self.tracer.span("startup", name):
+                return function(*args)
+        finally:
+            with self._lock:
+                self.timings[name] = time.perf_counter() - started
+
+    def ready(self):
+        """
+        Marks the assistant as ready and stops the worker threads.
+
+        Returns:
+            float: The seconds from the start until ready.
+        """
+        self._executor.shutdown(wait=False)
+        self.ready_after = time.perf_counter() - self._started
+        self.tracer.record("startup", "ready", None, time.time() - self.ready_after, self.ready_after)
+        return self.ready_after
+
+    def report(self):
+        """
+        Summarizes the startup.
+
+        Returns:
+            str: The time until ready and the duration of every step, slowest first.
+        """
+        with self._lock:
+            steps = sorted(self.timings.items(), key=lambda step: step[1], reverse=True)
+        total = f"Ready in {self.ready_after:.2f} s" if self.ready_after is not None else "Starting"
+        return total + ": " + ", ".join(f"{name} {seconds:.2f} s" for name, seconds in steps)
@@ -0,0 +1,170 @@
+import json
+
+'''
+Speech recognition engines.
+Every engine's `stream(sample_rate)` returns a recognition stream that is fed the frames of one utterance while they
+are captured: `accept(frame)` returns a partial hypothesis when the engine has a new one, and `finish()` returns the
+final text once the utterance has ended.
+'''
+
+
+class GoogleEngine:
+    """
+    A speech recognition engine using Google's Speech Recognition API. It has no partial results: the utterance is
+    uploaded once it has ended.
+    """
+    name = 'google'
+
+    def __init__(self, recognizer=None):
+        """
+        Args:
+            recognizer (Recognizer): The speech_recognition recognizer, a new one by default.
+        """
+        import speech_recognition as sr
+
+        self._sr = sr
+        self.recognizer = recognizer if recognizer is not None else sr.Recognizer()
+
+    def stream(self, sample_rate, sample_width=2):
+        """
+        Starts recognizing a new utterance.
+
+        Args:
+            sample_rate (int): The sample rate of the frames in Hz.
+            sample_width (int): The bytes per sample of the frames.
+
+        Returns:
+            GoogleStream: The recognition stream.
+        """
+        return GoogleStream(self, sample_rate, sample_width)
+
+
+class GoogleStream:
+    def __init__(self, engine, sample_rate, sample_width):
+        self.engine = engine
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self._frames = []
+
+    def accept(self, frame):
+        """
+        Buffers a frame of the utterance.
+
+        Args:
+            frame (bytes): The PCM frame.
+
+        Returns:
+            None: Google's API has no partial results.
+        """
+        self._frames.append(frame)
+        return None
+
+    def finish(self):
+        """
+        Uploads the utterance and returns its text.
+
+        Returns:
+            str: The recognized text.
+
+        Raises:
+            speech_recognition.UnknownValueError: If nothing was understood.
+        """
+        audio = self.engine._sr.AudioData(b"".join(self._frames), self.sample_rate, self.sample_width)
+        return self.engine.recognizer.recognize_google(audio)
+
+
+class VoskEngine:
+    """
+    An offline speech recognition engine using a local Vosk (Kaldi) model on the CPU. It decodes the frames while
+    they are captured, so it has partial results and the final text is ready right after the end of speech.
+    """
+    name = 'vosk'
+
+    def __init__(self, model_path="vosk-model-small-en-us"):
+        """
+        Loads the model.
+
+        Args:
+            model_path (str): The folder of the Vosk model (see https://alphacephei.com/vosk/models).
+        """
+        import vosk
+
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        self.model = vosk.Model(model_path)
+
+    def stream(self, sample_rate, sample_width=2):
+        """
+        Starts recognizing a new utterance.
+
+        Args:
+            sample_rate (int): The sample rate of the frames in Hz.
+            sample_width (int): The bytes per sample of the frames, Vosk needs 16-bit samples.
+
+        Returns:
+            VoskStream: The recognition stream.
+        """
+        if sample_width != 2:
+            raise ValueError("Vosk needs 16-bit samples")
+        return VoskStream(self._vosk.KaldiRecognizer(self.model, sample_rate))
+
+
+class VoskStream:
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self._segments = []
+        self._partial = ""
+
+    def accept(self, frame):
+        """
+        Decodes a frame of the utterance.
+
+        Args:
+            frame (bytes): The PCM frame.
+
+        Returns:
+            str or None: The new partial hypothesis of the whole utterance, or None if it did not change.
+        """
+        if self.recognizer.AcceptWaveform(frame):
+            # Vosk finished a segment at a pause, its text is final
+            self._segments.append(json.loads(self.recognizer.Result())["text"])
+            partial = ""
+        else:
+            partial = json.loads(self.recognizer.PartialResult())["partial"]
+        hypothesis = " ".join(segment for segment in self._segments + [partial] if segment)
+        if hypothesis == self._partial:
+            return None
+        self._partial = hypothesis
+        return hypothesis
+
+    def finish(self):
+        """
+        Flushes the decoder and returns the text of the utterance.
+
+        Returns:
+            str: The recognized text, or an empty string if nothing was understood.
+        """
+        self._segments.append(json.loads(self.recognizer.FinalResult())["text"])
+        return " ".join(segment for segment in self._segments if segment)
+
+
+ENGINES = {
+    'google': GoogleEngine,
+    'vosk': VoskEngine,
+}
+
+
+def create_engine(name='google', **options):
+    """
+    Creates a speech recognition engine by name.
+
+    Args:
+        name (str): "google" or "vosk".
+        **options: The arguments of the engine's constructor.
+
+    Returns:
+        object: The engine.
+    """
+    if name not in ENGINES:
+        raise ValueError(f"Unknown speech recognition engine '{name}', expected one of {sorted(ENGINES)}")
+    return ENGINES[name](**options)
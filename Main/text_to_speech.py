@@ -1,15 +1,268 @@
-from io import BytesIO
-from gtts import gTTS
+import hashlib
+import os
+import queue
+import struct
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pydub import AudioSegment
-from pydub.playback import play
+from sentences import iter_sentences, split_sentences
+from tts_backends import GTTSBackend
+
+# Header of a cached audio file: sample width, frame rate and number of channels of the raw PCM that follows
+PCM_HEADER = struct.Struct('<HIH')
+
+
+class AudioCache:
+    """
+    A content-addressed cache of decoded audio, kept in memory and persisted to a directory across runs.
+
+    Entries are keyed by the text and the voice (backend, language, accent) they were synthesized with and stored
+    as raw PCM, so a hit
+    needs neither a network round-trip nor an mp3 decode. When the cache grows over `max_bytes`, the least recently
+    used entries are removed.
+
+    Attributes:
+        directory (str): The directory the entries are persisted to, or None to keep them in memory only.
+        max_bytes (int): The maximum size of the cached PCM data.
+    """
+
+    def __init__(self, directory="tts_cache", max_bytes=64 * 1024 * 1024):
+        """
+        Initializes the cache and indexes the entries already persisted in the directory.
+
+        Args:
+            directory (str): The directory the entries are persisted to, or None to keep them in memory only.
+            max_bytes (int): The maximum size of the cached PCM data.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Maps every key to the size of its entry, from the least to the most recently used
+        self._sizes = OrderedDict()
+        self._segments = {}
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.pcm')]
+            for path in sorted(paths, key=os.path.getmtime):
+                self._sizes[os.path.basename(path)[:-4]] = os.path.getsize(path)
+            self._evict()
+
+    @staticmethod
+    def make_key(text, voice):
+        """
+        Builds the key of a phrase.
+
+        Args:
+            text (str): The text of the phrase.
+            voice (str): The voice of the backend it is spoken with, e.g. "gtts:en:co.uk".
+
+        Returns:
+            str: The hex SHA-256 digest of the phrase.
+        """
+        return hashlib.sha256(f"{voice}\0{text}".encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pcm')
+
+    def get(self, key):
+        """
+        Returns the cached audio of the key and marks it as recently used.
+
+        Args:
+            key (str): The key built with `make_key`.
+
+        Returns:
+            AudioSegment or None: The cached audio, or None if it is not cached.
+        """
+        with self._lock:
+            if key not in self._sizes:
+                return None
+            self._sizes.move_to_end(key)
+            segment = self._segments.get(key)
+            if segment is None:
+                with open(self._path(key), 'rb') as file:
+                    sample_width, frame_rate, channels = PCM_HEADER.unpack(file.read(PCM_HEADER.size))
+                    data = file.read()
+                segment = AudioSegment(data=data, sample_width=sample_width, frame_rate=frame_rate,
+                                       channels=channels)
+                self._segments[key] = segment
+            if self.directory is not None:
+                # The modification time keeps the least recently used order across runs
+                os.utime(self._path(key))
+            return segment
+
+    def put(self, key, segment):
+        """
+        Stores audio in the cache and evicts the least recently used entries beyond the size limit.
+
+        Args:
+            key (str): The key built with `make_key`.
+            segment (AudioSegment): The decoded audio.
+        """
+        with self._lock:
+            if self.directory is not None:
+                with open(self._path(key), 'wb') as file:
+                    file.write(PCM_HEADER.pack(segment.sample_width, segment.frame_rate, segment.channels))
+                    file.write(segment.raw_data)
+            self._segments[key] = segment
+            self._sizes[key] = len(segment.raw_data)
+            self._sizes.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        while self._sizes and sum(self._sizes.values()) > self.max_bytes:
+            key, _ = self._sizes.popitem(last=False)
+            self._segments.pop(key, None)
+            if self.directory is not None and os.path.exists(self._path(key)):
+                os.remove(self._path(key))
+
+    def __contains__(self, key):
+        return key in self._sizes
+
+
+class PyAudioSink:
+    """
+    An audio sink that writes decoded audio to one long-lived PyAudio output stream, so consecutive chunks play
+    back-to-back without reopening the device between them.
+    """
+    def __init__(self):
+        self._audio = None
+        self._stream = None
+        self._format = None
+
+    def play(self, segment):
+        """
+        Plays the audio and returns when it has been written to the device.
+
+        Args:
+            segment (AudioSegment): The audio to play.
+        """
+        audio_format = (segment.sample_width, segment.channels, segment.frame_rate)
+        if audio_format != self._format:
+            # The stream is only reopened when the format changes, e.g. when the backend falls back to another one
+            import pyaudio
+            self.close()
+            if self._audio is None:
+                self._audio = pyaudio.PyAudio()
+            self._stream = self._audio.open(format=self._audio.get_format_from_width(segment.sample_width),
+                                            channels=segment.channels, rate=segment.frame_rate, output=True)
+            self._format = audio_format
+        self._stream.write(segment.raw_data)
+
+    def close(self):
+        """
+        Closes the output stream.
+        """
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+            self._format = None
+
+
+class NullSink:
+    """
+    An audio sink that discards the audio, for running without an audio device (e.g. in tests and benchmarks).
+
+    Attributes:
+        realtime (bool): Whether `play` waits for the duration of the audio like a real device would.
+        played (list): The durations in seconds of the segments played so far.
+    """
+    def __init__(self, realtime=False):
+        self.realtime = realtime
+        self.played = []
+
+    def play(self, segment):
+        self.played.append(segment.duration_seconds)
+        if self.realtime:
+            time.sleep(segment.duration_seconds)
+
+    def close(self):
+        pass
+
 
 class TextToSpeech:
     """
-    This class is used to convert text to speech using the Google Text-to-Speech API and play the resulting audio.
+    This class is used to convert text to speech with a text to speech backend (Google's Text-to-Speech API by
+    default, see tts_backends) and play the resulting audio.
+
+    Text is split into sentences that are synthesized on a worker pool ahead of playback, so the first sentence
+    starts playing while the next ones are still being synthesized. Canned phrases registered with `warm_up` are
+    cached as decoded audio, so they play without any network I/O.
     """
+    def __init__(self, backend=None, cache=None, sink=None, workers=2, lookahead=3):
+        """
+        Initializes the text to speech converter.
+
+        Args:
+            backend (object): The backend whose `synthesize(text)` returns a PCMAudio, defaults to a GTTSBackend.
+            cache (AudioCache): The cache of canned phrases, defaults to an AudioCache in the "tts_cache" folder.
+            sink (object): The object whose `play(segment)` method plays the audio, defaults to a PyAudioSink.
+            workers (int): The number of sentences synthesized in parallel.
+            lookahead (int): The maximum number of sentences synthesized ahead of the one playing.
+        """
+        self.backend = backend if backend is not None else GTTSBackend()
+        self.cache = cache if cache is not None else AudioCache()
+        self.canned_phrases = set()
+        self.sink = sink if sink is not None else PyAudioSink()
+        self.lookahead = lookahead
+        self._interrupted = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tts')
+
+    def synthesize(self, text):
+        """
+        Converts the provided text to speech, or returns the cached audio if the text is a canned phrase that was
+        synthesized before.
+
+        Args:
+            text (str): The text to be converted to speech.
+
+        Returns:
+            AudioSegment: The decoded audio.
+        """
+        key = AudioCache.make_key(text, self.backend.voice)
+        audio = self.cache.get(key)
+        if audio is not None:
+            return audio
+        pcm = self.backend.synthesize(text)
+        audio = AudioSegment(data=pcm.data, sample_width=pcm.sample_width, frame_rate=pcm.sample_rate,
+                             channels=pcm.channels)
+        if text in self.canned_phrases:
+            # Keyed by the voice that produced the audio, e.g. the offline one of a FallbackBackend
+            self.cache.put(AudioCache.make_key(text, pcm.voice or self.backend.voice), audio)
+        return audio
+
+    def warm_up(self, phrases):
+        """
+        Registers canned phrases to be cached and synthesizes the ones that are not cached yet in a background thread.
+
+        Args:
+            phrases (Iterable[str]): The canned phrases, e.g. every response in intents.json.
+
+        Returns:
+            threading.Thread: The background thread, already started.
+        """
+        phrases = [phrase for phrase in phrases if phrase]
+        self.canned_phrases.update(phrases)
+        thread = threading.Thread(target=self._warm_up, args=(phrases,), daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_up(self, phrases):
+        for phrase in phrases:
+            if AudioCache.make_key(phrase, self.backend.voice) in self.cache:
+                continue
+            try:
+                self.synthesize(phrase)
+            except Exception:
+                # A phrase that fails now is synthesized again when it is first spoken
+                continue
+
     def play_audio(self, answer):
         """
-        Converts the provided answer text to speech using Google's Text-to-Speech API and plays the resulting audio.
+        Converts the provided answer text to speech and plays the resulting audio.
 
         Args:
             answer (str): The answer text to be converted to speech.
@@ -20,14 +273,101 @@ class TextToSpeech:
         if not answer:
             # If the answer is empty, return without playing anything
             return
-        # Create an in-memory file object to hold the audio data
-        fp = BytesIO()
-        # Use the Google Text-to-Speech API to convert the answer to speech and write the resulting audio to the file object
-        tts = gTTS(text=answer, lang='en', tld='co.uk', slow=False)
-        tts.write_to_fp(fp)
-        # Reset the file object's position to the beginning
-        fp.seek(0)
-        # Load the audio data from the file object using PyDub
-        audio = AudioSegment.from_file(fp, format="mp3")
-        # Play the audio using PyDub's playback function
-        play(audio)
\ No newline at end of file
+        # Canned phrases are played whole so they match their cache entry
+        if answer in self.canned_phrases:
+            sentences = [answer]
+        else:
+            sentences = split_sentences(answer)
+        self._play_pipeline(sentences)
+
+    def play_stream(self, chunks, on_sentence=None):
+        """
+        Speaks streamed text (e.g. the token deltas of a streamed answer) sentence by sentence. The first sentence
+        starts playing as soon as it is complete, while the following ones are still being generated.
+
+        Args:
+            chunks (Iterable[str]): The text chunks in order.
+            on_sentence (callable): An optional function called with every sentence when it is complete,
+                e.g. to print it.
+
+        Returns:
+            str: The whole text that was spoken.
+        """
+        return self._play_pipeline(iter_sentences(chunks), on_sentence)
+
+    def stop(self):
+        """
+        Stops the playback in progress after the chunk that is playing, e.g. when the user barges in. The rest of the
+        reply being spoken is skipped, until `resume` is called.
+        """
+        self._interrupted.set()
+
+    def resume(self):
+        """
+        Lets the next reply be played after `stop`.
+        """
+        self._interrupted.clear()
+
+    @property
+    def interrupted(self):
+        """
+        Whether `stop` was called since the last `resume`.
+        """
+        return self._interrupted.is_set()
+
+    def _play_pipeline(self, sentences, on_sentence=None):
+        """
+        Synthesizes the sentences on the worker pool, at most `lookahead` ahead of playback, and plays them
+        back-to-back in order.
+
+        Args:
+            sentences (Iterable[str]): The sentences to speak, possibly still being generated.
+            on_sentence (callable): An optional function called with every sentence when it is submitted.
+
+        Returns:
+            str: The whole text that was spoken.
+        """
+        pending = queue.Queue(maxsize=self.lookahead)
+        stopped = threading.Event()
+        self.resume()
+        spoken = []
+        errors = []
+
+        def produce():
+            try:
+                for sentence in sentences:
+                    if stopped.is_set():
+                        break
+                    spoken.append(sentence)
+                    if on_sentence is not None:
+                        on_sentence(sentence)
+                    # Blocks while `lookahead` sentences are waiting to be played
+                    pending.put(self._executor.submit(self.synthesize, sentence))
+            except Exception as error:
+                errors.append(error)
+            finally:
+                pending.put(None)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                future = pending.get()
+                if future is None:
+                    break
+                if self._interrupted.is_set():
+                    # Keep draining so the producer finishes, but play nothing more
+                    stopped.set()
+                    continue
+                self.sink.play(future.result())
+        except BaseException:
+            # Let the producer finish so its thread does not stay blocked on the full queue
+            stopped.set()
+            while pending.get() is not None:
+                pass
+            raise
+        finally:
+            producer.join()
+        if errors:
+            raise errors[0]
+        return " ".join(spoken)
@@ -0,0 +1,202 @@
+import bisect
+import collections
+import contextlib
+import json
+import threading
+import time
+
+'''
+Per-stage latency spans of the assistant's turns.
+Every stage of a turn (mic capture, STT, intent inference, the skill handler and each of its blocking calls, TTS
+synthesis and playback) is recorded as a span with the turn it belongs to, its start time and its duration. Spans
+are kept in memory, optionally appended to a JSON lines file, and aggregated into per-stage latency histograms and
+exception counters that are exported in the Prometheus text format.
+'''
+
+# The upper bounds in seconds of the histogram buckets, from a fast inference to a slow network call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Tracer:
+    """
+    Records the spans of the turns and aggregates them. It is thread-safe.
+
+    Attributes:
+        path (str): The JSON lines file every span is appended to, or None.
+        buckets (tuple): The upper bounds in seconds of the histogram buckets.
+        recent (deque): The latest spans, as dictionaries.
+    """
+    def __init__(self, path=None, buckets=DEFAULT_BUCKETS, keep=1000):
+        """
+        Initializes the tracer.
+
+        Args:
+            path (str): The JSON lines file to append every span to, or None to only keep them in memory.
+            buckets (tuple): The upper bounds in seconds of the histogram buckets.
+            keep (int): How many of the latest spans are kept in memory.
+        """
+        self.path = path
+        self.buckets = tuple(sorted(buckets))
+        self.recent = collections.deque(maxlen=keep)
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', buffering=1) if path else None
+        # (stage, name) -> [bucket counts, sum of the durations, number of spans]
+        self._histograms = {}
+        self._errors = collections.Counter()
+
+    @contextlib.contextmanager
+    def span(self, stage, name="", turn=None, **attributes):
+        """
+        Records the duration of the code in the `with` block as a span. An exception raised in the block is counted
+        for the stage, recorded in the span and raised again.
+
+        Args:
+            stage (str): The stage, e.g. "stt" or "tts".
+            name (str): What ran in the stage, e.g. the intent of a handler or the function of a blocking call.
+            turn (int): The identifier of the turn the span belongs to, or None.
+            **attributes: More JSON-serializable fields of the span.
+        """
+        start = time.time()
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException as error:
+            self.record(stage, name, turn, start, time.perf_counter() - started, error, **attributes)
+            raise
+        self.record(stage, name, turn, start, time.perf_counter() - started, **attributes)
+
+    def record(self, stage, name, turn, start, duration, error=None, **attributes):
+        """
+        Records a span that has been measured elsewhere.
+
+        Args:
+            stage (str): The stage.
+            name (str): What ran in the stage.
+            turn (int): The identifier of the turn the span belongs to, or None.
+            start (float): The start of the span, in seconds since the epoch.
+            duration (float): The duration of the span in seconds.
+            error (BaseException): The exception that ended the span, or None.
+            **attributes: More JSON-serializable fields of the span.
+        """
+        span = {'turn': turn, 'stage': stage, 'name': name, 'start': round(start, 6),
+                'duration': round(duration, 6), **attributes}
+        if error is not None:
+            span['error'] = f"{type(error).__name__}: {error}"
+        with self._lock:
+            self.recent.append(span)
+            histogram = self._histograms.get((stage, name))
+            if histogram is None:
+                histogram = self._histograms[(stage, name)] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bisect.bisect_left(self.buckets, duration)] += 1
+            histogram[1] += duration
+            histogram[2] += 1
+            # A cancelled task (e.g. a stage stopped at shutdown) is not a failure of the stage
+            if error is not None and isinstance(error, Exception):
+                self._errors[stage] += 1
+            if self._file is not None:
+                self._file.write(json.dumps(span) + "\n")
+
+    def count_error(self, stage):
+        """
+        Counts an exception of a stage that was handled without a span.
+
+        Args:
+            stage (str): The stage.
+        """
+        with self._lock:
+            self._errors[stage] += 1
+
+    @property
+    def errors(self):
+        """
+        The number of exceptions of every stage.
+        """
+        with self._lock:
+            return dict(self._errors)
+
+    def turn_spans(self, turn):
+        """
+        Returns the recent spans of a turn.
+
+        Args:
+            turn (int): The identifier of the turn.
+
+        Returns:
+            list: The spans of the turn, in the order they ended.
+        """
+        with self._lock:
+            return [span for span in self.recent if span['turn'] == turn]
+
+    def prometheus(self):
+        """
+        Exports the latency histograms and the exception counters in the Prometheus text format.
+
+        Returns:
+            str: The metrics.
+        """
+        lines = ["# HELP assistant_stage_duration_seconds The duration of the stages of the turns.",
+                 "# TYPE assistant_stage_duration_seconds histogram"]
+        with self._lock:
+            histograms = sorted((key, (list(counts), total, count))
+                                for key, (counts, total, count) in self._histograms.items())
+            errors = sorted(self._errors.items())
+        for (stage, name), (counts, total, count) in histograms:
+            labels = f'stage="{stage}",name="{_escape(name)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float('inf') else f"{bound:g}"
+                lines.append(f'assistant_stage_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"assistant_stage_duration_seconds_sum{{{labels}}} {total:.6f}")
+            lines.append(f"assistant_stage_duration_seconds_count{{{labels}}} {count}")
+        lines += ["# HELP assistant_stage_errors_total The exceptions raised in the stages of the turns.",
+                  "# TYPE assistant_stage_errors_total counter"]
+        lines += [f'assistant_stage_errors_total{{stage="{stage}"}} {count}' for stage, count in errors]
+        return "\n".join(lines) + "\n"
+
+    def serve_metrics(self, port=9100, host="127.0.0.1"):
+        """
+        Serves `prometheus()` at http://host:port/metrics from a daemon thread.
+
+        Args:
+            port (int): The port to bind to, 0 picks a free port.
+            host (str): The host to bind to.
+
+        Returns:
+            ThreadingHTTPServer: The server, whose `server_address` holds the bound port.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def close(self):
+        """
+        Closes the JSON lines file.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
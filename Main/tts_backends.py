@@ -0,0 +1,300 @@
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+from collections import namedtuple
+
+# Decoded audio returned by every backend: raw little-endian PCM, its format and the voice that produced it
+PCMAudio = namedtuple('PCMAudio', ['data', 'sample_rate', 'sample_width', 'channels', 'voice'], defaults=(None,))
+
+
+def read_wav(wav_bytes, voice=None):
+    """
+    Decodes a WAV file held in memory.
+
+    Args:
+        wav_bytes (bytes): The content of the WAV file.
+        voice (str): The voice that produced the audio.
+
+    Returns:
+        PCMAudio: The decoded audio.
+    """
+    with wave.open(io.BytesIO(wav_bytes), 'rb') as wav:
+        return PCMAudio(wav.readframes(wav.getnframes()), wav.getframerate(), wav.getsampwidth(), wav.getnchannels(),
+                        voice)
+
+
+class GTTSBackend:
+    """
+    A text to speech backend using Google's Text-to-Speech API. It needs a network round-trip for every text.
+
+    Attributes:
+        voice (str): Identifies the backend and voice, e.g. to key cached audio.
+    """
+    name = 'gtts'
+
+    def __init__(self, lang='en', tld='co.uk', timeout=None):
+        """
+        Initializes the backend.
+
+        Args:
+            lang (str): The language the text is spoken in.
+            tld (str): The Google domain that selects the accent.
+            timeout (float): The seconds a request to the API may take before it fails, None to wait forever.
+        """
+        self.lang = lang
+        self.tld = tld
+        self.timeout = timeout
+        self.voice = f"gtts:{lang}:{tld}"
+
+    def synthesize(self, text):
+        """
+        Converts the text to speech.
+
+        Args:
+            text (str): The text to be converted to speech.
+
+        Returns:
+            PCMAudio: The decoded audio.
+        """
+        from gtts import gTTS
+        from pydub import AudioSegment
+
+        # Write the mp3 returned by the API to an in-memory file object and decode it with PyDub
+        fp = io.BytesIO()
+        gTTS(text=text, lang=self.lang, tld=self.tld, slow=False, timeout=self.timeout).write_to_fp(fp)
+        fp.seek(0)
+        audio = AudioSegment.from_file(fp, format="mp3")
+        return PCMAudio(audio.raw_data, audio.frame_rate, audio.sample_width, audio.channels, self.voice)
+
+
+class EspeakBackend:
+    """
+    An offline text to speech backend running the espeak-ng (or espeak) command line synthesizer locally.
+
+    Attributes:
+        voice (str): Identifies the backend and voice, e.g. to key cached audio.
+    """
+    name = 'espeak'
+
+    def __init__(self, voice='en-gb', speed=160):
+        """
+        Initializes the backend.
+
+        Args:
+            voice (str): The espeak voice to speak with.
+            speed (int): The speed in words per minute.
+        """
+        self.executable = shutil.which('espeak-ng') or shutil.which('espeak')
+        if self.executable is None:
+            raise RuntimeError("espeak-ng or espeak must be installed to use the espeak backend")
+        self.espeak_voice = voice
+        self.speed = speed
+        self.voice = f"espeak:{voice}:{speed}"
+
+    def synthesize(self, text):
+        """
+        Converts the text to speech.
+
+        Args:
+            text (str): The text to be converted to speech.
+
+        Returns:
+            PCMAudio: The decoded audio.
+        """
+        result = subprocess.run([self.executable, '-v', self.espeak_voice, '-s', str(self.speed), '--stdout', text],
+                                capture_output=True, check=True)
+        return read_wav(result.stdout, self.voice)
+
+
+class Pyttsx3Backend:
+    """
+    An offline text to speech backend using pyttsx3, which drives the speech engine of the operating system
+    (SAPI5 on Windows, NSSpeechSynthesizer on macOS and espeak on Linux).
+
+    Attributes:
+        voice (str): Identifies the backend and voice, e.g. to key cached audio.
+    """
+    name = 'pyttsx3'
+
+    def __init__(self, rate=None, voice_id=None):
+        """
+        Initializes the backend.
+
+        Args:
+            rate (int): The speed in words per minute, defaults to the engine's.
+            voice_id (str): The id of the voice to speak with, defaults to the engine's.
+        """
+        import pyttsx3
+
+        self.engine = pyttsx3.init()
+        if rate is not None:
+            self.engine.setProperty('rate', rate)
+        if voice_id is not None:
+            self.engine.setProperty('voice', voice_id)
+        # The engine is not thread-safe, so only one text is synthesized at a time
+        self._lock = threading.Lock()
+        self.voice = f"pyttsx3:{self.engine.getProperty('voice')}:{self.engine.getProperty('rate')}"
+
+    def synthesize(self, text):
+        """
+        Converts the text to speech.
+
+        Args:
+            text (str): The text to be converted to speech.
+
+        Returns:
+            PCMAudio: The decoded audio.
+        """
+        handle, path = tempfile.mkstemp(suffix='.wav')
+        os.close(handle)
+        try:
+            with self._lock:
+                self.engine.save_to_file(text, path)
+                self.engine.runAndWait()
+            with open(path, 'rb') as file:
+                return read_wav(file.read(), self.voice)
+        finally:
+            os.remove(path)
+
+
+class FallbackBackend:
+    """
+    A backend that uses a primary (network) backend and switches to a fallback (offline) backend when the primary
+    fails or its latency goes over a threshold. The primary backend is tried again after `retry_interval` seconds.
+    A primary that stalls only fails if it has a timeout of its own, e.g. the `timeout` of GTTSBackend.
+
+    Attributes:
+        latency (float): The moving average of the primary backend's latency, in seconds.
+    """
+    name = 'fallback'
+
+    def __init__(self, primary, fallback, latency_threshold=1.5, retry_interval=60.0):
+        """
+        Initializes the backend.
+
+        Args:
+            primary (object): The preferred backend.
+            fallback (object): The backend used while the primary one is too slow or failing.
+            latency_threshold (float): The average primary latency in seconds above which the fallback is used.
+            retry_interval (float): How long in seconds the fallback is used before the primary is tried again.
+        """
+        self.primary = primary
+        self.fallback = fallback
+        self.latency_threshold = latency_threshold
+        self.retry_interval = retry_interval
+        self.latency = 0.0
+        self._fallback_until = 0.0
+
+    @property
+    def voice(self):
+        """
+        The voice of the backend in use, the fallback's while the primary is degraded. The audio returned by
+        `synthesize` carries the voice that actually produced it.
+        """
+        return self.fallback.voice if time.monotonic() < self._fallback_until else self.primary.voice
+
+    def synthesize(self, text):
+        """
+        Converts the text to speech with the primary backend, or with the fallback one while the primary is degraded.
+
+        Args:
+            text (str): The text to be converted to speech.
+
+        Returns:
+            PCMAudio: The decoded audio.
+        """
+        if time.monotonic() < self._fallback_until:
+            return self.fallback.synthesize(text)
+        start = time.monotonic()
+        try:
+            audio = self.primary.synthesize(text)
+        except Exception:
+            self._fallback_until = time.monotonic() + self.retry_interval
+            return self.fallback.synthesize(text)
+        elapsed = time.monotonic() - start
+        self.latency = elapsed if self.latency == 0.0 else 0.7 * self.latency + 0.3 * elapsed
+        if self.latency > self.latency_threshold:
+            self._fallback_until = time.monotonic() + self.retry_interval
+            self.latency = 0.0
+        return audio
+
+
+class SilentBackend:
+    """
+    A local stand-in backend that returns silence as long as the text would take to speak, after a fixed latency.
+    It runs the assistant headless in tests and load tests without any network or audio dependency.
+
+    Attributes:
+        voice (str): Identifies the backend and voice, e.g. to key cached audio.
+    """
+    name = 'silent'
+
+    def __init__(self, latency=0.05, words_per_minute=160, sample_rate=16000):
+        """
+        Initializes the backend.
+
+        Args:
+            latency (float): The seconds every synthesis takes.
+            words_per_minute (int): The speaking rate the duration of the silence is computed from.
+            sample_rate (int): The sample rate of the silence in Hz.
+        """
+        self.latency = latency
+        self.words_per_minute = words_per_minute
+        self.sample_rate = sample_rate
+        self.voice = f"silent:{words_per_minute}"
+
+    def synthesize(self, text):
+        """
+        Converts the text to silence.
+
+        Args:
+            text (str): The text to be converted to speech.
+
+        Returns:
+            PCMAudio: 16-bit mono silence.
+        """
+        time.sleep(self.latency)
+        samples = int(len(text.split()) * 60 / self.words_per_minute * self.sample_rate)
+        return PCMAudio(bytes(2 * samples), self.sample_rate, 2, 1, self.voice)
+
+
+BACKENDS = {
+    'gtts': GTTSBackend,
+    'espeak': EspeakBackend,
+    'pyttsx3': Pyttsx3Backend,
+    'silent': SilentBackend,
+}
+
+
+def create_backend(name='auto', latency_threshold=1.5, **options):
+    """
+    Creates a text to speech backend by name.
+
+    Args:
+        name (str): "gtts", "espeak", "pyttsx3", "silent" (a local stand-in), or "auto" for gTTS with an automatic fallback to the first
+            offline backend that is available.
+        latency_threshold (float): The gTTS latency in seconds above which "auto" switches to the offline backend. It
+            is also the timeout of a gTTS request, so a stalled request fails and falls back too.
+        **options: The arguments of the backend's constructor.
+
+    Returns:
+        object: The backend.
+    """
+    if name != 'auto':
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown text to speech backend '{name}', expected one of {sorted(BACKENDS)} or 'auto'")
+        return BACKENDS[name](**options)
+
+    primary = GTTSBackend(**{'timeout': latency_threshold, **options})
+    for offline in (EspeakBackend, Pyttsx3Backend):
+        try:
+            return FallbackBackend(primary, offline(), latency_threshold)
+        except (ImportError, RuntimeError, OSError):
+            continue
+    # No offline engine is installed, so there is nothing to fall back to
+    return primary
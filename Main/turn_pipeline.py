@@ -0,0 +1,522 @@
+import asyncio
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sentences import iter_sentences, split_sentences
+from tracing import Tracer
+
+'''
+The turn pipeline of the assistant.
+A turn goes through separate asyncio stages joined by queues: capture -> STT -> intent -> handler -> TTS -> playback.
+Handlers run as concurrent tasks, so a slow network call of one turn does not hold up capturing and classifying
+the next utterance, while the replies are still printed and spoken in the order the utterances were heard.
+The pipeline can be driven by the microphone or headlessly by scripted text.
+Every stage of a turn is recorded as a span by the pipeline's tracer (see tracing.py), and the exceptions of a stage
+are counted there instead of being lost.
+'''
+
+# The identifiers of the turns, unique across the pipelines of the process so the spans of concurrent sessions
+# do not mix
+_turn_ids = itertools.count(1)
+
+
+class Turn:
+    """
+    One utterance of the user and the reply the handler builds for it.
+
+    Attributes:
+        id (int): The identifier of the turn in the spans of the tracer.
+        text (str): The text of the utterance.
+        result (IntentResult): The intent classification of the text.
+        end_session (bool): Set by the handler to stop the assistant once the reply has been spoken.
+        skill (Skill): The skill handling the turn, whose timeout and concurrency limit apply to `run_blocking`.
+        waited (float): The seconds the handler spent in `ask`, waiting for the user's answers.
+    """
+
+    def __init__(self, pipeline, text, result, turn_id=None):
+        self.pipeline = pipeline
+        self.id = turn_id if turn_id is not None else next(_turn_ids)
+        self.text = text
+        self.result = result
+        self.end_session = False
+        self.skill = None
+        self.waited = 0.0
+        self.outputs = asyncio.Queue()
+        self.released = asyncio.Event()
+
+    def show(self, text):
+        """
+        Prints a line of the reply without speaking it.
+
+        Args:
+            text (str): The line to print.
+        """
+        self.outputs.put_nowait(("show", text, None))
+
+    def say(self, text, display=None):
+        """
+        Prints and speaks a line of the reply.
+
+        Args:
+            text (str): The text to speak.
+            display (str): The line to print, defaults to "<name> :> <text>".
+        """
+        if display is None:
+            display = f"{self.pipeline.name} :> {text}"
+        self.outputs.put_nowait(("say", display, text))
+
+    async def say_stream(self, chunks):
+        """
+        Prints and speaks streamed text (e.g. the token deltas of a streamed answer) sentence by sentence, so the
+        first sentence is spoken while the next ones are still being generated.
+
+        Args:
+            chunks (Iterable[str]): The text chunks, iterated in a worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        self.show(f"{self.pipeline.name} :>")
+
+        def produce():
+            for sentence in iter_sentences(chunks):
+                loop.call_soon_threadsafe(self.say, sentence, sentence)
+
+        await self.run_blocking(produce, name="stream")
+
+    async def ask(self, prompt):
+        """
+        Asks the user a follow-up question, after everything said so far in this turn has been spoken. While an
+        answer is typed, the microphone stays muted, so nothing heard meanwhile becomes a turn.
+
+        Args:
+            prompt (str): The question.
+
+        Returns:
+            str: The answer of the user.
+        """
+        started = time.perf_counter()
+        played = asyncio.get_running_loop().create_future()
+        self.outputs.put_nowait(("sync", None, played))
+        await played
+        self.pipeline._hold_microphone()
+        try:
+            self.pipeline.output(prompt)
+            # The assistant waits for the user while the question is answered
+            self.pipeline._set_state(self.pipeline._resting)
+            answer = await self.pipeline.ask(prompt)
+        finally:
+            self.waited += time.perf_counter() - started
+            self.pipeline._release_microphone()
+        self.pipeline._set_state("thinking")
+        return answer
+
+    def release(self):
+        """
+        Tells the pipeline this turn will not ask anything more, so the next utterance can be handled.
+        """
+        self.released.set()
+
+    async def run_blocking(self, function, *args, name=None):
+        """
+        Runs a blocking function (e.g. a network call) in the pipeline's worker pool, within the timeout and
+        concurrency limit of the turn's skill, and records it as a "call" span.
+
+        Args:
+            function (callable): The function.
+            *args: Its arguments.
+            name (str): The name of the span, defaults to the name of the function.
+
+        Returns:
+            The return value of the function.
+
+        Raises:
+            asyncio.TimeoutError: If the call took longer than the skill's timeout.
+        """
+        if name is None:
+            name = getattr(function, '__name__', type(function).__name__)
+        semaphore = self.skill.limit() if self.skill is not None else None
+        if semaphore is not None:
+            await semaphore.acquire()
+        try:
+            with self.pipeline.tracer.span("call", name, self.id, intent=self.result.tag):
+                call = asyncio.get_running_loop().run_in_executor(self.pipeline.executor, function, *args)
+                return await asyncio.wait_for(call, self.skill.timeout if self.skill is not None else None)
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+
+class TurnPipeline:
+    """
+    The asyncio pipeline that turns utterances into spoken replies.
+
+    Attributes:
+        handler (callable): The coroutine function (turn) that builds the reply of a turn, e.g. the dispatch of a
+            skill registry.
+        chatbot (ChatBot): The intent classifier, or an IntentBatcher in front of one shared with other pipelines.
+        name (str): The name of the assistant, used to print its replies.
+        interactive_intents (frozenset): The intents whose handlers ask follow-up questions. The next utterance is only
+            handled once such a handler calls `turn.release()` or finishes.
+        output (callable): The function that prints a line.
+        on_turn_end (callable): Called with every turn once its reply has been printed and spoken, or None.
+        on_state (callable): Called with the state of the assistant whenever it changes, or None: "listening" (or
+            "idle" without a microphone) while waiting for the user, "thinking" while an utterance is recognized
+            and answered, and "speaking" while a reply is played.
+        state (str): The current state of the assistant.
+        tracer (Tracer): Records the spans of the stages of every turn.
+        executor (ThreadPoolExecutor): The worker pool of the blocking calls.
+    """
+
+    def __init__(self, handler, chatbot, name, interactive_intents=(), speech_to_text=None, text_to_speech=None,
+                 microphone_mute=None, output=print, ask=None, on_turn_end=None, workers=8, executor=None,
+                 tracer=None, on_state=None):
+        """
+        Initializes the pipeline.
+
+        Args:
+            handler (callable): The coroutine function (turn) that builds the reply of a turn.
+            chatbot (ChatBot): The intent classifier, or an IntentBatcher in front of one shared with other pipelines.
+            name (str): The name of the assistant, used to print its replies.
+            interactive_intents (Iterable[str]): The intents whose handlers ask follow-up questions.
+            speech_to_text (SpeechToText): The speech recognizer, needed to listen to the microphone.
+            text_to_speech (TextToSpeech): The speech synthesizer, or None to only print the replies.
+            microphone_mute (MicrophoneMute): The gate muted while the assistant speaks, if any.
+            output (callable): The function that prints a line.
+            ask (callable): A coroutine function (prompt) returning the answer to a follow-up question. Defaults to
+                the next utterance.
+            on_turn_end (callable): Called with every turn once its reply has been printed and spoken.
+            workers (int): The size of the worker pool of the blocking calls.
+            executor (ThreadPoolExecutor): A worker pool shared with other pipelines, instead of a new one.
+            tracer (Tracer): The tracer of the spans, e.g. shared with other pipelines. Defaults to a new in-memory
+                tracer.
+            on_state (callable): Called on the event loop with the state of the assistant whenever it changes.
+        """
+        self.handler = handler
+        self.chatbot = chatbot
+        self.name = name
+        # A frozenset passed in is shared, not copied, by the pipelines of every session
+        self.interactive_intents = frozenset(interactive_intents)
+        self.speech_to_text = speech_to_text
+        self.text_to_speech = text_to_speech
+        self.microphone_mute = microphone_mute
+        self.output = output
+        self.ask = ask or self._next_utterance
+        # Whether follow-up questions are answered some other way than by speaking, e.g. typed
+        self._typed_answers = ask is not None
+        self.on_turn_end = on_turn_end
+        self.on_state = on_state
+        self.state = None
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.executor = executor or ThreadPoolExecutor(max_workers=workers, thread_name_prefix='turn')
+        # The queues of the stages only exist while the pipeline runs, so an idle pipeline holds next to nothing
+        self._texts = None
+        self._turns = None
+        self._audio = None
+
+    @property
+    def pending(self):
+        """
+        Whether utterances were submitted that the pipeline has not handled yet.
+        """
+        return self._texts is not None and not self._texts.empty()
+
+    async def run(self, texts=None, until_idle=False):
+        """
+        Runs the pipeline until a handler ends the session or the utterances run out. Without scripted texts, it
+        listens to the microphone if there is a speech recognizer, and otherwise handles the utterances passed to
+        `submit` (e.g. the messages of a network client) until `close_input` is called.
+
+        Args:
+            texts (Iterable[str]): Scripted utterances to handle instead of listening to the microphone.
+            until_idle (bool): With submitted utterances, stop as soon as every one of them has been answered
+                instead of waiting for the next, so an idle pipeline keeps no stage running. Utterances submitted
+                while it stops are left `pending` for the next run.
+        """
+        self._loop = asyncio.get_running_loop()
+        if self._texts is None:
+            self._texts = asyncio.Queue()
+        self._turns = asyncio.Queue()
+        self._audio = asyncio.Queue(maxsize=4)
+        self._until_idle = until_idle and texts is None and self.speech_to_text is None
+        # The turns classified but not played to the end yet
+        self._in_flight = 0
+        # The follow-up questions waiting for a typed answer, during which the microphone stays muted
+        self._asking = 0
+        self._resting = "listening" if texts is None and self.speech_to_text is not None else "idle"
+        self._set_state(self._resting)
+        stages = [self._intent_stage(), self._tts_stage(), self._playback_stage()]
+        if texts is not None:
+            for text in texts:
+                self._texts.put_nowait((text, None, next(_turn_ids)))
+            self._texts.put_nowait(None)
+        elif self.speech_to_text is not None:
+            self._captured = asyncio.Queue()
+            stopping = threading.Event()
+            threading.Thread(target=self._capture_stage, args=(stopping,), daemon=True).start()
+            stages.append(self._stt_stage())
+            if self.microphone_mute is not None:
+                self.microphone_mute.unmute_microphone()
+
+        tasks = [asyncio.ensure_future(stage) for stage in stages]
+        try:
+            # The playback stage finishes last, when the session ends or every reply has been played
+            await tasks[2]
+        finally:
+            if self.speech_to_text is not None and texts is None:
+                stopping.set()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._turns = self._audio = None
+            if not self.pending:
+                self._texts = None
+
+    def submit(self, text):
+        """
+        Passes an utterance to a pipeline running without a speech recognizer and without scripted texts.
+
+        Args:
+            text (str): The utterance.
+        """
+        if self._texts is None:
+            self._texts = asyncio.Queue()
+        self._texts.put_nowait((text, None, next(_turn_ids)))
+
+    def close_input(self):
+        """
+        Tells the pipeline that no more utterances will be submitted, so it stops once the pending replies are played.
+        """
+        if self._texts is None:
+            self._texts = asyncio.Queue()
+        self._texts.put_nowait(None)
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            if self.on_state is not None:
+                self.on_state(state)
+
+    def _hold_microphone(self):
+        # A typed answer is not heard, so whatever the microphone picks up while the user types must not become
+        # the next turns. The microphone stays muted from the question until the answer, without barge-in
+        if self.microphone_mute is not None and self._typed_answers:
+            self._asking += 1
+            self.microphone_mute.mute_microphone(allow_barge_in=False)
+
+    def _release_microphone(self):
+        if self.microphone_mute is not None and self._typed_answers:
+            self._asking -= 1
+            if not self._asking and self._audio.empty() and self.state != "speaking":
+                self.microphone_mute.unmute_microphone()
+
+    def _settle(self):
+        # Once nothing is left to play, wait for the user unless a turn is still being answered
+        if self._audio.empty():
+            self._set_state("thinking" if self._in_flight else self._resting)
+
+    def _capture_stage(self, stopping):
+        """
+        Captures utterances in a daemon thread (a blocked microphone read cannot be cancelled) and passes their
+        recognition streams to the STT stage, together with the intent of the last partial hypothesis.
+
+        Args:
+            stopping (threading.Event): Set when the pipeline stops.
+        """
+        while not stopping.is_set():
+            partial = {}
+            turn_id = next(_turn_ids)
+
+            def classify_partial(text):
+                with self.tracer.span("intent", "partial", turn_id):
+                    partial['result'] = self.chatbot.classify(text)
+                partial['text'] = text
+
+            start, started = time.time(), time.perf_counter()
+            try:
+                stream = self.speech_to_text.capture_utterance(on_partial=classify_partial)
+            except EOFError:
+                self._loop.call_soon_threadsafe(self._captured.put_nowait, None)
+                return
+            except Exception as error:
+                self.tracer.record("capture", "", turn_id, start, time.perf_counter() - started, error)
+                continue
+            self.tracer.record("capture", "", turn_id, start, time.perf_counter() - started)
+            self._loop.call_soon_threadsafe(self._captured.put_nowait, (stream, partial, turn_id))
+
+    async def _stt_stage(self):
+        """
+        Finishes the recognition of every captured utterance while the next one is being captured.
+        """
+        while True:
+            item = await self._captured.get()
+            if item is None:
+                await self._texts.put(None)
+                return
+            stream, partial, turn_id = item
+            if self.state != "speaking":
+                self._set_state("thinking")
+            try:
+                with self.tracer.span("stt", "", turn_id):
+                    text = await self._loop.run_in_executor(self.executor, self._recognize, stream)
+            except Exception:
+                # The recognizer failed (counted by the tracer), keep listening
+                text = None
+            if text is None:
+                if self.state != "speaking":
+                    self._settle()
+                continue
+            result = partial.get('result') if partial.get('text') == text else None
+            await self._texts.put((text, result, turn_id))
+
+    def _recognize(self, stream):
+        """
+        Finishes the recognition of a captured utterance in a worker thread.
+
+        Returns:
+            str: The text, or None if nothing was understood (e.g. noise or a cough), which is not an error of the
+                stage.
+        """
+        import speech_recognition as sr
+
+        try:
+            return self.speech_to_text.recognize(stream)
+        except sr.UnknownValueError:
+            return None
+
+    async def _next_utterance(self, prompt):
+        item = await self._texts.get()
+        if item is None:
+            raise EOFError("No more utterances")
+        return item[0]
+
+    async def _intent_stage(self):
+        """
+        Classifies every utterance and starts its handler, holding the next utterance back while an interactive
+        handler may still ask a follow-up question.
+        """
+        while True:
+            item = await self._texts.get()
+            if item is None:
+                await self._turns.put(None)
+                return
+            text, result, turn_id = item
+            self._in_flight += 1
+            if self.state != "speaking":
+                self._set_state("thinking")
+            if result is None:
+                with self.tracer.span("intent", "", turn_id):
+                    result = await self._classify(text)
+            turn = Turn(self, text, result, turn_id)
+            await self._turns.put(turn)
+            task = asyncio.ensure_future(self._handle(turn))
+            if result.tag in self.interactive_intents:
+                released = asyncio.ensure_future(turn.released.wait())
+                await asyncio.wait([task, released], return_when=asyncio.FIRST_COMPLETED)
+                released.cancel()
+            # Only the handler and the later stages keep the turn alive, not the wait for the next utterance
+            del turn, task
+
+    async def _classify(self, text):
+        if hasattr(self.chatbot, 'submit'):
+            # The batcher classifies the texts of concurrent pipelines together, off the event loop
+            return await asyncio.wrap_future(self.chatbot.submit(text))
+        return self.chatbot.classify(text)
+
+    async def _handle(self, turn):
+        try:
+            with self.tracer.span("handler", turn.result.tag or "", turn.id):
+                await self.handler(turn)
+        except Exception:
+            # A failing handler only loses its own turn, the tracer has counted the exception and recorded it in
+            # the span of the handler
+            pass
+        finally:
+            turn.release()
+            turn.outputs.put_nowait(None)
+
+    async def _tts_stage(self):
+        """
+        Prints the replies in turn order and synthesizes what has to be spoken, ahead of playback.
+        """
+        while True:
+            turn = await self._turns.get()
+            if turn is None:
+                await self._audio.put(None)
+                return
+            while True:
+                item = await turn.outputs.get()
+                if item is None:
+                    break
+                kind, display, value = item
+                if kind == "sync":
+                    await self._audio.put(("sync", value, turn.id))
+                    continue
+                self.output(display)
+                if kind == "say" and value and self.text_to_speech is not None:
+                    phrases = [value] if value in self.text_to_speech.canned_phrases else split_sentences(value)
+                    for phrase in phrases:
+                        try:
+                            with self.tracer.span("tts", "", turn.id):
+                                audio = await self._loop.run_in_executor(self.executor,
+                                                                         self.text_to_speech.synthesize, phrase)
+                        except Exception:
+                            # The line has been printed, a failed synthesis only loses its audio
+                            continue
+                        await self._audio.put(("play", audio, turn.id))
+            await self._audio.put(("end", turn, turn.id))
+            if turn.end_session:
+                # Nothing said after the goodbye is printed or spoken
+                await self._audio.put(None)
+                return
+            del turn
+
+    async def _playback_stage(self):
+        """
+        Plays the synthesized audio back-to-back, muting the microphone while the assistant speaks. Once the speech
+        synthesizer is stopped (e.g. when the user barges in), the rest of the audio of the turn playing is skipped.
+        """
+        while True:
+            item = await self._audio.get()
+            if item is None:
+                return
+            kind, value, turn_id = item
+            if kind == "play":
+                if self.text_to_speech.interrupted:
+                    # The user interrupted this reply, the next turn plays normally again
+                    del item, value
+                    continue
+                if self.microphone_mute is not None and not self.microphone_mute.muted:
+                    self.microphone_mute.mute_microphone()
+                self._set_state("speaking")
+                try:
+                    with self.tracer.span("playback", "", turn_id):
+                        await self._loop.run_in_executor(self.executor, self.text_to_speech.sink.play, value)
+                except Exception:
+                    # Counted by the tracer, the next audio is played anyway
+                    pass
+                del item, value
+                continue
+            if kind == "sync" and not value.cancelled():
+                value.set_result(None)
+                if self.microphone_mute is not None and self._typed_answers:
+                    # The question keeps the microphone muted until its answer is typed (see Turn.ask)
+                    del item, value
+                    continue
+            if kind == "end":
+                self._in_flight -= 1
+                if self.text_to_speech is not None:
+                    self.text_to_speech.resume()
+                if self.on_turn_end is not None:
+                    self.on_turn_end(value)
+                if value.end_session:
+                    return
+                if self._until_idle and not self._in_flight and self._texts.empty():
+                    # Every utterance has been answered: the stages stop one after the other, and an utterance
+                    # submitted meanwhile is queued behind the end and left for the next run
+                    self._texts.put_nowait(None)
+            if (self.microphone_mute is not None and self.microphone_mute.muted and self._audio.empty()
+                    and not self._asking):
+                self.microphone_mute.unmute_microphone()
+            self._settle()
+            # Do not keep the played audio or the last turn alive while waiting
+            del item, value
@@ -0,0 +1,312 @@
+import collections
+import datetime
+import threading
+import time
+from html.parser import HTMLParser
+
+'''
+Weather providers of the weather skill.
+A provider's `fetch(city)` returns the current Weather of a city. Every provider sends its requests through a pooled
+`requests.Session` with a connect and read timeout, so a query reuses an open connection and cannot hang. The
+WeatherService in front of a provider caches the weather of every city for a few minutes.
+'''
+
+# The connect and read timeouts of every request, in seconds
+DEFAULT_TIMEOUT = (3.05, 5.0)
+
+Weather = collections.namedtuple('Weather', ['city', 'time', 'description', 'temperature'])
+
+
+def describe(weather):
+    """
+    Phrases the weather of a city the way the assistant says it.
+
+    Args:
+        weather (Weather): The weather.
+
+    Returns:
+        str: The date, weather and temperature of the city.
+    """
+    return (f"on {weather.time}, the Weather in {weather.city.title()} is {weather.description}, "
+            f"With a Temperature of {weather.temperature}°C")
+
+
+def _create_session():
+    import requests
+
+    session = requests.Session()
+    session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=16))
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=16))
+    return session
+
+
+class _CardParser(HTMLParser):
+    """
+    Reads the text of the elements of Google's weather card by id, without building a DOM. The elements are leaves,
+    so the text of an element ends at the next tag.
+    """
+    def __init__(self, ids):
+        super().__init__(convert_charrefs=True)
+        self.ids = ids
+        self.found = {}
+        self._current = None
+
+    def handle_starttag(self, tag, attrs):
+        self._current = None
+        for name, value in attrs:
+            if name == 'id' and value in self.ids:
+                self._current = value
+                self.found[value] = ""
+
+    def handle_endtag(self, tag):
+        self._current = None
+
+    def handle_data(self, data):
+        if self._current is not None:
+            self.found[self._current] += data
+
+
+class GoogleProvider:
+    """
+    Scrapes the current weather of a city from Google's weather card.
+
+    Only the part of the results page holding the card is parsed, with the standard library's streaming HTML
+    parser, instead of parsing the whole page into a BeautifulSoup tree.
+    """
+    name = 'google'
+    CARD_IDS = ('wob_dts', 'wob_dc', 'wob_tm')
+    # The card is a few kilobytes long, parse this much of the page from its first element
+    CARD_LENGTH = 8192
+
+    def __init__(self, session=None, timeout=DEFAULT_TIMEOUT, url='https://www.google.com/search'):
+        """
+        Args:
+            session (requests.Session): The pooled HTTP session to send the requests with, a new one by default.
+            timeout (tuple): The connect and read timeouts in seconds.
+            url (str): The URL of the search, e.g. a FakeWeatherServer's `google_url`.
+        """
+        self.session = session if session is not None else _create_session()
+        self.timeout = timeout
+        self.url = url
+
+    def fetch(self, city):
+        """
+        Fetches the current weather of a city.
+
+        Args:
+            city (str): The city.
+
+        Returns:
+            Weather: The weather of the city.
+        """
+        query = city + " weather"
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+        }
+        params = {
+            'q': query,
+            'hl': 'en'  # Set the language parameter to 'en' for English results
+        }
+        response = self.session.get(self.url, headers=headers, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        card = self.parse(response.text)
+        date = card['wob_dts']
+        return Weather(city, date[:-3] + " " + date[-2:], card['wob_dc'], card['wob_tm'])
+
+    @classmethod
+    def parse(cls, page):
+        """
+        Reads the weather card of a results page.
+
+        Args:
+            page (str): The HTML of the page.
+
+        Returns:
+            dict: The stripped text of every element of CARD_IDS.
+        """
+        starts = [page.find(f'id="{card_id}"') for card_id in cls.CARD_IDS]
+        if -1 in starts:
+            raise ValueError("The page has no weather card")
+        start = page.rfind('<', 0, min(starts))
+        parser = _CardParser(cls.CARD_IDS)
+        parser.feed(page[start:max(starts) + cls.CARD_LENGTH])
+        parser.close()
+        if len(parser.found) < len(cls.CARD_IDS):
+            raise ValueError("The page has no weather card")
+        return {card_id: text.strip() for card_id, text in parser.found.items()}
+
+
+class OpenMeteoProvider:
+    """
+    Reads the current weather of a city from the Open-Meteo JSON API, which needs no API key. A city is first
+    resolved to its coordinates with the geocoding API; the coordinates are kept, so later queries of the city cost
+    one request.
+    """
+    name = 'open-meteo'
+    # The WMO weather interpretation codes of the API
+    DESCRIPTIONS = {
+        0: "Clear sky", 1: "Mainly clear", 2: "Partly cloudy", 3: "Overcast", 45: "Fog", 48: "Rime fog",
+        51: "Light drizzle", 53: "Drizzle", 55: "Dense drizzle", 56: "Freezing drizzle", 57: "Freezing drizzle",
+        61: "Light rain", 63: "Rain", 65: "Heavy rain", 66: "Freezing rain", 67: "Freezing rain",
+        71: "Light snow", 73: "Snow", 75: "Heavy snow", 77: "Snow grains", 80: "Light showers", 81: "Showers",
+        82: "Violent showers", 85: "Snow showers", 86: "Heavy snow showers", 95: "Thunderstorm",
+        96: "Thunderstorm with hail", 99: "Thunderstorm with heavy hail",
+    }
+
+    def __init__(self, session=None, timeout=DEFAULT_TIMEOUT,
+                 geocoding_url='https://geocoding-api.open-meteo.com/v1/search',
+                 forecast_url='https://api.open-meteo.com/v1/forecast'):
+        """
+        Args:
+            session (requests.Session): The pooled HTTP session to send the requests with, a new one by default.
+            timeout (tuple): The connect and read timeouts in seconds.
+            geocoding_url (str): The URL of the geocoding API.
+            forecast_url (str): The URL of the forecast API.
+        """
+        self.session = session if session is not None else _create_session()
+        self.timeout = timeout
+        self.geocoding_url = geocoding_url
+        self.forecast_url = forecast_url
+        self._lock = threading.Lock()
+        self._coordinates = {}
+
+    def _get(self, url, **params):
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def locate(self, city):
+        """
+        Resolves a city to its coordinates.
+
+        Args:
+            city (str): The city.
+
+        Returns:
+            tuple: The latitude and longitude of the city.
+        """
+        key = city.strip().lower()
+        with self._lock:
+            if key in self._coordinates:
+                return self._coordinates[key]
+        results = self._get(self.geocoding_url, name=city, count=1).get('results')
+        if not results:
+            raise ValueError(f"Unknown city '{city}'")
+        coordinates = (results[0]['latitude'], results[0]['longitude'])
+        with self._lock:
+            self._coordinates[key] = coordinates
+        return coordinates
+
+    def fetch(self, city):
+        """
+        Fetches the current weather of a city.
+
+        Args:
+            city (str): The city.
+
+        Returns:
+            Weather: The weather of the city.
+        """
+        latitude, longitude = self.locate(city)
+        current = self._get(self.forecast_url, latitude=latitude, longitude=longitude, current_weather='true',
+                            timezone='auto')['current_weather']
+        date = datetime.datetime.fromisoformat(current['time']).strftime("%A %I:%M %p")
+        return Weather(city, date, self.DESCRIPTIONS.get(current['weathercode'], "Unknown"),
+                       f"{current['temperature']:g}")
+
+
+PROVIDERS = {
+    'google': GoogleProvider,
+    'open-meteo': OpenMeteoProvider,
+}
+
+
+def create_provider(name='google', **options):
+    """
+    Creates a weather provider by name.
+
+    Args:
+        name (str): "google" (scraped) or "open-meteo" (a JSON API).
+        **options: The arguments of the provider's constructor.
+
+    Returns:
+        object: The provider.
+    """
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown weather provider '{name}', expected one of {sorted(PROVIDERS)}")
+    return PROVIDERS[name](**options)
+
+
+class WeatherService:
+    """
+    Caches the weather of every city for `ttl` seconds in front of a provider. It is thread-safe.
+
+    Attributes:
+        provider (object): The weather provider.
+        ttl (float): How long the weather of a city is reused, in seconds.
+        hits (int): The number of queries answered from the cache.
+        misses (int): The number of queries sent to the provider.
+    """
+    def __init__(self, provider, ttl=600, max_cities=256):
+        """
+        Args:
+            provider (object): The weather provider.
+            ttl (float): How long the weather of a city is reused, in seconds.
+            max_cities (int): How many cities are cached, the least recently queried is evicted first.
+        """
+        self.provider = provider
+        self.ttl = ttl
+        self.max_cities = max_cities
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._cache = collections.OrderedDict()
+
+    def get(self, city):
+        """
+        Returns the current weather of a city, from the cache if it was fetched less than `ttl` seconds ago.
+
+        Args:
+            city (str): The city.
+
+        Returns:
+            Weather: The weather of the city.
+        """
+        key = " ".join(city.lower().split())
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        # Failures are not cached, the next query tries again
+        weather = self.provider.fetch(city)
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl, weather)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cities:
+                self._cache.popitem(last=False)
+        return weather
+
+    def report(self, city):
+        """
+        Returns the current weather of a city the way the assistant says it.
+
+        Args:
+            city (str): The city.
+
+        Returns:
+            str: The date, weather and temperature of the city.
+        """
+        return describe(self.get(city))
+
+    def stats(self):
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: The "hits", "misses" and cached "cities".
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'cities': len(self._cache)}
@@ -1,71 +1,240 @@
+import argparse
+import hashlib
 import json
+import os
+import time
 import numpy as np
-from tensorflow import keras
-from keras.layers import Dense, Dropout
-from keras.optimizers import SGD
-from sklearn.preprocessing import LabelEncoder
-import random
-
-# Load the data from the JSON file
-with open('intents.json') as file:
-    data = json.load(file)
-
-# Create lists to store the training data and output data
-training_data = []
-output_data = []
-
-# Loop through the intents and their patterns to create training data
-for intent in data['intents']:
-    for pattern in intent['patterns']:
-        training_data.append(pattern)
-        output_data.append(intent['tag'])
-
-# Tokenize the training data and convert to binary matrix
-tokenizer = keras.preprocessing.text.Tokenizer()
-tokenizer.fit_on_texts(training_data)
-training_data = tokenizer.texts_to_matrix(training_data, mode='binary')
-
-# Encode the output data
-label_encoder = LabelEncoder()
-output_data = label_encoder.fit_transform(output_data)
-
-# Define the neural network architecture
-model = keras.models.Sequential()
-model.add(Dense(128, input_shape=(training_data.shape[1],), activation='relu'))
-model.add(Dropout(0.5))
-model.add(Dense(64, activation='relu'))
-model.add(Dropout(0.5))
-model.add(Dense(np.max(output_data)+1, activation='softmax'))
-
-# Compile the model
-model.compile(loss='sparse_categorical_crossentropy', optimizer=SGD(lr=0.01), metrics=['accuracy'])
-
-# Train the model
-chatbot_model = model.fit(training_data, output_data, epochs=1000, batch_size=5)
-
-# Save the model to a file
-model.save("chatbot1.h5",chatbot_model)
-
-# Now that the model is trained, you can use it to make predictions:
-
-def predict_intent(text):
-    # Tokenize and convert to binary matrix
-    text = tokenizer.texts_to_matrix([text], mode='binary')
-    # Make prediction using the trained model
-    prediction = model.predict(text)[0]
-    predicted_class = np.argmax(prediction)
-    confidence = prediction[predicted_class]
-    if confidence > 0.5:
-        # Inverse transform to get the predicted tag
-        tag = label_encoder.inverse_transform([predicted_class])[0]
-        return tag
-    else:
-        return None
-
-# Example usage:
-user_input = "time"
-predicted_intent = predict_intent(user_input)
-print(predicted_intent)
-for intent in data['intents']:
-    if intent['tag'] == predicted_intent:
-        print(random.choice(intent['responses']))
+
+'''
+This is the training script of the intent model of the assistant.
+It trains the Dense network on the patterns of intents.json with fixed seeds, holds out part of the patterns of every
+intent to stop training once the validation loss stops improving, prints the precision and recall of every intent on
+the held-out patterns, and then retrains on all the patterns for the best number of epochs. It writes the model
+("chatbot1.h5") and its vocabulary ("chatbot1_vocab.json"); copy both, together with intents.json, into the Main
+folder. When the model was already trained on the same tags and patterns, it does nothing unless --force is given,
+so it can run as a routine step after every edit of intents.json:
+
+    python chatbot_training.py --intents intents.json --output-dir ../Main
+'''
+
+VOCABULARY_VERSION = 1
+
+
+def hash_intents(data):
+    """
+    Hashes the parts of the intents data that the trained model depends on (the tags and their patterns).
+    It must be computed like intent_vocabulary.hash_intents in the Main folder.
+
+    Args:
+        data (dict): The data loaded from the intents file.
+
+    Returns:
+        str: The hex SHA-256 digest of the tags and patterns.
+    """
+    content = [[intent['tag'], intent['patterns']] for intent in data['intents']]
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def vocabulary_path(model_path):
+    return os.path.splitext(model_path)[0] + '_vocab.json'
+
+
+def is_up_to_date(data, model_path, vocabulary_file):
+    """
+    Checks whether the model was trained on the current tags and patterns.
+
+    Args:
+        data (dict): The data loaded from the intents file.
+        model_path (str): The path of the trained model.
+        vocabulary_file (str): The path of the vocabulary written with it.
+
+    Returns:
+        bool: True if both files exist and the vocabulary was built from the same tags and patterns.
+    """
+    if not (os.path.exists(model_path) and os.path.exists(vocabulary_file)):
+        return False
+    with open(vocabulary_file) as file:
+        return json.load(file).get('intents_hash') == hash_intents(data)
+
+
+def split_patterns(labels, validation_split, seed):
+    """
+    Picks the held-out patterns of every intent, so every intent with at least two patterns is validated on.
+
+    Args:
+        labels (numpy.ndarray): The class of every pattern.
+        validation_split (float): The fraction of the patterns of every intent to hold out.
+        seed (int): The seed of the shuffle.
+
+    Returns:
+        tuple: The indices of the training and of the held-out patterns.
+    """
+    rng = np.random.RandomState(seed)
+    train, held_out = [], []
+    for label in np.unique(labels):
+        indices = rng.permutation(np.flatnonzero(labels == label))
+        count = int(round(len(indices) * validation_split)) if len(indices) > 1 else 0
+        count = min(max(count, 1 if len(indices) > 1 else 0), len(indices) - 1)
+        held_out.extend(indices[:count])
+        train.extend(indices[count:])
+    return np.array(sorted(train)), np.array(sorted(held_out))
+
+
+def precision_recall(labels, predictions, num_classes):
+    """
+    Computes the precision and recall of every class.
+
+    Args:
+        labels (numpy.ndarray): The true class of every sample.
+        predictions (numpy.ndarray): The predicted class of every sample.
+        num_classes (int): The number of classes.
+
+    Returns:
+        tuple: The precision, the recall and the support of every class, as arrays.
+    """
+    confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+    np.add.at(confusion, (labels, predictions), 1)
+    true_positives = np.diag(confusion)
+    predicted = confusion.sum(axis=0)
+    support = confusion.sum(axis=1)
+    precision = np.divide(true_positives, predicted, out=np.zeros(num_classes), where=predicted > 0)
+    recall = np.divide(true_positives, support, out=np.zeros(num_classes), where=support > 0)
+    return precision, recall, support
+
+
+def build_model(keras, input_size, num_classes, learning_rate):
+    """
+    Builds the network of the intent model.
+
+    Args:
+        keras (module): tensorflow.keras.
+        input_size (int): The number of columns of the binary matrix.
+        num_classes (int): The number of intents.
+        learning_rate (float): The learning rate of the Adam optimizer.
+
+    Returns:
+        keras.Model: The compiled model.
+    """
+    from keras.layers import Dense, Dropout
+
+    # Define the neural network architecture
+    model = keras.models.Sequential()
+    model.add(Dense(128, input_shape=(input_size,), activation='relu'))
+    model.add(Dropout(0.5))
+    model.add(Dense(64, activation='relu'))
+    model.add(Dropout(0.5))
+    model.add(Dense(num_classes, activation='softmax'))
+    model.compile(loss='sparse_categorical_crossentropy', optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+                  metrics=['accuracy'])
+    return model
+
+
+def train(data, args):
+    """
+    Trains the intent model and writes it with its vocabulary.
+
+    Args:
+        data (dict): The data loaded from the intents file.
+        args (argparse.Namespace): The options of the command line.
+    """
+    from tensorflow import keras
+
+    # Seeds Python, NumPy and TensorFlow, and makes the TensorFlow ops deterministic, so a run can be reproduced
+    keras.utils.set_random_seed(args.seed)
+    try:
+        import tensorflow as tf
+
+        tf.config.experimental.enable_op_determinism()
+    except AttributeError:
+        pass
+
+    # Create lists to store the training data and output data
+    patterns = [pattern for intent in data['intents'] for pattern in intent['patterns']]
+    tags = [intent['tag'] for intent in data['intents'] for _ in intent['patterns']]
+
+    # Tokenize the training data and convert to binary matrix
+    tokenizer = keras.preprocessing.text.Tokenizer()
+    tokenizer.fit_on_texts(patterns)
+    matrix = tokenizer.texts_to_matrix(patterns, mode='binary')
+
+    # Encode the output data, in the sorted order of sklearn's LabelEncoder
+    classes = sorted(set(tags))
+    labels = np.array([classes.index(tag) for tag in tags])
+
+    start = time.perf_counter()
+    train_indices, held_out = split_patterns(labels, args.validation_split, args.seed)
+    if not len(held_out):
+        raise ValueError("No pattern is held out, every intent needs at least two patterns to validate on")
+    model = build_model(keras, matrix.shape[1], len(classes), args.learning_rate)
+    # Stop once the validation loss has not improved for `patience` epochs and keep the best weights
+    early_stopping = keras.callbacks.EarlyStopping(monitor='val_loss', patience=args.patience,
+                                                   restore_best_weights=True)
+    history = model.fit(matrix[train_indices], labels[train_indices], epochs=args.max_epochs,
+                        batch_size=args.batch_size, validation_data=(matrix[held_out], labels[held_out]),
+                        callbacks=[early_stopping], verbose=args.verbose)
+    best_epochs = int(np.argmin(history.history['val_loss'])) + 1
+    print(f"Best validation loss {min(history.history['val_loss']):.4f} after {best_epochs} epochs "
+          f"({len(history.history['val_loss'])} run)")
+
+    predictions = np.argmax(model.predict(matrix[held_out], batch_size=len(held_out), verbose=0), axis=1)
+    precision, recall, support = precision_recall(labels[held_out], predictions, len(classes))
+    print(f"{'intent':<20} {'precision':>9} {'recall':>7} {'held out':>9}")
+    for tag, tag_precision, tag_recall, tag_support in zip(classes, precision, recall, support):
+        print(f"{tag:<20} {tag_precision:>9.2f} {tag_recall:>7.2f} {tag_support:>9}")
+    print(f"{'accuracy':<20} {np.mean(predictions == labels[held_out]):>17.2f} {len(held_out):>9}")
+
+    if args.refit:
+        # The held-out patterns are too valuable to leave out of the final model
+        keras.utils.set_random_seed(args.seed)
+        model = build_model(keras, matrix.shape[1], len(classes), args.learning_rate)
+        model.fit(matrix, labels, epochs=best_epochs, batch_size=args.batch_size, verbose=args.verbose)
+    print(f"Trained in {time.perf_counter() - start:.1f} s")
+
+    # Save the model to a file
+    os.makedirs(args.output_dir, exist_ok=True)
+    model_path = os.path.join(args.output_dir, args.model)
+    model.save(model_path)
+
+    # Save the vocabulary and labels next to the model so the assistant does not have to re-fit them at startup
+    with open(vocabulary_path(model_path), "w") as file:
+        json.dump({
+            "version": VOCABULARY_VERSION,
+            "intents_hash": hash_intents(data),
+            "labels": classes,
+            "word_index": tokenizer.word_index,
+        }, file, indent=1)
+    print(f"Wrote {model_path} and {vocabulary_path(model_path)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the intent model of the assistant on intents.json.")
+    parser.add_argument('--intents', default='intents.json', help="The intents file to train on.")
+    parser.add_argument('--output-dir', default='.', help="The folder to write the model and its vocabulary to.")
+    parser.add_argument('--model', default='chatbot1.h5', help="The file name of the model.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--validation-split', type=float, default=0.2,
+                        help="The fraction of the patterns of every intent held out for early stopping.")
+    parser.add_argument('--max-epochs', type=int, default=500)
+    parser.add_argument('--patience', type=int, default=30,
+                        help="How many epochs without a better validation loss stop the training.")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--learning-rate', type=float, default=0.005)
+    parser.add_argument('--no-refit', dest='refit', action='store_false',
+                        help="Keep the model trained without the held-out patterns.")
+    parser.add_argument('--force', action='store_true', help="Train even if the intents have not changed.")
+    parser.add_argument('--verbose', type=int, default=0, help="The verbosity of Keras.")
+    args = parser.parse_args()
+
+    # Load the data from the JSON file
+    with open(args.intents) as file:
+        data = json.load(file)
+
+    model_path = os.path.join(args.output_dir, args.model)
+    if not args.force and is_up_to_date(data, model_path, vocabulary_path(model_path)):
+        print(f"{model_path} is up to date with {args.intents}, nothing to train (use --force to retrain)")
+        return
+    train(data, args)
+
+
+if __name__ == '__main__':
+    main()
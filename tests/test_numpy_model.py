@@ -0,0 +1,52 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+'''
+Checks that the NumPy inference backend of the intent model agrees with Keras on every pattern of intents.json.
+The modules of the assistant import each other by their bare names, so the Main folder is put on the path.
+'''
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Main')
+sys.path.insert(0, MAIN)
+
+from model_application import ChatBot  # noqa: E402
+from numpy_model import NumpyIntentModel  # noqa: E402
+
+INTENTS = os.path.join(MAIN, 'intents.json')
+MODEL = os.path.join(MAIN, 'chatbot1.h5')
+
+
+@pytest.fixture(scope='module')
+def numpy_bot():
+    return ChatBot(INTENTS, MODEL, backend='numpy')
+
+
+def patterns(bot):
+    return [pattern for intent in bot.data['intents'] for pattern in intent['patterns']]
+
+
+def test_keras_and_numpy_agree_on_every_pattern(numpy_bot):
+    pytest.importorskip("tensorflow")
+    keras_bot = ChatBot(INTENTS, MODEL, backend='keras')
+
+    mismatches = []
+    for pattern in patterns(keras_bot):
+        keras_result = keras_bot.classify(pattern)
+        numpy_result = numpy_bot.classify(pattern)
+        if np.argmax(keras_result.probabilities) != np.argmax(numpy_result.probabilities):
+            mismatches.append((pattern, keras_result.tag, numpy_result.tag))
+        else:
+            assert numpy_result.confidence == pytest.approx(keras_result.confidence, abs=1e-5), pattern
+    assert not mismatches
+
+
+def test_npz_export_matches_h5(numpy_bot, tmp_path):
+    path = str(tmp_path / 'chatbot1.npz')
+    NumpyIntentModel.from_h5(MODEL).save_npz(path)
+    npz_bot = ChatBot(INTENTS, path, backend='numpy', vocabulary_file_path=os.path.join(MAIN, 'chatbot1_vocab.json'))
+
+    for pattern in patterns(numpy_bot):
+        np.testing.assert_allclose(npz_bot.classify(pattern).probabilities,
+                                   numpy_bot.classify(pattern).probabilities, rtol=1e-6, atol=1e-7)